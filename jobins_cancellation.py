@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+変換処理のキャンセル
+GUIのキャンセルボタンから別スレッドで実行中の変換を止めるためのトークン。
+変換側は行の間・再試行やレート制限の待ち中にトークンを確認し、書き込み済みの出力と
+キャッシュを保存してから終了する。応答待ちのAPI呼び出しは、キャンセル時のコールバックで
+待ちを打ち切り、応答を待たずに破棄する。
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionCancelled(Exception):
+    """変換がキャンセルされた"""
+
+
+class CancellationToken:
+    """スレッド間で共有するキャンセル要求"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """キャンセルを要求し、登録されたコールバックを呼び出す（どのスレッドからでも呼び出せる）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"キャンセル時の処理に失敗: {e}")
+
+    def add_callback(self, callback):
+        """キャンセル時に呼び出す関数を登録（キャンセル済みの場合はすぐに呼び出す）"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise ConversionCancelled("変換がキャンセルされました")
+
+    def wait(self, timeout):
+        """
+        最大timeout秒待つ（キャンセルされたらすぐに戻る）
+
+        Returns:
+            bool: キャンセルされた場合True
+        """
+        return self._event.wait(timeout)
+
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+職種分類キャッシュのファイル保存・エクスポート・インポート・事前ウォームアップ
+
+キャッシュは {正規化した求人タイトル: 職種分類（中分類）} のJSONファイルで、
+processing_rules.classification_cache_file に保存される。
+別のマシン（GUIの端末・バッチサーバー）へはexport/importで持ち運び、
+warmで求人マスタの全タイトルを事前に分類しておくと、変換時にAPIを待たなくなる。
+
+使い方:
+    python jobins_classification_cache.py export cache_export.json
+    python jobins_classification_cache.py import cache_export.json --policy keep
+    python jobins_classification_cache.py warm 求人マスタ.csv
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import yaml
+
+from jobins_input_reader import open_input
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 3
+DEFAULT_CACHE_FILE = "職種分類キャッシュ.json"
+# 2段階分類の1段階目（大分類）のキャッシュ
+DEFAULT_MAJOR_CACHE_FILE = "職種大分類キャッシュ.json"
+
+# メモリ上のキャッシュの上限（processing_rulesで変更可能）
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# 1エントリあたりのPythonオブジェクトの概算オーバーヘッド（バイト）
+ENTRY_OVERHEAD_BYTES = 160
+
+# 分類の出所（ローカル分類の較正・職種分類モデルの学習にはAPIの分類だけを使う）
+SOURCE_API = 'api'
+SOURCE_KEYWORD = 'keyword'
+# APIが判定できなかった場合の既定値（その他営業関連職）
+SOURCE_FALLBACK = 'fallback'
+
+# インポート時の競合（同じタイトルで分類が異なる）の扱い
+CONFLICT_POLICIES = {
+    'keep': "既存の分類を残す",
+    'replace': "インポートした分類で上書き",
+    'drop': "両方破棄して次回の変換で再分類",
+}
+
+
+def cache_file_path(processing_rules):
+    """YAMLのprocessing_rulesからキャッシュファイルのパスを取得"""
+    return processing_rules.get('classification_cache_file', DEFAULT_CACHE_FILE)
+
+
+def major_cache_file_path(processing_rules):
+    """YAMLのprocessing_rulesから大分類キャッシュファイルのパスを取得"""
+    return processing_rules.get('major_classification_cache_file', DEFAULT_MAJOR_CACHE_FILE)
+
+
+def category_table_version(job_categories):
+    """職種分類テーブルのバージョン（内容のハッシュ）"""
+    digest = hashlib.blake2b(digest_size=8)
+    for category in job_categories:
+        digest.update("\x1f".join(category).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def read_cache_file(path):
+    """
+    キャッシュファイルを読み込み
+
+    Returns:
+        list: (タイトル, 職種分類, 保存時刻, 分類テーブルのバージョン, 出所) のリスト（ファイルがなければ空）
+              出所を記録していない旧形式のエントリの出所はNone
+    """
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+
+    version = data.get('version')
+    entries = data.get('entries', {})
+    if version == 1:
+        # 旧形式 {タイトル: 分類}（バージョン不明として、初回参照時に分類テーブルと照合する）
+        now = time.time()
+        return [(title, label, now, "", None) for title, label in entries.items()]
+    if version == 2:
+        return [(title, label, stored_at, table_version, None)
+                for title, (label, stored_at, table_version) in entries.items()]
+    if version != CACHE_FORMAT_VERSION:
+        raise ValueError(f"未対応のキャッシュファイル形式です: version={version}")
+    return [(title, *entry) for title, entry in entries.items()]
+
+
+def write_cache_file(path, records):
+    """キャッシュファイルを書き込み（一時ファイルに書いてから置き換え）"""
+    data = {
+        'version': CACHE_FORMAT_VERSION,
+        'saved_at': datetime.now().isoformat(timespec='seconds'),
+        'entries': {
+            title: [label, stored_at, table_version, source]
+            for title, label, stored_at, table_version, source in records
+        },
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.cache_', suffix='.json')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, indent=1)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class ClassificationCache:
+    """
+    職種分類キャッシュ（件数・バイト数の上限付きLRU、TTL・分類テーブルのバージョンによる無効化）
+
+    各エントリは保存時の分類テーブルのバージョンを持つ。参照時にバージョンが現在と異なる場合、
+    分類が現在のテーブルに残っていれば引き続き使い、なくなっていれば無効化する。
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=None,
+                 job_categories=None, clock=time.time, label_column=1, name="職種分類キャッシュ"):
+        """
+        初期化
+
+        Args:
+            max_entries (int): 最大件数（Noneは無制限）
+            max_bytes (int): 最大バイト数の概算（Noneは無制限）
+            ttl (float): 有効期間（秒、Noneは無期限）
+            job_categories (list): 職種分類テーブル（(大分類, 中分類, Notion紐づけ) のリスト）
+            clock (callable): 現在時刻（秒）を返す関数
+            label_column (int): 分類として保存する職種分類テーブルの列（1: 中分類, 0: 大分類）
+            name (str): サマリーに表示する名前
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.name = name
+        self.valid_labels = {category[label_column] for category in job_categories} if job_categories else None
+        self.table_version = category_table_version(job_categories) if job_categories else None
+
+        self._entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _entry_size(title, label):
+        return len(title.encode('utf-8')) + len(label.encode('utf-8')) + ENTRY_OVERHEAD_BYTES
+
+    def _remove(self, title):
+        label = self._entries.pop(title)[0]
+        self.bytes -= self._entry_size(title, label)
+
+    def _valid_entry(self, title):
+        """有効なエントリを取得（期限切れ・分類テーブルから消えた分類は削除してNone）"""
+        entry = self._entries.get(title)
+        if entry is None:
+            return None
+        label, stored_at, table_version, source = entry
+        if self.ttl is not None and self.clock() - stored_at > self.ttl:
+            self._remove(title)
+            self.expirations += 1
+            return None
+        if table_version != self.table_version:
+            if self.valid_labels is not None and label not in self.valid_labels:
+                self._remove(title)
+                self.invalidations += 1
+                return None
+            # 分類が現在のテーブルにも存在するので、現在のバージョンで有効とする
+            entry = (label, stored_at, self.table_version, source)
+            self._entries[title] = entry
+        return entry
+
+    def get(self, title, default=None):
+        """分類を取得（ヒット・ミスを集計し、LRUの順序を更新）"""
+        entry = self._valid_entry(title)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(title)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, title):
+        """分類を取得（集計・LRUの順序は変えない）"""
+        entry = self._valid_entry(title)
+        return entry[0] if entry is not None else None
+
+    def __contains__(self, title):
+        return self.peek(title) is not None
+
+    def __setitem__(self, title, label):
+        self.put(title, label)
+
+    def __delitem__(self, title):
+        self._remove(title)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def put(self, title, label, stored_at=None, table_version=None, source=None):
+        """
+        分類を保存（上限を超えた場合は古いものから追い出す）
+
+        Args:
+            source (str): 分類の出所（SOURCE_API / SOURCE_KEYWORD / SOURCE_FALLBACK、不明の場合はNone）
+        """
+        if title in self._entries:
+            self._remove(title)
+        stored_at = self.clock() if stored_at is None else stored_at
+        table_version = self.table_version if table_version is None else table_version
+        self._entries[title] = (label, stored_at, table_version, source)
+        self.bytes += self._entry_size(title, label)
+
+        while self._entries and (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def items(self):
+        """(タイトル, 分類) の一覧（古い順）"""
+        return [(title, entry[0]) for title, entry in self._entries.items()]
+
+    def records(self):
+        """ファイル保存用の (タイトル, 分類, 保存時刻, 分類テーブルのバージョン, 出所) の一覧（古い順）"""
+        return [(title, *entry) for title, entry in self._entries.items()]
+
+    def load(self, path):
+        """キャッシュファイルのエントリを読み込み（古い順に追加するのでLRUの順序も復元される）"""
+        for title, label, stored_at, table_version, source in read_cache_file(path):
+            self.put(title, label, stored_at, table_version, source)
+        return len(self._entries)
+
+    def save(self, path):
+        write_cache_file(path, self.records())
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        """集計のサマリー文字列"""
+        return (f"{self.name}: ヒット率 {self.hit_rate:.1%} "
+                f"(ヒット: {self.hits}, ミス: {self.misses}, 追い出し: {self.evictions}, "
+                f"期限切れ: {self.expirations}, 分類テーブル変更で無効化: {self.invalidations}, "
+                f"保持: {len(self._entries)}件 / 約{self.bytes // 1024}KB)")
+
+
+def create_classification_cache(processing_rules, job_categories, major=False):
+    """
+    YAMLのprocessing_rulesの設定で職種分類キャッシュを作成
+
+    Args:
+        major (bool): 2段階分類の1段階目（大分類）のキャッシュを作成する場合True
+    """
+    ttl_days = processing_rules.get('classification_cache_ttl_days')
+    return ClassificationCache(
+        max_entries=processing_rules.get('classification_cache_max_entries', DEFAULT_MAX_ENTRIES),
+        max_bytes=processing_rules.get('classification_cache_max_bytes', DEFAULT_MAX_BYTES),
+        ttl=ttl_days * 86400 if ttl_days else None,
+        job_categories=job_categories,
+        label_column=0 if major else 1,
+        name="職種大分類キャッシュ" if major else "職種分類キャッシュ",
+    )
+
+
+def api_labels(records):
+    """
+    APIで分類したエントリの (タイトル, 分類) の一覧（古い順）
+
+    キーワード分類・事前判定・既定値のエントリと、出所を記録していない旧形式のエントリは含めない
+    （ローカル分類の較正がローカル分類自身の結果に引きずられないようにする）。
+
+    Args:
+        records: ClassificationCache または read_cache_file() で読み込んだエントリ
+    """
+    if isinstance(records, ClassificationCache):
+        records = records.records()
+    return [(title, label) for title, label, _, _, source in records if source == SOURCE_API]
+
+
+def merge_entries(target, records, policy='keep', normalize=None):
+    """
+    インポートしたエントリをキャッシュにマージ
+
+    Args:
+        target (ClassificationCache): マージ先のキャッシュ
+        records (list): read_cache_file() で読み込んだエントリ
+        policy (str): 競合時の扱い（CONFLICT_POLICIESのキー）
+        normalize (callable): タイトルの再正規化（マシンごとの正規化設定の違いを吸収）
+
+    Returns:
+        dict: added / identical / conflicts / replaced / dropped / invalid の件数
+    """
+    if policy not in CONFLICT_POLICIES:
+        raise ValueError(f"不明な競合ポリシーです: {policy}")
+
+    stats = dict.fromkeys(('added', 'identical', 'conflicts', 'replaced', 'dropped', 'invalid'), 0)
+    dropped_titles = set()
+    for title, label, stored_at, _, source in records:
+        # 現在の分類テーブルにない分類は取り込まない
+        if target.valid_labels is not None and label not in target.valid_labels:
+            stats['invalid'] += 1
+            continue
+        if normalize is not None:
+            title = normalize(title)
+        if not title or title in dropped_titles:
+            continue
+
+        current = target.peek(title)
+        if current is None:
+            target.put(title, label, stored_at, source=source)
+            stats['added'] += 1
+        elif current == label:
+            stats['identical'] += 1
+        else:
+            stats['conflicts'] += 1
+            if policy == 'replace':
+                target.put(title, label, stored_at, source=source)
+                stats['replaced'] += 1
+            elif policy == 'drop':
+                del target[title]
+                dropped_titles.add(title)
+                stats['dropped'] += 1
+    return stats
+
+
+def _create_converter(engine, config_path, cache_path=None):
+    """
+    ウォームアップに使う変換器を作成（GUI版は分類ルールの指示文と技術系の事前判定を含むが、tkinterが必要）
+
+    変換器はYAMLのclassification_cache_fileからキャッシュを読み込むため、--cacheで別のファイルを指定した場合は
+    そのファイルを読み込み直す（YAMLのキャッシュの内容で--cacheのファイルを上書きしない）。
+    """
+    if engine == 'gui':
+        from jobins_gui_converter import SimpleJobinsConverter
+        converter = SimpleJobinsConverter(config_path)
+    else:
+        from jobins_csv_converter import JobinsCSVConverter
+        converter = JobinsCSVConverter(config_path)
+    if cache_path and cache_path != cache_file_path(converter.processing_rules):
+        converter.processing_rules['classification_cache_file'] = cache_path
+        converter.job_classification_cache = converter._load_classification_cache()
+    return converter
+
+
+def warm_up(converter, input_csv_path, apply_filter=True):
+    """
+    求人マスタの全タイトルを事前に分類してキャッシュに入れる
+
+    Args:
+        converter: classify_title() と job_classification_cache を持つ変換器
+        input_csv_path (str): 求人マスタCSV
+        apply_filter (bool): 変換時と同じフィルタリング条件を適用するか
+
+    Returns:
+        dict: distinct_titles / cached / classified の件数
+    """
+    title_field = None
+    for mapping in converter.field_mapping:
+        if mapping['target_column'] == "職種分類（中分類）":
+            title_field = mapping['source_field']
+            break
+
+    seen = set()
+    stats = {'distinct_titles': 0, 'cached': 0, 'classified': 0}
+    with open_input(input_csv_path) as infile:
+        reader = csv.reader(infile)
+        headers = next(reader, [])
+        title_index = headers.index(title_field) if title_field in headers else None
+        job_type_index = headers.index("職種") if "職種" in headers else None
+        if title_index is None:
+            raise ValueError(f"タイトルの列が見つかりません: {title_field}")
+
+        for row in reader:
+            if apply_filter and not converter._should_include_row(row, headers):
+                continue
+            if title_index >= len(row) or not row[title_index].strip():
+                continue
+            title = converter.title_normalizer.normalize(row[title_index])
+            if title in seen:
+                continue
+            seen.add(title)
+            stats['distinct_titles'] += 1
+            if title in converter.job_classification_cache:
+                stats['cached'] += 1
+                continue
+
+            job_type = row[job_type_index].strip() if job_type_index is not None and job_type_index < len(row) else ""
+            converter.classify_title(title, job_type)
+            stats['classified'] += 1
+            if stats['classified'] % 100 == 0:
+                logger.info(f"ウォームアップ: {stats['classified']} 件分類")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='職種分類キャッシュのエクスポート・インポート・ウォームアップ')
+    parser.add_argument('-c', '--config', default='jobins_yaml_mapping.yaml',
+                        help='YAMLマッピング設定ファイル (classification_cache_fileを使用)')
+    parser.add_argument('--cache', help='キャッシュファイルパス（YAMLの設定より優先）')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='キャッシュをファイルに書き出す')
+    export_parser.add_argument('output', help='エクスポート先のJSONファイル')
+
+    import_parser = subparsers.add_parser('import', help='エクスポートしたキャッシュをマージする')
+    import_parser.add_argument('input', help='エクスポートしたJSONファイル')
+    import_parser.add_argument('--policy', choices=sorted(CONFLICT_POLICIES), default='keep',
+                               help='競合時の扱い: ' + ', '.join(f"{k}={v}" for k, v in CONFLICT_POLICIES.items()))
+
+    warm_parser = subparsers.add_parser('warm', help='求人マスタの全タイトルを事前に分類する')
+    warm_parser.add_argument('input_csv', help='求人マスタCSV')
+    warm_parser.add_argument('--engine', choices=['gui', 'csv'], default='csv',
+                             help='分類に使う変換器 (default: csv、guiはtkinterが必要)')
+    warm_parser.add_argument('--all-rows', action='store_true', help='フィルタリング条件を適用しない')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    with open(args.config, 'r', encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+    cache_path = args.cache or cache_file_path(config['processing_rules'])
+
+    if args.command == 'export':
+        records = read_cache_file(cache_path)
+        write_cache_file(args.output, records)
+        print(f"エクスポート完了: {len(records)} 件 → {args.output}")
+        return 0
+
+    if args.command == 'import':
+        # マージ先は保存先と同じcache_pathのキャッシュ（YAMLのキャッシュではない）
+        from jobins_csv_converter import JobinsCSVConverter
+        converter = JobinsCSVConverter(args.config)
+        cache = create_classification_cache(config['processing_rules'], converter.JOB_CATEGORIES)
+        cache.load(cache_path)
+        stats = merge_entries(
+            cache,
+            read_cache_file(args.input),
+            policy=args.policy,
+            normalize=converter.title_normalizer.normalize,
+        )
+        cache.save(cache_path)
+        print(f"インポート完了: 追加 {stats['added']}, 同一 {stats['identical']}, 競合 {stats['conflicts']} "
+              f"(上書き {stats['replaced']}, 破棄 {stats['dropped']}), 分類テーブルにない分類 {stats['invalid']}")
+        print(f"キャッシュ: {len(cache)} 件 ({cache_path})")
+        return 0
+
+    converter = _create_converter(args.engine, args.config, cache_path)
+    if converter.openai_client is None:
+        print("OpenAI APIキーが設定されていないため、ウォームアップできません", file=sys.stderr)
+        return 1
+    stats = warm_up(converter, args.input_csv, apply_filter=not args.all_rows)
+    converter.save_classification_cache(cache_path)
+    print(f"ウォームアップ完了: タイトル {stats['distinct_titles']} 種類"
+          f"（キャッシュ済み {stats['cached']}, 新規分類 {stats['classified']}）")
+    print(converter.gpt_classifier.usage_summary())
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
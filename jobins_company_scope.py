@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会社単位の列の変換
+会社概要・資本金・従業員数などは同じ企業名の求人でほぼ同じ値になるため、
+(企業名, ソース値の指紋) ごとに1回だけ変換して同じ会社の行に展開する
+
+YAMLのfield_mappingで `scope: company` を指定した列が対象
+"""
+
+import hashlib
+
+DEFAULT_COMPANY_KEY_FIELD = "企業名"
+
+
+def company_scoped_mappings(field_mapping):
+    """会社単位（scope: company）のマッピングを抽出"""
+    return [mapping for mapping in field_mapping if mapping.get('scope') == 'company']
+
+
+def source_fingerprint(values):
+    """ソース値の組み合わせの指紋（16バイト）"""
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        digest.update(str(value).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.digest()
+
+
+class CompanyScopeCache:
+    """会社単位の列の変換結果を (企業名, ソース値の指紋) ごとに保持"""
+
+    def __init__(self, field_mapping, company_key_field=DEFAULT_COMPANY_KEY_FIELD):
+        self.company_key_field = company_key_field
+        self.mappings = company_scoped_mappings(field_mapping)
+        self.target_columns = {mapping['target_column'] for mapping in self.mappings}
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __bool__(self):
+        return bool(self.mappings)
+
+    def get_values(self, company_name, source_values, compute):
+        """
+        会社単位の列の変換結果を取得（未計算なら計算して保存）
+
+        Args:
+            company_name (str): 企業名
+            source_values (list): self.mappingsの順のソース値
+            compute (callable): {target_column: 変換後の値} を返す関数
+
+        Returns:
+            dict: {target_column: 変換後の値}
+        """
+        key = (company_name, source_fingerprint(source_values))
+        values = self._values.get(key)
+        if values is None:
+            self.misses += 1
+            values = compute()
+            self._values[key] = values
+        else:
+            self.hits += 1
+        return values
+
+    def summary(self):
+        """会社単位の変換のサマリー文字列"""
+        return (f"会社単位の変換: {len(self._values)} 社分を計算、"
+                f"{self.hits} 行で再利用（対象列: {len(self.mappings)} 列）")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+圧縮ファイル（gzip / zstd）の透過的な読み書き
+ファイルの拡張子（.gz / .zst / .zstd）で圧縮形式を判定し、展開・圧縮しながら逐次読み書きする
+（一時ファイルに展開しない）。BOM付きUTF-8などの文字コードは展開後のテキストに対して適用する。
+
+zstdの読み書きにはzstandardパッケージが必要（gzipは標準ライブラリのみ）。
+"""
+
+import gzip
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 拡張子と圧縮形式（pandasのcompression引数と同じ名前）
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+    '.zstd': 'zstd',
+}
+
+
+def compression_of(path):
+    """
+    拡張子から圧縮形式を判定
+
+    Returns:
+        str: 'gzip' / 'zstd'（圧縮されていない場合はNone）
+
+    Raises:
+        ImportError: zstdのファイルでzstandardがインストールされていない場合
+    """
+    _, extension = os.path.splitext(str(path).lower())
+    compression = COMPRESSION_EXTENSIONS.get(extension)
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError(f"zstd圧縮のファイルを扱うにはzstandardが必要です（pip install zstandard）: {path}")
+    return compression
+
+
+def strip_compression_suffix(path):
+    """圧縮の拡張子を除いたパス（"出力.csv.gz" → "出力.csv"）"""
+    base, extension = os.path.splitext(str(path))
+    return base if extension.lower() in COMPRESSION_EXTENSIONS else str(path)
+
+
+def open_binary(path, mode='rb'):
+    """
+    ファイルをバイナリで開く（拡張子に応じて展開・圧縮する）
+
+    Args:
+        path (str): ファイルパス
+        mode (str): 'rb' または 'wb'
+    """
+    compression = compression_of(path)
+    if compression == 'gzip':
+        return gzip.open(path, mode)
+    if compression == 'zstd':
+        return zstandard.open(path, mode)
+    return open(path, mode)
@@ -5,6 +5,7 @@
 YAMLマッピング設定に基づいてフィールド変換を実行
 """
 
+import numpy as np
 import pandas as pd
 import yaml
 import argparse
@@ -12,14 +13,57 @@ import logging
 from pathlib import Path
 from datetime import datetime
 import re
+import io
 import os
+import sys
+import csv
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from openai import OpenAI
+from jobins_gpt_classifier import GPTJobClassifier, CircuitOpenError, ESTIMATED_COMPLETION_TOKENS
+from jobins_local_classifier import keyword_based_classification, create_local_classifier
+from jobins_title_model import create_title_model_store, training_labels
+from jobins_output_writer import open_output_writer
+from jobins_title_normalizer import TitleNormalizer
+from jobins_transform_memo import TransformMemo, DEFAULT_MEMO_SIZE
+from jobins_company_scope import company_scoped_mappings, DEFAULT_COMPANY_KEY_FIELD
+from jobins_classification_cache import (
+    cache_file_path, major_cache_file_path, create_classification_cache, api_labels, SOURCE_API, SOURCE_FALLBACK,
+)
+from jobins_typed_columns import TypedColumns
+from jobins_input_cache import create_input_cache
+from jobins_input_reader import open_input, is_stdio, detect_input_encoding, InputEncodingError
+from jobins_compression import compression_of
+from jobins_deadline import DegradedRowLog, create_deadline_budget
 
 # ログ設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 標準入力・標準出力で変換する場合に1回に読み込む行数
+DEFAULT_STREAM_CHUNK_ROWS = 10000
+# 標準出力に書き出す場合に1回に変換する行数（後段のコマンドがすぐに処理を始められるよう小さくする）
+DEFAULT_STDOUT_CHUNK_ROWS = 100
+
+class _SourceRow:
+    """変換中の1行分のソース値（列名→位置の対応は全行で共有）"""
+    
+    __slots__ = ('values', 'column_index')
+    
+    def __init__(self, values, column_index):
+        self.values = values
+        self.column_index = column_index
+    
+    def get(self, field, default=None):
+        index = self.column_index.get(field)
+        if index is None or pd.isna(self.values[index]):
+            return default
+        return self.values[index]
+    
+    def __getitem__(self, field):
+        return self.values[self.column_index[field]]
+
 class JobinsCSVConverter:
     def __init__(self, yaml_config_path):
         """
@@ -42,13 +86,38 @@ class JobinsCSVConverter:
         else:
             self.openai_client = None
             logger.warning("OpenAI APIキーが設定されていません")
-        
-        # キャッシュ機能
-        self.job_classification_cache = {}
+        self.gpt_classifier = GPTJobClassifier(self.openai_client, settings=self.config.get('gpt_settings'))
         
         # 職種分類テーブル
         self.JOB_CATEGORIES = self._load_job_categories()
         
+        # キャッシュ機能（分類テーブルの変更で無効化、前回までの分類結果をファイルから読み込み）
+        self.job_classification_cache = self._load_classification_cache()
+        # 2段階分類（大分類→中分類）の大分類の選択肢と1段階目のキャッシュ
+        self.major_options = list(dict.fromkeys(category[0] for category in self.JOB_CATEGORIES))
+        self.major_classification_cache = (
+            self._load_classification_cache(major=True)
+            if self.gpt_classifier.settings['hierarchical_classification'] else None
+        )
+        # 確信度付きローカル分類（opt-in、キャッシュのうちAPIで分類したエントリで較正し、確信度が高いタイトルはAPIを呼ばない）
+        self.local_classifier = create_local_classifier(
+            self.JOB_CATEGORIES, self.gpt_classifier.settings, api_labels(self.job_classification_cache)
+        )
+        # API分類の結果から学習した職種分類モデル（opt-in、キャッシュのAPI分類が増えると再学習）
+        self.title_model = create_title_model_store(self.config, self.JOB_CATEGORIES)
+        self.title_normalizer = TitleNormalizer(self.config.get('title_normalization'))
+        self.transform_memo = TransformMemo(self.processing_rules.get('transform_memo_size', DEFAULT_MEMO_SIZE))
+        # 職種分類モデル・ローカル分類の判定のメモ（キャッシュには保存しないため、同じタイトルの行で判定を繰り返さないよう変換中に保持）
+        self.local_memo = TransformMemo(self.processing_rules.get('transform_memo_size', DEFAULT_MEMO_SIZE))
+        self.typed_columns = TypedColumns(
+            self.config.get('typed_columns'), [mapping['target_column'] for mapping in self.field_mapping]
+        )
+        # 解析済み入力のキャッシュ（opt-in）
+        self.input_cache = create_input_cache(self.processing_rules) if self.processing_rules.get('input_cache') else None
+        # 期限付きの変換（--deadline）の期限と、ローカル分類に切り替えた行の書き出し先
+        self.deadline = None
+        self.degraded_log = None
+        
     def _load_yaml_config(self):
         """YAMLマッピング設定を読み込み"""
         try:
@@ -58,31 +127,106 @@ class JobinsCSVConverter:
             logger.error(f"YAML設定ファイルの読み込みに失敗: {e}")
             raise
     
-    def _apply_filter(self, df):
-        """フィルタリング条件を適用"""
-        filtered_df = df.copy()
+    def _load_classification_cache(self, major=False):
+        """
+        職種分類キャッシュを作成し、前回までの分類結果をファイルから読み込み
+        
+        Args:
+            major (bool): 2段階分類の1段階目（大分類）のキャッシュの場合True
+        """
+        cache = create_classification_cache(self.processing_rules, self.JOB_CATEGORIES, major=major)
+        path = major_cache_file_path(self.processing_rules) if major else cache_file_path(self.processing_rules)
+        try:
+            cache.load(path)
+        except Exception as e:
+            logger.warning(f"{cache.name}の読み込みに失敗、空のキャッシュで開始: {e}")
+        if len(cache):
+            logger.info(f"{cache.name}を読み込み: {len(cache)} 件 ({path})")
+        return cache
+    
+    def save_classification_cache(self, path=None):
+        """職種分類キャッシュ（2段階分類の場合は大分類キャッシュも）をファイルに保存し、必要なら職種分類モデルを再学習"""
+        path = path or cache_file_path(self.processing_rules)
+        self.job_classification_cache.save(path)
+        logger.info(f"職種分類キャッシュを保存: {len(self.job_classification_cache)} 件 ({path})")
+        if self.major_classification_cache is not None:
+            major_path = major_cache_file_path(self.processing_rules)
+            self.major_classification_cache.save(major_path)
+            logger.info(f"職種大分類キャッシュを保存: {len(self.major_classification_cache)} 件 ({major_path})")
+        if self.title_model is not None:
+            # API分類が前回の学習から増えていれば職種分類モデルを別スレッドで再学習
+            self.title_model.maybe_retrain(training_labels(self.job_classification_cache))
+    
+    def _filter_mask(self, df, predicate_masks=None):
+        """
+        フィルタリング条件のマスクを作成
+        
+        Args:
+            df (DataFrame): 入力データフレーム
+            predicate_masks (dict): 条件ごとのマスクの共有キャッシュ（複数設定で同じ条件を再計算しない）
+        """
+        if predicate_masks is None:
+            predicate_masks = {}
+        mask = pd.Series(True, index=df.index)
         
         # 含める条件
         if 'include_if' in self.processing_rules['filter']:
             for field, value in self.processing_rules['filter']['include_if'].items():
-                if field in filtered_df.columns:
-                    filtered_df = filtered_df[filtered_df[field] == value]
-                    logger.info(f"フィルタ適用: {field} == {value}, 残り件数: {len(filtered_df)}")
+                if field in df.columns:
+                    key = ('include_if', field, value)
+                    if key not in predicate_masks:
+                        predicate_masks[key] = df[field] == value
+                    mask &= predicate_masks[key]
+                    logger.info(f"フィルタ適用: {field} == {value}, 残り件数: {int(mask.sum())}")
         
         # 除外条件
         if 'exclude_if' in self.processing_rules['filter']:
             for field, condition in self.processing_rules['filter']['exclude_if'].items():
-                if field in filtered_df.columns:
+                if field in df.columns:
                     if condition == '"" or null':
                         # 空文字またはnullを除外
-                        filtered_df = filtered_df[
-                            (filtered_df[field].notna()) & 
-                            (filtered_df[field] != '') & 
-                            (filtered_df[field] != '""')
-                        ]
-                        logger.info(f"フィルタ適用: {field} != '' or null, 残り件数: {len(filtered_df)}")
+                        key = ('exclude_if', field, condition)
+                        if key not in predicate_masks:
+                            predicate_masks[key] = (df[field].notna()) & (df[field] != '') & (df[field] != '""')
+                        mask &= predicate_masks[key]
+                        logger.info(f"フィルタ適用: {field} != '' or null, 残り件数: {int(mask.sum())}")
+        
+        return mask
+    
+    def _apply_filter(self, df):
+        """フィルタリング条件を適用（条件をマスクにまとめて1回だけ行を抽出）"""
+        return df.loc[self._filter_mask(df)].reset_index(drop=True)
+    
+    def _row_passes_filter(self, values, column_index):
+        """1行分の文字列値がフィルタリング条件を満たすか判定（ストリーミング処理用）"""
+        filter_rules = self.processing_rules['filter']
+        
+        for field, value in filter_rules.get('include_if', {}).items():
+            index = column_index.get(field)
+            if index is not None and index < len(values) and values[index].strip() != str(value):
+                return False
+        
+        for field, condition in filter_rules.get('exclude_if', {}).items():
+            index = column_index.get(field)
+            if index is not None and index < len(values) and condition == '"" or null':
+                if values[index].strip() in ('', '""') or values[index].strip().lower() == 'null':
+                    return False
         
-        return filtered_df
+        return True
+    
+    def _should_include_row(self, row, headers):
+        """行がフィルタ条件を満たすかチェック（GUI版と同じインターフェース）"""
+        return self._row_passes_filter(row, {column: i for i, column in enumerate(headers)})
+    
+    def _projected_columns(self):
+        """変換に必要な入力列（マッピングのソース列・フィルタ列・職種列）"""
+        columns = {"職種", self.processing_rules.get('company_key_field', DEFAULT_COMPANY_KEY_FIELD)}
+        for mapping in self.field_mapping:
+            if mapping['source_field'] and mapping['source_field'] != 'null':
+                columns.add(mapping['source_field'])
+        for condition_type in ('include_if', 'exclude_if'):
+            columns.update(self.processing_rules['filter'].get(condition_type, {}).keys())
+        return columns
     
     def _transform_field(self, source_value, transform_rule, source_row=None):
         """
@@ -328,16 +472,18 @@ class JobinsCSVConverter:
         if not source_value or not source_value.strip():
             return ""
         
-        # キャッシュから検索
-        cache_key = source_value.strip()
-        if cache_key in self.job_classification_cache:
+        # タイトルを正規化してからキャッシュ検索・分類（タグや全角半角の違いを同じキーにまとめる）
+        title = self.title_normalizer.normalize(source_value)
+        cache_key = title
+        cached = self.job_classification_cache.get(cache_key)
+        if cached is not None:
             logger.debug(f"キャッシュヒット: {cache_key}")
-            return self.job_classification_cache[cache_key]
+            return cached
         
         if not self.openai_client:
             # API未設定の場合はフォールバック
             result = "その他営業関連職"
-            self.job_classification_cache[cache_key] = result
+            self.job_classification_cache.put(cache_key, result, source=SOURCE_FALLBACK)
             logger.warning("OpenAI API未設定、フォールバック値を使用")
             return result
         
@@ -351,83 +497,115 @@ class JobinsCSVConverter:
                     ah_value = ""
             
             # AH列の値に基づいて選択肢をフィルタリング
-            if ah_value:
-                filtered_categories = [
-                    category for category in self.JOB_CATEGORIES 
-                    if category[2] == ah_value  # C列（Notion職種(紐づけ)）と一致
-                ]
-                if filtered_categories:
-                    job_options = [category[1] for category in filtered_categories]
-                    logger.info(f"AH列の値 '{ah_value}' に基づいて {len(job_options)} の選択肢にフィルタリング")
-                else:
-                    # 一致する選択肢がない場合は全選択肢を使用
-                    job_options = [category[1] for category in self.JOB_CATEGORIES]
-                    logger.warning(f"AH列の値 '{ah_value}' に一致する選択肢なし、全選択肢を使用")
-            else:
-                # AH列の値がない場合は全選択肢を使用
-                job_options = [category[1] for category in self.JOB_CATEGORIES]
+            job_options, matched = self._job_options_for(ah_value)
+            if not ah_value:
                 logger.info("AH列の値なし、全選択肢を使用")
+            elif matched:
+                logger.info(f"AH列の値 '{ah_value}' に基づいて {len(job_options)} の選択肢にフィルタリング")
+            else:
+                logger.warning(f"AH列の値 '{ah_value}' に一致する選択肢なし、全選択肢を使用")
             
-            job_options_text = "\n".join([f"{i+1}. {option}" for i, option in enumerate(job_options)])
-            
-            # プロンプト作成
-            prompt = f"""以下の業務内容に最も適した職種分類を、下記の選択肢から1つだけ選んでください。
-
-【業務内容】
-{source_value}
-
-【職種分類の選択肢】
-{job_options_text}
-
-回答は「番号: 職種名」の形式で、最も適切な1つだけを選択してください。
-例: 1: 企画営業【法人営業・個人営業】"""
-
-            # OpenAI API呼び出し
-            logger.info(f"OpenAI API呼び出し中...")
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "あなたは職種分類の専門家です。業務内容を分析して最適な職種分類を選択してください。"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=100,
-                temperature=0.1
-            )
+            # 職種分類モデル・ローカル分類の確信度がしきい値以上ならAPIを呼ばない
+            # （学習・較正をAPI分類の結果だけで行えるよう、キャッシュには保存しない）
+            if self.title_model is not None or self.local_classifier is not None:
+                result = self._resolve_local(title, ah_value, job_options)
+                if result is not None:
+                    return result
             
-            # レスポンス解析
-            answer = response.choices[0].message.content.strip()
-            logger.debug(f"GPT回答: {answer}")
+            # 期限に間に合わない場合はローカル分類に切り替え（次回の変換で再分類できるようキャッシュしない）
+            if self.deadline is not None and self.deadline.should_degrade():
+                result = keyword_based_classification(title)
+                self.deadline.record_degraded(title, result)
+                return result
             
-            # 回答から職種名を抽出（フィルタリングされた選択肢内で検証）
-            result = "その他営業関連職"  # デフォルト
-            for line in answer.split('\n'):
-                if ':' in line:
-                    try:
-                        parts = line.split(':', 1)
-                        if len(parts) == 2:
-                            job_name = parts[1].strip()
-                            # フィルタリングされた選択肢内に存在するかチェック
-                            if job_name in job_options:
-                                result = job_name
-                                break
-                    except:
-                        continue
-                    if result != "その他営業関連職":
-                        break
+            # OpenAI API呼び出し（選択肢は番号で送信し、番号のみの回答を検証）
+            logger.info(f"OpenAI API呼び出し中...")
+            started = time.monotonic()
+            if not matched and self.major_classification_cache is not None:
+                result = self._classify_two_stage(title)
+            else:
+                result = self.gpt_classifier.classify(title, job_options)
+            if self.deadline is not None:
+                self.deadline.record_call(time.monotonic() - started)
+            source = SOURCE_API
+            if result is None:
+                result = "その他営業関連職"  # デフォルト
+                source = SOURCE_FALLBACK
             
-            # キャッシュに保存
-            self.job_classification_cache[cache_key] = result
+            # キャッシュに保存（ローカル分類の較正・モデルの学習に使えるよう分類の出所も記録）
+            self.job_classification_cache.put(cache_key, result, source=source)
             logger.info(f"職種分類完了: {result}")
             return result
             
+        except CircuitOpenError:
+            # API障害中はローカル分類に切り替え（復旧後に再判定できるようキャッシュしない）
+            return keyword_based_classification(title)
+            
         except Exception as e:
-            # API呼び出し失敗時のフォールバック
-            import traceback
+            # API呼び出し失敗時のローカル分類フォールバック（キャッシュしない）
             logger.error(f"OpenAI API呼び出しエラー: {e}")
-            logger.error(f"スタックトレース: {traceback.format_exc()}")
-            result = "その他営業関連職"
-            self.job_classification_cache[cache_key] = result
-            return result
+            logger.debug("スタックトレース", exc_info=True)
+            return keyword_based_classification(title)
+    
+    def _resolve_local(self, title, ah_value, job_options):
+        """
+        職種分類モデル・ローカル分類の確信度がしきい値以上ならその分類を返す（APIで分類すべき場合はNone）
+        
+        判定は (正規化したタイトル, 職種) ごとにメモし、同じタイトルの行ではモデルの予測や確信度を計算し直さない。
+        モデルを再学習した後の判定はモデルのバージョンごとに別にメモする。
+        """
+        def resolve(_):
+            if self.title_model is not None:
+                result = self.title_model.resolve(title, job_options)
+                if result is not None:
+                    return result
+            if self.local_classifier is not None:
+                return self.local_classifier.resolve(title, job_options)
+            return None
+        
+        model_version = self.title_model.version if self.title_model is not None else None
+        return self.local_memo.get_or_compute(
+            ("ローカル分類", model_version), (title, ah_value), resolve
+        )
+    
+    def _classify_two_stage(self, title):
+        """
+        大分類を選んでから、その大分類の中分類の中から選ぶ（全選択肢を1回で送るより短いプロンプトで分類）
+        
+        1段階目の大分類は大分類キャッシュに保存し、2段階目の中分類は呼び出し元で職種分類キャッシュに保存する。
+        
+        Returns:
+            str: 職種分類（中分類）（判定できなかった場合はNone）
+        """
+        major = self.major_classification_cache.get(title)
+        if major is None:
+            major = self.gpt_classifier.classify(title, self.major_options)
+            if major is None:
+                return None
+            self.major_classification_cache[title] = major
+        return self.gpt_classifier.classify(title, self._job_options_for_major(major))
+    
+    def _job_options_for_major(self, major):
+        """大分類に属する職種分類（中分類）の選択肢"""
+        return [category[1] for category in self.JOB_CATEGORIES if category[0] == major]
+    
+    def classify_title(self, title, job_type=""):
+        """求人タイトルと職種から職種分類（中分類）を判定（キャッシュのウォームアップ用）"""
+        return self._classify_job_category_with_gpt(title, None, {"職種": job_type})
+    
+    def _job_options_for(self, ah_value):
+        """
+        AH列（職種）の値に対応する職種分類（中分類）の選択肢
+        
+        Returns:
+            tuple: (選択肢リスト, AH列の値に一致する選択肢があったか)
+        """
+        if ah_value:
+            # C列（Notion職種(紐づけ)）と一致する選択肢に絞り込み
+            filtered_options = [category[1] for category in self.JOB_CATEGORIES if category[2] == ah_value]
+            if filtered_options:
+                return filtered_options, True
+        return [category[1] for category in self.JOB_CATEGORIES], False
     
     def _get_job_major_category(self, job_minor_category):
         """職種中分類から職種大分類を取得"""
@@ -436,142 +614,679 @@ class JobinsCSVConverter:
                 return major
         return ""
     
-    def convert_csv(self, input_csv_path, output_csv_path=None):
+    def _transform_company_scoped(self, df):
         """
-        CSVファイルを変換
+        会社単位（scope: company）の列をグループごとに変換
         
-        Args:
-            input_csv_path (str): 入力CSVファイルパス
-            output_csv_path (str): 出力CSVファイルパス
-            
         Returns:
-            pandas.DataFrame: 変換後のデータフレーム
+            tuple: (行ごとのグループ番号, {target_column: グループ番号順の変換後の値})
         """
-        logger.info(f"CSVファイル読み込み開始: {input_csv_path}")
+        company_key_field = self.processing_rules.get('company_key_field', DEFAULT_COMPANY_KEY_FIELD)
+        mappings = [
+            mapping for mapping in company_scoped_mappings(self.field_mapping)
+            if mapping['source_field'] in df.columns
+        ]
+        if not mappings or company_key_field not in df.columns or len(df) == 0:
+            return None, {}
         
-        # CSVファイル読み込み
-        try:
-            df = pd.read_csv(input_csv_path, encoding='utf-8-sig')
-            logger.info(f"読み込み完了: {len(df)} 行")
-        except Exception as e:
-            logger.error(f"CSVファイル読み込みエラー: {e}")
-            raise
+        group_fields = [company_key_field]
+        for mapping in mappings:
+            if mapping['source_field'] not in group_fields:
+                group_fields.append(mapping['source_field'])
+        # 各列を整数コードにしてからコードの組み合わせでグループ化（文字列の比較を避ける）
+        codes = np.column_stack([
+            pd.factorize(df[field], use_na_sentinel=False)[0] for field in group_fields
+        ])
+        _, first_rows, group_ids = np.unique(codes, axis=0, return_index=True, return_inverse=True)
+        group_ids = group_ids.reshape(-1)
+        del codes
         
-        # フィルタリング適用
-        filtered_df = self._apply_filter(df)
-        logger.info(f"フィルタリング後: {len(filtered_df)} 行")
+        company_columns = {}
+        for mapping in mappings:
+            transform_rule = mapping['transform']
+            representatives = df[mapping['source_field']].to_numpy(dtype=object)[first_rows]
+            values = np.empty(len(first_rows), dtype=object)
+            for i, value in enumerate(representatives):
+                if transform_rule == "そのまま":
+                    values[i] = value if pd.notna(value) else ""
+                else:
+                    values[i] = self.transform_memo.get_or_compute(
+                        transform_rule, value, lambda v: self._transform_field(v, transform_rule)
+                    )
+            company_columns[mapping['target_column']] = values
         
-        # 出力データフレーム初期化
-        output_df = pd.DataFrame()
+        logger.info(f"会社単位の変換: {len(first_rows)} グループ / {len(df)} 行（対象列: {len(mappings)} 列）")
+        return group_ids, company_columns
+    
+    def _build_output(self, df, row_offset=0):
+        """
+        フィルタ済みデータフレームから出力データフレームを作成
         
-        # フィールドマッピングを適用（職種分類を先に処理）
-        job_minor_categories = {}  # 行ごとの職種分類（中分類）を保存
+        列ごとに変換して出力に書き込み、一時リストと使い終わったソース列はすぐに解放する。
+        行の位置で対応付けるため、dfのインデックスは0からの連番であること。
         
-        # 1. 職種分類（中分類）を先に処理
+        Args:
+            row_offset (int): 先頭行の前までに出力した行数（分割して変換する場合のローカル分類行ファイルの行番号用）
+        """
+        row_count = len(df)
+        output_df = pd.DataFrame(index=pd.RangeIndex(row_count))
+        
+        # ソース列ごとの最後の使用位置（以降は解放してよい）
+        last_use = {}
+        for position, mapping in enumerate(self.field_mapping):
+            last_use[mapping['source_field']] = position
+        
+        # 1. 職種分類（中分類）を先に処理（行の位置に対応するタプル）
+        job_minor_categories = ("",) * row_count
         for mapping in self.field_mapping:
-            target_column = mapping['target_column']
-            if target_column == "職種分類（中分類）":
+            if mapping['target_column'] == "職種分類（中分類）":
                 source_field = mapping['source_field']
                 transform_rule = mapping['transform']
                 
                 logger.info("職種分類（中分類）の処理開始")
                 
-                if source_field in filtered_df.columns:
-                    # 各行に対して職種分類を実行
-                    for idx, row in filtered_df.iterrows():
-                        source_value = row[source_field] if pd.notna(row[source_field]) else ""
-                        job_minor = self._transform_field(source_value, transform_rule, row)
-                        job_minor_categories[idx] = job_minor
-                    
-                    output_df[target_column] = [job_minor_categories.get(idx, "") for idx in filtered_df.index]
+                if source_field in df.columns:
+                    column_index = {column: i for i, column in enumerate(df.columns)}
+                    job_minor_categories = tuple(
+                        sys.intern(self._transform_field(
+                            values[column_index[source_field]] if pd.notna(values[column_index[source_field]]) else "",
+                            transform_rule,
+                            _SourceRow(values, column_index)
+                        ))
+                        for values in self._with_deadline_progress(df.itertuples(index=False, name=None), row_count)
+                    )
+                    if self.deadline is not None and self.deadline.degraded_titles:
+                        self._record_degraded_rows(df, source_field, job_minor_categories, row_offset)
                     logger.info(f"職種分類（中分類）完了: {len(self.job_classification_cache)} 件キャッシュ")
+                    logger.info(self.job_classification_cache.summary())
+                    if self.major_classification_cache is not None:
+                        logger.info(self.major_classification_cache.summary())
+                    if self.title_model is not None:
+                        logger.info(self.title_model.summary())
+                    if self.local_classifier is not None:
+                        logger.info(self.local_classifier.summary())
+                    if self.openai_client:
+                        logger.info(self.gpt_classifier.usage_summary())
                 else:
                     logger.warning(f"ソースフィールドが見つかりません: {source_field}")
-                    output_df[target_column] = ""
                 break
         
-        # 2. その他のフィールドを処理
-        for mapping in self.field_mapping:
+        # 2. 会社単位の列は (企業名, ソース値) のグループごとに1回だけ変換
+        group_ids, company_columns = self._transform_company_scoped(df)
+        
+        # 3. マッピング順に各フィールドを処理
+        for position, mapping in enumerate(self.field_mapping):
             source_field = mapping['source_field']
             target_column = mapping['target_column']
             transform_rule = mapping['transform']
             
-            # 職種分類（中分類）は既に処理済みなのでスキップ
-            if target_column == "職種分類（中分類）":
-                continue
-            
             logger.debug(f"変換中: {source_field} -> {target_column}")
             
-            if target_column == "職種（大分類）":
+            if target_column == "職種分類（中分類）":
+                output_df[target_column] = job_minor_categories
+                
+            elif target_column in company_columns:
+                # グループごとの値を同じ会社の行に展開
+                output_df[target_column] = company_columns.pop(target_column)[group_ids]
+                
+            elif target_column == "職種（大分類）":
                 # 職種（大分類）は職種分類（中分類）から取得
                 output_df[target_column] = [
-                    self._get_job_major_category(job_minor_categories.get(idx, ""))
-                    for idx in filtered_df.index
+                    sys.intern(self._get_job_major_category(job_minor)) for job_minor in job_minor_categories
                 ]
                 logger.info("職種（大分類）完了")
                 
             elif source_field == 'null' or source_field is None:
-                # ソースフィールドがnullの場合は固定値または空値
+                # ソースフィールドがnullの場合は固定値または空値（全行で同じ値を共有）
                 if transform_rule.startswith("固定："):
-                    output_df[target_column] = transform_rule.replace("固定：", "").strip().replace('"', '')
+                    output_df[target_column] = sys.intern(transform_rule.replace("固定：", "").strip().replace('"', ''))
                 else:
                     output_df[target_column] = ""
+                
+            elif source_field in df.columns:
+                if transform_rule == "そのまま":
+                    output_df[target_column] = df[source_field].fillna("")
+                else:
+                    # ユニーク値ごとに1回だけ変換して全行に展開（factorize → map）
+                    codes, uniques = pd.factorize(df[source_field], use_na_sentinel=False)
+                    transformed = np.empty(len(uniques), dtype=object)
+                    for i, value in enumerate(uniques):
+                        result = self.transform_memo.get_or_compute(
+                            transform_rule, value, lambda v: self._transform_field(v, transform_rule)
+                        )
+                        # 分類結果などの繰り返し値はintern
+                        transformed[i] = sys.intern(result) if isinstance(result, str) else result
+                    output_df[target_column] = transformed[codes]
+                    del codes, uniques, transformed
+                
+                # 以降で使わないソース列は解放
+                if last_use[source_field] == position:
+                    del df[source_field]
             else:
-                # ソースフィールドが存在する場合
-                if source_field in filtered_df.columns:
-                    # 各行に対して変換ルールを適用
-                    output_df[target_column] = filtered_df.apply(
-                        lambda row: self._transform_field(
-                            row[source_field], transform_rule, row
-                        ), 
-                        axis=1
-                    )
+                logger.warning(f"ソースフィールドが見つかりません: {source_field}")
+                output_df[target_column] = ""
+        
+        logger.info(self.transform_memo.summary())
+        return output_df
+    
+    def estimate_run(self, input_csv_path):
+        """
+        変換を実行した場合のAPI呼び出し数・トークン数・所要時間を見積もり（APIは呼び出さない）
+        
+        入力CSVを1回だけストリーミングで読み、フィルタリング・タイトルの正規化と重複除去・
+        キャッシュ確認を行い、キャッシュにないタイトルごとに実際の選択肢リストでトークン数を数える。
+        
+        Returns:
+            dict: 見積もり結果
+        """
+        title_field = None
+        for mapping in self.field_mapping:
+            if mapping['target_column'] == "職種分類（中分類）" and "GPT" in mapping['transform']:
+                title_field = mapping['source_field']
+                break
+        
+        input_rows = 0
+        passed_rows = 0
+        titled_rows = 0
+        title_counts = {}
+        prompt_tokens = 0
+        api_requests = 0
+        option_list_tokens = {}
+        
+        with open_input(input_csv_path) as infile:
+            reader = csv.reader(infile)
+            headers = next(reader, [])
+            column_index = {column: i for i, column in enumerate(headers)}
+            title_index = column_index.get(title_field)
+            job_type_index = column_index.get("職種")
+            
+            for values in reader:
+                input_rows += 1
+                if not self._row_passes_filter(values, column_index):
+                    continue
+                passed_rows += 1
+                
+                if title_index is None or title_index >= len(values) or not values[title_index].strip():
+                    continue
+                titled_rows += 1
+                title = self.title_normalizer.normalize(values[title_index])
+                if title in title_counts:
+                    title_counts[title] += 1
+                    continue
+                title_counts[title] = 1
+                if title in self.job_classification_cache:
+                    continue
+                
+                # 分類時と同じく最初に出現した行の職種で選択肢を決める
+                ah_value = ""
+                if job_type_index is not None and job_type_index < len(values):
+                    ah_value = values[job_type_index].strip()
+                job_options, matched = self._job_options_for(ah_value)
+                if not matched and self.major_classification_cache is not None:
+                    requests, request_tokens = self._estimate_two_stage(title)
                 else:
-                    logger.warning(f"ソースフィールドが見つかりません: {source_field}")
-                    output_df[target_column] = ""
+                    requests = 1
+                    request_tokens = self.gpt_classifier.estimate_prompt_tokens(title, job_options)
+                prompt_tokens += request_tokens
+                api_requests += requests
+                job_type_usage = option_list_tokens.setdefault(ah_value or "（なし）", [0, 0])
+                job_type_usage[0] += requests
+                job_type_usage[1] += request_tokens
         
-        # 出力ファイル保存
-        if output_csv_path:
+        cached_titles = sum(1 for title in title_counts if title in self.job_classification_cache)
+        settings = self.gpt_classifier.settings
+        concurrency = max(1, int(settings['concurrency']))
+        latency = float(settings['estimated_latency'])
+        
+        return {
+            'input_rows': input_rows,
+            'passed_rows': passed_rows,
+            'titled_rows': titled_rows,
+            'distinct_titles': len(title_counts),
+            'cached_titles': cached_titles,
+            'api_requests': api_requests,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': api_requests * ESTIMATED_COMPLETION_TOKENS,
+            'tokens_by_job_type': {
+                job_type: tuple(usage) for job_type, usage in option_list_tokens.items()
+            },
+            'concurrency': concurrency,
+            'wall_time_seconds': -(-api_requests // concurrency) * latency,
+            'api_key_configured': self.openai_client is not None,
+        }
+    
+    def _estimate_two_stage(self, title):
+        """
+        2段階分類のAPI呼び出し数とpromptトークン数を見積もり
+        
+        2段階目の大分類は実行するまで分からないため、大分類ごとの選択肢の平均で見積もる。
+        
+        Returns:
+            tuple: (API呼び出し数, promptトークン数)
+        """
+        stage_two = [
+            self.gpt_classifier.estimate_prompt_tokens(title, self._job_options_for_major(major))
+            for major in self.major_options
+        ]
+        tokens = sum(stage_two) // len(stage_two)
+        if title in self.major_classification_cache:
+            return 1, tokens
+        return 2, tokens + self.gpt_classifier.estimate_prompt_tokens(title, self.major_options)
+    
+    def _read_input(self, input_csv_path, columns):
+        """入力CSVを読み込み（指定した列のみ）"""
+        logger.info(f"CSVファイル読み込み開始: {input_csv_path}")
+        
+        def read_csv():
+            # .gz / .zst は展開しながら解析（BOMは展開後のテキストで判定される）
+            try:
+                if encoding is None:
+                    # 先頭がASCIIのみの場合は、最初の非ASCIIのバイトで文字コードを判定しながら読む
+                    with open_input(input_csv_path) as infile:
+                        return pd.read_csv(infile, usecols=lambda column: column in columns)
+                return pd.read_csv(input_csv_path, encoding=encoding, compression=compression_of(input_csv_path),
+                                   usecols=lambda column: column in columns)
+            except UnicodeDecodeError as e:
+                raise InputEncodingError(f"入力CSVに文字コード {encoding} で解釈できないバイトがあります: {e}") from e
+        
+        try:
+            # 文字コードは先頭のブロックから判定（解釈できない場合は分類の前に中止）
+            encoding = detect_input_encoding(input_csv_path)
+            if self.input_cache is not None:
+                df = self.input_cache.read_csv(input_csv_path, columns, read_csv)
+            else:
+                df = read_csv()
+            logger.info(f"読み込み完了: {len(df)} 行")
+        except Exception as e:
+            logger.error(f"CSVファイル読み込みエラー: {e}")
+            raise
+        return df
+    
+    def _with_deadline_progress(self, rows, row_count):
+        """期限付きの変換の場合、行を渡すごとに処理済みの行数を期限の見込みに反映"""
+        if self.deadline is None:
+            return rows
+        
+        def tracked():
+            for done, row in enumerate(rows):
+                self.deadline.set_progress(done, row_count)
+                yield row
+        return tracked()
+    
+    def _record_degraded_rows(self, df, source_field, job_minor_categories, row_offset):
+        """ローカル分類に切り替えたタイトルの行をローカル分類行ファイルに書き出し"""
+        if self.degraded_log is None:
+            return
+        job_types = df["職種"] if "職種" in df.columns else ("",) * len(df)
+        for position, (source_value, job_type, label) in enumerate(zip(df[source_field], job_types, job_minor_categories)):
+            if pd.isna(source_value) or not str(source_value).strip():
+                continue
+            if self.deadline.is_degraded_title(self.title_normalizer.normalize(source_value)):
+                self.degraded_log.record(row_offset + position + 1, source_value,
+                                         job_type if pd.notna(job_type) else "", label)
+    
+    @contextmanager
+    def _degraded_rows(self, output_csv_path):
+        """期限付きの変換の場合、変換中にローカル分類に切り替えた行をローカル分類行ファイルに書き出す"""
+        if self.deadline is None:
+            yield
+            return
+        self.degraded_log = DegradedRowLog(output_csv_path, self.processing_rules)
+        try:
+            yield
+        finally:
+            self.degraded_log.close()
+            logger.info(self.deadline.summary())
+            logger.info(self.degraded_log.summary())
+            self.degraded_log = None
+    
+    def _convert_frame(self, df):
+        """フィルタ済みデータフレームを変換し、数値列を型付け・検証"""
+        output_df = self._build_output(df)
+        
+        # 数値列（年収・年齢・従業員数）の型付けと検証（列単位のベクトル演算）
+        if self.typed_columns:
+            self.typed_columns.violations.clear()
+            self.typed_columns.apply_frame(output_df)
+            logger.info(self.typed_columns.summary())
+        
+        return output_df
+    
+    def _save_cache_if_used(self):
+        """API分類の結果は次回以降の変換のためにキャッシュファイルへ保存"""
+        if self.openai_client:
             try:
-                output_df.to_csv(output_csv_path, encoding='utf-8-sig', index=False)
-                logger.info(f"変換完了: {output_csv_path}")
+                self.save_classification_cache()
             except Exception as e:
-                logger.error(f"出力ファイル保存エラー: {e}")
-                raise
+                logger.warning(f"職種分類キャッシュの保存に失敗: {e}")
+    
+    def _write_output(self, output_df, output_csv_path):
+        """出力ファイルと数値列の検証レポートを保存"""
+        try:
+            if str(output_csv_path).lower().endswith('.xlsx'):
+                # JOBINS用書式のテンプレートシートに1行ずつ書き込み
+                with open_output_writer(output_csv_path, list(output_df.columns), self.processing_rules) as writer:
+                    for row in output_df.itertuples(index=False, name=None):
+                        writer.writerow(row)
+            else:
+                output_df.to_csv(output_csv_path, encoding='utf-8-sig', index=False,
+                                 compression=compression_of(output_csv_path))
+            logger.info(f"変換完了: {output_csv_path}")
+            report_path = self.typed_columns.write_report(output_csv_path) if self.typed_columns else None
+            if report_path:
+                logger.warning(f"数値列の検証で問題が見つかりました: {report_path}")
+        except Exception as e:
+            logger.error(f"出力ファイル保存エラー: {e}")
+            raise
+    
+    def convert_csv(self, input_csv_path, output_csv_path=None):
+        """
+        CSVファイルを変換
+        
+        Args:
+            input_csv_path (str): 入力CSVファイルパス
+            output_csv_path (str): 出力CSVファイルパス
+            
+        Returns:
+            pandas.DataFrame: 変換後のデータフレーム
+        """
+        # CSVファイル読み込み（変換に使う列のみ）
+        df = self._read_input(input_csv_path, self._projected_columns())
+        
+        # フィルタリング適用（元のデータフレームは保持しない）
+        df = self._apply_filter(df)
+        logger.info(f"フィルタリング後: {len(df)} 行")
+        
+        with self._degraded_rows(output_csv_path or input_csv_path):
+            output_df = self._convert_frame(df)
+        self._save_cache_if_used()
+        
+        # 出力ファイル保存
+        if output_csv_path:
+            self._write_output(output_df, output_csv_path)
         
         return output_df
+    
+    def convert_csv_stream(self, input_csv_path, output_csv_path):
+        """
+        入力を分割して読み込み、変換した行を順に書き出す（標準入力・標準出力のパイプライン用）
+        
+        入力全体をメモリに載せず、processing_rulesのstream_chunk_rows行ごとに
+        フィルタ・変換・書き出しを行う。職種分類キャッシュと変換メモは分割をまたいで共有する。
+        標準出力に書き出す場合は、入力が届いたそばから出力されるようstream_stdout_chunk_rows行
+        （既定100行）ごとに変換して書き出す。
+        
+        Args:
+            input_csv_path (str): 入力CSVファイルパス（「-」は標準入力）
+            output_csv_path (str): 出力ファイルパス（「-」は標準出力）
+            
+        Returns:
+            int: 変換件数
+        """
+        to_stdout = is_stdio(output_csv_path)
+        if to_stdout:
+            chunk_rows = self.processing_rules.get('stream_stdout_chunk_rows', DEFAULT_STDOUT_CHUNK_ROWS)
+        else:
+            chunk_rows = self.processing_rules.get('stream_chunk_rows', DEFAULT_STREAM_CHUNK_ROWS)
+        columns = self._projected_columns()
+        output_columns = [mapping['target_column'] for mapping in self.field_mapping]
+        if self.typed_columns:
+            self.typed_columns.violations.clear()
+        
+        logger.info(f"CSVファイル読み込み開始: {input_csv_path}（{chunk_rows} 行ずつ変換）")
+        input_count = 0
+        output_count = 0
+        try:
+            # 分割して変換するため途中で中止すると分類済みの分が無駄になる。先頭のブロックより後の
+            # 解釈できないバイトは置換文字（U+FFFD）にして変換を続ける
+            with open_input(input_csv_path, errors='replace') as infile, \
+                 open_output_writer(output_csv_path, output_columns, self.processing_rules) as writer, \
+                 self._degraded_rows(output_csv_path):
+                usecols = lambda column: column in columns
+                if to_stdout:
+                    chunks = _read_csv_batches(infile, chunk_rows, usecols)
+                else:
+                    chunks = pd.read_csv(infile, usecols=usecols, chunksize=chunk_rows)
+                for chunk in chunks:
+                    input_count += len(chunk)
+                    df = self._apply_filter(chunk)
+                    output_df = self._build_output(df, row_offset=output_count)
+                    if self.typed_columns:
+                        self.typed_columns.apply_frame(output_df, row_offset=output_count)
+                    writer.write_frame(output_df)
+                    output_count += len(output_df)
+        finally:
+            self._save_cache_if_used()
+        
+        logger.info(f"変換完了: {output_csv_path}（入力: {input_count} 行, 出力: {output_count} 行）")
+        if self.typed_columns:
+            logger.info(self.typed_columns.summary())
+            report_path = self.typed_columns.write_report(output_csv_path)
+            if report_path:
+                logger.warning(f"数値列の検証で問題が見つかりました: {report_path}")
+        return output_count
+
+def _read_csv_batches(infile, batch_rows, usecols):
+    """
+    CSVをbatch_rows行ずつのデータフレームとして読み込む（標準出力に書き出す場合用）
+    
+    pandasのchunksizeは内部の読み込みバッファ（数百KB）が埋まるまで入力を待つため、
+    行単位で読み進めてbatch_rows行たまるごとにpandasで解析する。
+    引用符内の改行を含むレコードは、引用符の数が偶数になるまでの行をまとめて1行として扱う。
+    """
+    def records():
+        lines = []
+        quotes = 0
+        for line in infile:
+            lines.append(line)
+            quotes += line.count('"')
+            if quotes % 2 == 0:
+                yield "".join(lines)
+                lines, quotes = [], 0
+        if lines:
+            yield "".join(lines)
+    
+    rows = records()
+    header = next(rows, "")
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_rows:
+            yield pd.read_csv(io.StringIO(header + "".join(batch)), usecols=usecols)
+            batch = []
+    if batch or not header:
+        # 空の入力はpandasの分割読み込みと同じくEmptyDataErrorにする
+        yield pd.read_csv(io.StringIO(header + "".join(batch)), usecols=usecols)
+
+def _input_read_settings(converter):
+    """入力の読み込み結果に関わる設定（入力キャッシュの有無・保存先・形式）"""
+    if converter.input_cache is None:
+        return None
+    return (converter.input_cache.cache_dir, converter.input_cache.cache_format)
+
+def convert_csv_multi(converters, input_csv_path, output_paths):
+    """
+    複数のYAML設定による変換を、入力CSVの1回の読み込みで実行
+    
+    入力は全設定で使う列をまとめて1回だけ読み込み、同じフィルタ条件のマスクは共有する。
+    職種分類テーブルとタイトル正規化の設定が同じ設定同士では職種分類キャッシュも共有する。
+    入力の読み込みに関わる設定（入力キャッシュ）は全設定で同じでなければならない。
+    
+    Args:
+        converters (list): JobinsCSVConverter のリスト
+        input_csv_path (str): 入力CSVファイルパス
+        output_paths (list): 設定ごとの出力ファイルパス
+        
+    Returns:
+        list: 設定ごとの変換件数
+    
+    Raises:
+        ValueError: 入力の読み込みに関わる設定が設定ファイル間で異なる場合
+    """
+    # 入力は最初の変換器の設定で読み込むため、読み込みに関わる設定は全設定で揃っている必要がある
+    reader = converters[0]
+    for converter in converters[1:]:
+        if _input_read_settings(converter) != _input_read_settings(reader):
+            raise ValueError(
+                f"入力の読み込み設定（input_cache / input_cache_dir / input_cache_format）が設定ファイル間で異なります: "
+                f"{reader.yaml_config_path} / {converter.yaml_config_path}"
+            )
+    
+    # 職種分類キャッシュの共有（職種分類テーブルとタイトル正規化の設定が同じ変換器のキャッシュを1つにまとめる）
+    shared_caches = {}
+    for converter in converters:
+        cache = converter.job_classification_cache
+        shared = shared_caches.setdefault((cache.table_version, converter.title_normalizer.settings_key), cache)
+        if shared is not cache:
+            for title, label, stored_at, table_version, source in cache.records():
+                if title not in shared:
+                    shared.put(title, label, stored_at, table_version, source)
+            converter.job_classification_cache = shared
+    
+    columns = set()
+    for converter in converters:
+        columns |= converter._projected_columns()
+    df = reader._read_input(input_csv_path, columns)
+    
+    predicate_masks = {}
+    row_counts = []
+    for converter, output_path in zip(converters, output_paths):
+        logger.info(f"変換開始: {converter.yaml_config_path} → {output_path}")
+        mask = converter._filter_mask(df, predicate_masks)
+        projected = [column for column in df.columns if column in converter._projected_columns()]
+        filtered = df.loc[mask, projected].reset_index(drop=True)
+        logger.info(f"フィルタリング後: {len(filtered)} 行")
+        
+        with converter._degraded_rows(output_path):
+            output_df = converter._convert_frame(filtered)
+        del filtered
+        converter._write_output(output_df, output_path)
+        row_counts.append(len(output_df))
+        del output_df
+    
+    # 共有したキャッシュはそれぞれのキャッシュファイルに保存
+    for converter in converters:
+        converter._save_cache_if_used()
+    return row_counts
+
+def print_run_estimate(estimate):
+    """--dry-runの見積もり結果を表示"""
+    minutes, seconds = divmod(int(round(estimate['wall_time_seconds'])), 60)
+    hours, minutes = divmod(minutes, 60)
+    
+    print("見積もり（APIは呼び出していません）")
+    print(f"入力: {estimate['input_rows']} 行")
+    print(f"フィルタリング後: {estimate['passed_rows']} 行（タイトルあり: {estimate['titled_rows']} 行）")
+    print(f"正規化後のタイトル: {estimate['distinct_titles']} 種類"
+          f"（キャッシュ済み: {estimate['cached_titles']}, 要分類: {estimate['distinct_titles'] - estimate['cached_titles']}）")
+    print(f"API呼び出し: {estimate['api_requests']} 回")
+    print(f"promptトークン: {estimate['prompt_tokens']}, completionトークン: {estimate['completion_tokens']}")
+    for job_type, (requests, tokens) in sorted(
+            estimate['tokens_by_job_type'].items(), key=lambda item: item[1][1], reverse=True):
+        print(f"  職種 {job_type}: {requests} 回, promptトークン {tokens}")
+    print(f"所要時間: 約 {hours}時間{minutes:02d}分{seconds:02d}秒（同時実行数: {estimate['concurrency']}）")
+    if not estimate['api_key_configured']:
+        print("注意: OpenAI APIキーが設定されていないため、実際の変換ではAPIを呼び出しません")
+
+def _default_output_paths(converters, input_csv_path):
+    """
+    設定ごとの出力ファイル名を生成（入力CSVと同じフォルダ）
+    
+    output_filename_patternの{datetime}を日時に置き換える。
+    複数の設定で同じファイル名になる場合は設定ファイル名を付ける。
+    標準入力から読み込む場合は標準出力に書き出す。
+    """
+    if is_stdio(input_csv_path):
+        return ["-"] * len(converters)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    input_path = Path(input_csv_path)
+    names = [
+        converter.processing_rules.get('output_filename_pattern', "JOBINS掲載用_{datetime}.csv").format(datetime=timestamp)
+        for converter in converters
+    ]
+    if len(converters) > 1:
+        names = [
+            f"{Path(converter.yaml_config_path).stem}_{name}" if names.count(name) > 1 else name
+            for converter, name in zip(converters, names)
+        ]
+    return [input_path.parent / name for name in names]
 
 def main():
     """メイン実行関数"""
     parser = argparse.ArgumentParser(description='求人マスタCSVをJobins用CSVへ変換')
-    parser.add_argument('input_csv', help='入力CSVファイルパス')
-    parser.add_argument('-c', '--config', default='jobins_yaml_mapping.yaml', 
-                       help='YAMLマッピング設定ファイル (default: jobins_yaml_mapping.yaml)')
-    parser.add_argument('-o', '--output', help='出力CSVファイルパス')
+    parser.add_argument('input_csv', help='入力CSVファイルパス（「-」で標準入力）')
+    parser.add_argument('-c', '--config', action='append',
+                       help='YAMLマッピング設定ファイル（複数指定すると1回の読み込みで設定ごとに出力） '
+                            '(default: jobins_yaml_mapping.yaml)')
+    parser.add_argument('-o', '--output', action='append',
+                       help='出力ファイルパス（.xlsxの場合はJOBINS用書式で出力、「-」で標準出力、-cと同じ数だけ指定）')
     parser.add_argument('-v', '--verbose', action='store_true', help='詳細ログ出力')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='変換せずにAPI呼び出し数・トークン数・所要時間を見積もる')
+    parser.add_argument('--input-cache', action='store_true',
+                       help='解析済みの入力をFeather/Parquetで保存し、次回以降はCSVの解析を省く（pyarrowが必要）')
+    parser.add_argument('--deadline',
+                       help='変換の期限（3600 / 45m / 1h30m の期間、または 17:30 の時刻）。間に合わない見込みになると'
+                            '残りのキャッシュにないタイトルをローカル分類に切り替え、その行をファイルに書き出す')
     
     args = parser.parse_args()
+    configs = args.config or ['jobins_yaml_mapping.yaml']
     
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
-    # 出力ファイル名生成
-    if not args.output:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        input_path = Path(args.input_csv)
-        args.output = input_path.parent / f"JOBINS掲載用_{timestamp}.csv"
+    if args.dry_run:
+        try:
+            for config in configs:
+                converter = JobinsCSVConverter(config)
+                if len(configs) > 1:
+                    print(f"\n[{config}]")
+                print_run_estimate(converter.estimate_run(args.input_csv))
+        except Exception as e:
+            logger.error(f"見積もり処理でエラーが発生しました: {e}")
+            return 1
+        return 0
+    
+    if args.output and len(args.output) != len(configs):
+        logger.error(f"出力ファイルは設定ファイルと同じ数（{len(configs)}）だけ指定してください")
+        return 1
     
     try:
         # 変換器初期化
-        converter = JobinsCSVConverter(args.config)
+        converters = [JobinsCSVConverter(config) for config in configs]
+        if args.input_cache:
+            for converter in converters:
+                converter.input_cache = create_input_cache(converter.processing_rules)
+        if args.deadline:
+            # 複数の設定で変換する場合も期限は全体で1つ
+            deadline = create_deadline_budget(
+                args.deadline, converters[0].gpt_classifier.settings, converters[0].processing_rules
+            )
+            for converter in converters:
+                converter.deadline = deadline
+        
+        # 出力ファイル名生成
+        outputs = args.output or _default_output_paths(converters, args.input_csv)
         
-        # CSV変換実行
-        result_df = converter.convert_csv(args.input_csv, args.output)
+        # CSV変換実行（標準入力・標準出力を使う場合は分割して順に書き出す）
+        streaming = is_stdio(args.input_csv) or any(is_stdio(output) for output in outputs)
+        if streaming and len(converters) > 1:
+            logger.error("標準入力・標準出力を使う場合は設定ファイルを1つだけ指定してください")
+            return 1
+        if streaming:
+            row_counts = [converters[0].convert_csv_stream(args.input_csv, outputs[0])]
+        elif len(converters) == 1:
+            row_counts = [len(converters[0].convert_csv(args.input_csv, outputs[0]))]
+        else:
+            row_counts = convert_csv_multi(converters, args.input_csv, outputs)
         
-        print(f"変換完了!")
-        print(f"入力: {args.input_csv}")
-        print(f"出力: {args.output}")
-        print(f"変換件数: {len(result_df)} 行")
+        # 標準出力に変換結果を書き出した場合、メッセージは標準エラー出力へ
+        log_file = sys.stderr if streaming else sys.stdout
+        print(f"変換完了!", file=log_file)
+        print(f"入力: {args.input_csv}", file=log_file)
+        for output, row_count in zip(outputs, row_counts):
+            print(f"出力: {output}", file=log_file)
+            print(f"変換件数: {row_count} 行", file=log_file)
         
     except Exception as e:
         logger.error(f"変換処理でエラーが発生しました: {e}")
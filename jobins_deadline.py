@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+期限付きの変換（--deadline）
+API呼び出し1回あたりの所要時間の実測値と、残りの行で必要になるAPI呼び出し数の見込みから
+変換の終了見込み時刻を求める。期限に間に合わない見込みになったら、最悪の場合の1回の所要時間
+（タイムアウト × 試行回数 + バックオフ）でも期限（の余裕の手前）までに終わる間だけAPIで分類し、
+それ以降のキャッシュにないタイトルをローカルのキーワード分類に切り替える。
+切り替えの時点で実行中のAPI呼び出しも、それぞれ最悪の場合の所要時間以内に終わるため期限に間に合う。
+
+ローカル分類に切り替えた行はローカル分類行ファイル（CSV）に書き出す。これらの結果は
+職種分類キャッシュに保存しないため、期限のない次回の変換でAPIにより分類し直される。
+"""
+
+import csv
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from jobins_compression import strip_compression_suffix
+from jobins_gpt_classifier import DEFAULT_GPT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# 期限の手前に残しておく余裕（書き込み・キャッシュ保存の時間）（秒）
+DEFAULT_SAFETY_MARGIN = 30.0
+# 所要時間の平均に使う直近のAPI呼び出し数
+LATENCY_WINDOW = 50
+# API呼び出しの割合の見込みを立てるまでに必要な処理済みの行数
+MIN_OBSERVED_ROWS = 20
+
+DEFAULT_DEGRADED_SUFFIX = "_ローカル分類行.csv"
+STDOUT_DEGRADED_FILE = "標準出力" + DEFAULT_DEGRADED_SUFFIX
+DEGRADED_COLUMNS = ["出力行番号", "求人タイトル", "職種", "職種分類（ローカル）"]
+
+_DURATION_PATTERN = re.compile(r'(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m)?(?:(\d+(?:\.\d+)?)s?)?')
+_CLOCK_PATTERN = re.compile(r'(\d{1,2}):(\d{2})')
+
+
+def worst_case_call_seconds(gpt_settings):
+    """
+    APIによる分類1回の最悪の場合の所要時間（秒）
+
+    全試行がタイムアウトし、再試行ごとにバックオフの上限まで待った場合の合計。
+    """
+    settings = {**DEFAULT_GPT_SETTINGS, **(gpt_settings or {})}
+    retries = int(settings['max_retries'])
+    backoff = sum(min(float(settings['backoff_max']), float(settings['backoff_base']) * (2 ** attempt))
+                  for attempt in range(retries))
+    return float(settings['request_timeout']) * (retries + 1) + backoff
+
+
+def parse_deadline(text, now=None):
+    """
+    --deadlineの値を残り秒数に変換
+
+    "3600"（秒）・"45m"・"1h30m" の期間、または "17:30" の時刻（過ぎていれば翌日）を受け付ける。
+
+    Raises:
+        ValueError: 解釈できない場合
+    """
+    text = str(text).strip().lower()
+    clock = _CLOCK_PATTERN.fullmatch(text)
+    if clock:
+        now = now or datetime.now()
+        target = now.replace(hour=int(clock.group(1)), minute=int(clock.group(2)), second=0, microsecond=0)
+        if target <= now:
+            target += timedelta(days=1)
+        return (target - now).total_seconds()
+    match = _DURATION_PATTERN.fullmatch(text)
+    if not text or not match or not any(match.groups()):
+        raise ValueError(f"期限を解釈できません: {text}（例: 3600 / 45m / 1h30m / 17:30）")
+    hours, minutes, seconds = (float(value) if value else 0.0 for value in match.groups())
+    return hours * 3600 + minutes * 60 + seconds
+
+
+class DeadlineBudget:
+    """API呼び出しの所要時間から変換の終了見込みを求め、期限に間に合わない場合にローカル分類へ切り替える"""
+
+    def __init__(self, seconds, workers=1, prior_latency=1.0, margin=DEFAULT_SAFETY_MARGIN, call_bound=None,
+                 clock=time.monotonic):
+        """
+        初期化
+
+        Args:
+            seconds (float): 期限までの秒数
+            workers (int): 並行に実行するAPI呼び出し数（gpt_settingsのconcurrency）
+            prior_latency (float): 実測値がない間に使う1回あたりの所要時間（gpt_settingsのestimated_latency）
+            margin (float): 期限の手前に残しておく余裕（秒）
+            call_bound (float): 1回のAPI呼び出しの最悪の場合の所要時間（worst_case_call_seconds、Noneは実測の平均）
+        """
+        self.clock = clock
+        self.deadline = clock() + float(seconds)
+        self.workers = max(1, int(workers))
+        self.prior_latency = float(prior_latency)
+        self.margin = float(margin)
+        self.call_bound = None if call_bound is None else float(call_bound)
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.rows_done = 0
+        self.rows_total = 0
+        self.degraded = False
+        self.degraded_titles = {}
+        self._warned = False
+        self._lock = threading.Lock()
+
+    def set_progress(self, rows_done, rows_total):
+        """処理済みの行数と全体の行数（残りのAPI呼び出し数の見込みに使用）"""
+        with self._lock:
+            self.rows_done = rows_done
+            self.rows_total = rows_total
+
+    def record_call(self, seconds):
+        """APIによる分類1件の所要時間を記録"""
+        with self._lock:
+            self.latencies.append(seconds)
+            self.calls += 1
+
+    def _latency(self):
+        return sum(self.latencies) / len(self.latencies) if self.latencies else self.prior_latency
+
+    def projected_finish(self):
+        """
+        残りのAPI呼び出しにかかる時間の見込み（秒）
+
+        残りの行数 × これまでの1行あたりのAPI呼び出し数 × 1回あたりの所要時間 ÷ 並行数
+        （処理済みの行が少ない間は、残りの行がすべてAPI呼び出しになるとみなす）
+        """
+        with self._lock:
+            remaining_rows = max(0, self.rows_total - self.rows_done)
+            if self.rows_done >= MIN_OBSERVED_ROWS:
+                calls_per_row = min(1.0, self.calls / self.rows_done)
+            else:
+                calls_per_row = 1.0
+            return remaining_rows * calls_per_row * self._latency() / self.workers
+
+    def _cutoff(self, over):
+        """期限（の余裕の手前）までの残り時間がこれより短くなったら、新しいAPI呼び出しを始めない（秒）"""
+        latency = self._latency()
+        if over and self.call_bound is not None:
+            # 残りのAPI呼び出しが終わらない見込みの場合は、最悪の場合でも期限までに終わる呼び出しだけを始める
+            return max(latency, self.call_bound)
+        return latency
+
+    def should_degrade(self):
+        """
+        以降の分類をローカル分類に切り替えるべきか（一度切り替えたら戻さない）
+
+        残りのAPI呼び出しが期限（の余裕の手前）までに終わらない見込みで、かつ、これから始める呼び出しが
+        最悪の場合の所要時間（call_bound）では期限までに終わらない場合True。
+        見込みでは間に合う場合も、平均の所要時間で期限までに終わらなくなったらTrue。
+        期限を超える見込みになった時点で一度だけ警告する。
+        """
+        if self.degraded:
+            return True
+        remaining = self.deadline - self.margin - self.clock()
+        projected = self.projected_finish()
+        over = projected > remaining
+        if over and not self._warned:
+            self._warned = True
+            logger.warning(f"このままでは期限を {projected - remaining:.0f} 秒超える見込みです"
+                           f"（期限の {self.margin + self._cutoff(True):.0f} 秒前までAPIで分類し、"
+                           f"残りはローカル分類に切り替えます）")
+        with self._lock:
+            cutoff = self._cutoff(over)
+        if remaining < cutoff:
+            with self._lock:
+                if not self.degraded:
+                    self.degraded = True
+                    logger.warning(f"期限に間に合わないため、残りのキャッシュにないタイトルをローカル分類に切り替えます"
+                                   f"（処理済み: {self.rows_done}/{self.rows_total} 行）")
+            return True
+        return False
+
+    def record_degraded(self, title, label):
+        """ローカル分類に切り替えたタイトルを記録"""
+        with self._lock:
+            self.degraded_titles[title] = label
+
+    def is_degraded_title(self, title):
+        with self._lock:
+            return title in self.degraded_titles
+
+    def summary(self):
+        """期限と切り替えの状況のサマリー文字列"""
+        remaining = self.deadline - self.clock()
+        status = (f"キャッシュにないタイトル {len(self.degraded_titles)} 件をローカル分類に切り替え"
+                  if self.degraded else "期限内にAPI分類")
+        return (f"期限: 残り {remaining:.0f} 秒, API呼び出し平均 {self._latency():.2f} 秒 × {self.calls} 件, {status}")
+
+
+class DegradedRowLog:
+    """ローカル分類に切り替えた行の書き出し（ファイルは最初の行で作成する）"""
+
+    def __init__(self, output_path, processing_rules=None):
+        """
+        初期化
+
+        Args:
+            output_path (str): 変換の出力ファイルパス（ローカル分類行ファイル名の元）
+            processing_rules (dict): YAMLのprocessing_rules（degraded_rows_file）
+        """
+        processing_rules = processing_rules or {}
+        self.path = processing_rules.get('degraded_rows_file') or self._default_path(output_path)
+        self.count = 0
+        self._file = None
+        self._writer = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _default_path(output_path):
+        if str(output_path) == "-":
+            return STDOUT_DEGRADED_FILE
+        base, _ = os.path.splitext(strip_compression_suffix(output_path))
+        return base + DEFAULT_DEGRADED_SUFFIX
+
+    def record(self, output_row, title, job_type, label):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'w', encoding='utf-8-sig', newline='')
+                self._writer = csv.writer(self._file)
+                self._writer.writerow(DEGRADED_COLUMNS)
+            self._writer.writerow([output_row, title, job_type, label])
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def summary(self):
+        if not self.count:
+            return "ローカル分類に切り替えた行: なし"
+        return f"ローカル分類に切り替えた行: {self.count} 行 → {self.path}（次回の変換でAPIにより再分類されます）"
+
+
+def create_deadline_budget(deadline, gpt_settings, processing_rules):
+    """
+    --deadlineの値とYAMLの設定から期限を作成
+
+    Args:
+        deadline (str): --deadlineの値（Noneの場合は期限なし）
+    """
+    if not deadline:
+        return None
+    return DeadlineBudget(
+        parse_deadline(deadline),
+        workers=gpt_settings.get('concurrency', 1),
+        prior_latency=gpt_settings.get('estimated_latency', 1.0),
+        margin=processing_rules.get('deadline_margin_seconds', DEFAULT_SAFETY_MARGIN),
+        call_bound=worst_case_call_seconds(gpt_settings),
+    )
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+変換エンジンの一致確認と性能比較
+
+simple_converter.py・jobins_csv_converter.py（pandas版）・jobins_gui_converter.py（GUI版）の
+3つの変換器を同じ入力で実行し（OpenAI APIはスタブに置き換え）、出力をセル単位で比較する。
+各エンジンは別プロセスで実行し、処理速度（行/秒）とピークメモリを並べて表示する。
+
+使い方:
+    python jobins_engine_compare.py --generate 5000
+    python jobins_engine_compare.py 求人マスタ.csv --engines pandas,gui
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import types
+
+import yaml
+
+try:
+    import resource
+except ImportError:  # Windowsではピークメモリを計測しない
+    resource = None
+
+# 先頭が比較の基準（都道府県正規化・空白の扱いまで実装しているGUI版）
+ENGINES = ['gui', 'pandas', 'simple']
+
+# 生成する入力のサンプル値（列名ごと）
+SAMPLE_TITLES = [
+    "【急募】法人営業（未経験歓迎）", "Javaエンジニア/バックエンド", "Webデザイナー【リモート可】",
+    "経理スタッフ", "人事・採用担当", "ＰＨＰエンジニア　東京", "マーケティング企画 年収400万円〜",
+    "コールセンターSV", "施工管理", "看護師", "★未経験OK★ カスタマーサポート", "インフラエンジニア / 大阪",
+]
+SAMPLE_VALUES = {
+    "雇用形態": ["正社員", "契約社員", ""],
+    "都道府県": ["東京都", "大阪府, 東京都", "神奈川県,千葉県", "北海道", ""],
+    "休日休暇": ["完全週休2日制（土日祝）", "シフト制", "年間休日120日", "24時間交代制", ""],
+    "試用期間": ["3ヶ月", "試用期間あり（条件同じ）", "なし", "", '""'],
+    "募集背景": ["増員のため3名募集", "欠員補充", "組織強化のため２名", "若干名", ""],
+    "待遇・福利厚生": ["賞与年2回、転勤なし", "社会保険完備", "ボーナスあり、全国転勤あり", ""],
+    "年齢上限": ["35", "", "４０歳", "45"],
+    "年齢下限": ["22", "", "20"],
+    "JOBINS掲載企業フラグ": ["1", "1", "1", "0", ""],
+    "職種": ["", "営業", "エンジニア", "事務"],
+    "企業名.株式公開": ["未上場", "東証プライム", ""],
+    "資本金": ["1,000万円", "5億円", ""],
+    "企業情報.従業員数": ["100名", "1,200名", "50", ""],
+}
+
+
+def _config_columns(config):
+    """設定ファイルで使われる入力列（マッピングのソース列・フィルタ列・職種・企業名）"""
+    columns = []
+    for mapping in config['mapping_spec']['field_mapping']:
+        source_field = mapping['source_field']
+        if source_field and source_field != 'null' and source_field not in columns:
+            columns.append(source_field)
+    filter_rules = config['processing_rules'].get('filter', {})
+    for condition_type in ('include_if', 'exclude_if'):
+        for field in filter_rules.get(condition_type, {}):
+            if field not in columns:
+                columns.append(field)
+    for field in ("職種", config['processing_rules'].get('company_key_field', "企業名")):
+        if field not in columns:
+            columns.append(field)
+    return columns
+
+
+def generate_input(path, rows, config, seed=0):
+    """設定ファイルの入力列を持つテスト用の求人マスタCSVを生成"""
+    rng = random.Random(seed)
+    headers = _config_columns(config)
+    with open(path, 'w', encoding='utf-8-sig', newline='') as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(headers)
+        for i in range(rows):
+            company = i % max(1, rows // 20)
+            row = []
+            for header in headers:
+                if header == "名前":
+                    value = rng.choice(SAMPLE_TITLES)
+                elif header == "企業名":
+                    value = f"株式会社テスト{company}"
+                elif header in SAMPLE_VALUES:
+                    value = rng.choice(SAMPLE_VALUES[header])
+                elif header.startswith("企業名") or header.startswith("企業情報"):
+                    # 会社単位の列は同じ会社でほぼ同じ値
+                    value = f"{header}の内容{company}"
+                elif "[万円]" in header:
+                    value = str(rng.randint(300, 900)) if rng.random() > 0.1 else ""
+                else:
+                    value = rng.choice([f"{header}の内容{rng.randint(0, 9)}", f" {header} ", ""])
+                row.append(value)
+            writer.writerow(row)
+    return headers
+
+
+class StubCompletions:
+    """OpenAI APIのスタブ（タイトルのハッシュから決定的に選択肢を選ぶ）"""
+
+    def create(self, model=None, messages=None, **kwargs):
+        user_prompt = messages[-1]['content']
+        title = user_prompt.rsplit("【求人タイトル】\n", 1)[-1]
+        option_count = len(re.findall(r'^\d+\. ', user_prompt, flags=re.MULTILINE))
+        digest = hashlib.blake2b(title.encode('utf-8'), digest_size=4).digest()
+        answer = str(int.from_bytes(digest, 'big') % max(1, option_count) + 1)
+        usage = types.SimpleNamespace(
+            prompt_tokens=len(user_prompt), completion_tokens=1,
+            prompt_tokens_details=types.SimpleNamespace(cached_tokens=0)
+        )
+        message = types.SimpleNamespace(content=answer)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+
+class StubOpenAIClient:
+    def __init__(self):
+        self.chat = types.SimpleNamespace(completions=StubCompletions())
+
+
+def isolate_config(config_path, work_dir):
+    """
+    設定ファイルのうち実行中に書き込むパスを作業ディレクトリに差し替えたコピーを作成
+
+    比較の実行で本番のキャッシュ・学習済みモデル・入力キャッシュを読み書きしないよう、
+    分類キャッシュ（職種・大分類）、入力キャッシュ、タイトル分類モデル、エラー行・縮退行・検証レポート、
+    レート制限の状態ファイルをすべて作業ディレクトリに置く（空の状態から実行される）。
+
+    Returns:
+        str: 作業ディレクトリに保存した設定ファイルのパス
+    """
+    with open(config_path, 'r', encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+
+    processing_rules = config.setdefault('processing_rules', {})
+    processing_rules['classification_cache_file'] = os.path.join(work_dir, "classification_cache.json")
+    processing_rules['major_classification_cache_file'] = os.path.join(work_dir, "major_classification_cache.json")
+    processing_rules['input_cache_dir'] = os.path.join(work_dir, "input_cache")
+    # 未指定の場合は出力ファイル（作業ディレクトリ内）の隣に作られる
+    for key in ('reject_file', 'degraded_rows_file'):
+        if processing_rules.get(key):
+            processing_rules[key] = os.path.join(work_dir, os.path.basename(processing_rules[key]))
+    typed_columns = config.get('typed_columns') or {}
+    if typed_columns.get('report_file'):
+        typed_columns['report_file'] = os.path.join(work_dir, os.path.basename(typed_columns['report_file']))
+    gpt_settings = config.get('gpt_settings') or {}
+    if gpt_settings.get('rate_limit_state_file'):
+        gpt_settings['rate_limit_state_file'] = os.path.join(work_dir, "rate_limit_state.json")
+    config.setdefault('title_model', {})['model_dir'] = os.path.join(work_dir, "title_model")
+
+    isolated_path = os.path.join(work_dir, "config.yaml")
+    with open(isolated_path, 'w', encoding='utf-8') as file:
+        yaml.safe_dump(config, file, allow_unicode=True, sort_keys=False)
+    return isolated_path
+
+
+def _prepare_gpt_engine(converter):
+    """APIクライアントをスタブに差し替え"""
+    converter.openai_client = StubOpenAIClient()
+    converter.gpt_classifier.openai_client = converter.openai_client
+
+
+def _peak_memory_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # LinuxはKB、macOSはバイト単位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _run_engine(engine, config_path, input_path, output_path, work_dir, results):
+    """1つのエンジンで変換を実行（別プロセスで呼ばれる）"""
+    # 各エンジンのログ・標準出力はレポートに混ぜない
+    logging.disable(logging.WARNING)
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        config_path = isolate_config(config_path, work_dir)
+        if engine == 'simple':
+            from simple_converter import SimpleJobinsConverter
+            converter = SimpleJobinsConverter(config_path)
+            run = lambda: converter.convert_csv(input_path, output_path)
+        elif engine == 'pandas':
+            from jobins_csv_converter import JobinsCSVConverter
+            converter = JobinsCSVConverter(config_path)
+            _prepare_gpt_engine(converter)
+            run = lambda: converter.convert_csv(input_path, output_path)
+        else:
+            from jobins_gui_converter import SimpleJobinsConverter
+            converter = SimpleJobinsConverter(config_path)
+            _prepare_gpt_engine(converter)
+            run = lambda: converter.convert_csv_with_callback(input_path, output_path, lambda message: None)
+
+        baseline = _peak_memory_mb()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        results.put({
+            'engine': engine, 'elapsed': elapsed,
+            'baseline_mb': baseline, 'peak_mb': _peak_memory_mb(), 'error': None,
+        })
+    except Exception as e:
+        results.put({'engine': engine, 'error': f"{type(e).__name__}: {e}"})
+
+
+def run_engine(engine, config_path, input_path, output_path, work_dir):
+    """エンジンを別プロセスで実行して処理時間とピークメモリを計測"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(
+        target=_run_engine, args=(engine, config_path, input_path, output_path, work_dir, results)
+    )
+    process.start()
+    process.join()
+    if results.empty():
+        return {'engine': engine, 'error': f"プロセスが異常終了しました (終了コード: {process.exitcode})"}
+    return results.get()
+
+
+def _read_output(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as infile:
+        rows = list(csv.reader(infile))
+    return (rows[0], rows[1:]) if rows else ([], [])
+
+
+def compare_outputs(reference, other, examples=3):
+    """
+    2つの出力CSVをセル単位で比較
+
+    Returns:
+        dict: header_diff / row_counts / columns（列ごとの不一致件数と例）
+    """
+    reference_headers, reference_rows = _read_output(reference)
+    other_headers, other_rows = _read_output(other)
+    result = {
+        'header_diff': reference_headers != other_headers,
+        'row_counts': (len(reference_rows), len(other_rows)),
+        'columns': {},
+    }
+
+    other_index = {column: i for i, column in enumerate(other_headers)}
+    for column_position, column in enumerate(reference_headers):
+        if column not in other_index:
+            result['columns'][column] = {'mismatches': None, 'examples': []}
+            continue
+        other_position = other_index[column]
+        mismatches = 0
+        samples = []
+        for row_number, (left, right) in enumerate(zip(reference_rows, other_rows), start=1):
+            left_value = left[column_position] if column_position < len(left) else ""
+            right_value = right[other_position] if other_position < len(right) else ""
+            if left_value != right_value:
+                mismatches += 1
+                if len(samples) < examples:
+                    samples.append((row_number, left_value, right_value))
+        if mismatches:
+            result['columns'][column] = {'mismatches': mismatches, 'examples': samples}
+    return result
+
+
+def _count_data_rows(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as infile:
+        return max(0, sum(1 for _ in csv.reader(infile)) - 1)
+
+
+def _shorten(value, width=40):
+    value = value.replace("\n", "\\n")
+    return value if len(value) <= width else value[:width - 1] + "…"
+
+
+def print_report(input_path, metrics, comparisons):
+    """比較結果のレポートを表示"""
+    print(f"\n入力: {input_path}")
+    print(f"{'エンジン':<8} {'入力行':>8} {'出力行':>8} {'秒':>8} {'行/秒':>10} {'ピークMB':>9} {'増加MB':>8}")
+    for engine, metric in metrics.items():
+        if metric.get('error'):
+            print(f"{engine:<8} エラー: {metric['error']}")
+            continue
+        rows_per_second = metric['input_rows'] / metric['elapsed'] if metric['elapsed'] else 0.0
+        peak = f"{metric['peak_mb']:.1f}" if metric['peak_mb'] is not None else "-"
+        growth = f"{metric['peak_mb'] - metric['baseline_mb']:.1f}" if metric['peak_mb'] is not None else "-"
+        print(f"{engine:<8} {metric['input_rows']:>8} {metric['output_rows']:>8} {metric['elapsed']:>8.2f} "
+              f"{rows_per_second:>10.0f} {peak:>9} {growth:>8}")
+
+    for (reference, other), comparison in comparisons.items():
+        print(f"\n[{reference} と {other} の比較]")
+        left_count, right_count = comparison['row_counts']
+        if comparison['header_diff']:
+            print("  ヘッダーが一致しません")
+        if left_count != right_count:
+            print(f"  行数が一致しません: {left_count} / {right_count}")
+        if not comparison['columns']:
+            print("  全セル一致")
+            continue
+        for column, diff in comparison['columns'].items():
+            if diff['mismatches'] is None:
+                print(f"  {column}: {other} の出力にこの列がありません")
+                continue
+            print(f"  {column}: {diff['mismatches']} セル不一致")
+            for row_number, left_value, right_value in diff['examples']:
+                print(f"    行{row_number}: {_shorten(left_value)!r} / {_shorten(right_value)!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='変換エンジンの出力一致確認と性能比較')
+    parser.add_argument('inputs', nargs='*', help='入力CSVファイルパス（省略時は--generateで生成）')
+    parser.add_argument('-c', '--config', default='jobins_yaml_mapping.yaml',
+                        help='YAMLマッピング設定ファイル (default: jobins_yaml_mapping.yaml)')
+    parser.add_argument('--generate', type=int, default=0, metavar='ROWS', help='指定行数の入力を生成して比較')
+    parser.add_argument('--seed', type=int, default=0, help='入力生成の乱数シード')
+    parser.add_argument('--engines', default=','.join(ENGINES),
+                        help=f"比較するエンジン（カンマ区切り、先頭が基準） (default: {','.join(ENGINES)})")
+    parser.add_argument('--examples', type=int, default=3, help='列ごとに表示する不一致の例の件数')
+    parser.add_argument('--keep', metavar='DIR', help='生成した入力と各エンジンの出力を保存するディレクトリ')
+    parser.add_argument('--json', metavar='PATH', help='結果をJSONで保存')
+
+    args = parser.parse_args()
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    unknown = [engine for engine in engines if engine not in ENGINES]
+    if unknown or not engines:
+        parser.error(f"不明なエンジン: {', '.join(unknown)}")
+    if not args.inputs and not args.generate:
+        parser.error("入力CSVを指定するか、--generate で行数を指定してください")
+
+    with open(args.config, 'r', encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+    config_path = os.path.abspath(args.config)
+
+    work_dir = args.keep or tempfile.mkdtemp(prefix='jobins_compare_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    inputs = [os.path.abspath(path) for path in args.inputs]
+    if args.generate:
+        generated = os.path.join(work_dir, f"generated_{args.generate}.csv")
+        generate_input(generated, args.generate, config, seed=args.seed)
+        inputs.append(generated)
+
+    all_results = []
+    for input_index, input_path in enumerate(inputs):
+        input_rows = _count_data_rows(input_path)
+        metrics = {}
+        outputs = {}
+        for engine in engines:
+            output_path = os.path.join(work_dir, f"output_{input_index}_{engine}.csv")
+            engine_dir = tempfile.mkdtemp(dir=work_dir, prefix=f"{engine}_")
+            metric = run_engine(engine, config_path, input_path, output_path, engine_dir)
+            if not metric.get('error'):
+                metric['input_rows'] = input_rows
+                metric['output_rows'] = _count_data_rows(output_path)
+                outputs[engine] = output_path
+            metrics[engine] = metric
+
+        reference = engines[0]
+        comparisons = {}
+        if reference in outputs:
+            for engine in engines[1:]:
+                if engine in outputs:
+                    comparisons[(reference, engine)] = compare_outputs(
+                        outputs[reference], outputs[engine], examples=args.examples
+                    )
+
+        print_report(input_path, metrics, comparisons)
+        all_results.append({
+            'input': input_path,
+            'metrics': metrics,
+            'comparisons': [
+                {'reference': left, 'engine': right, **comparison}
+                for (left, right), comparison in comparisons.items()
+            ],
+        })
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(all_results, file, ensure_ascii=False, indent=1)
+    if args.keep:
+        print(f"\n入力と出力: {work_dir}")
+
+    mismatched = any(
+        comparison['columns'] or comparison['header_diff']
+        or comparison['row_counts'][0] != comparison['row_counts'][1]
+        for result in all_results for comparison in result['comparisons']
+    )
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    exit(main())
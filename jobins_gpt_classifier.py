@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OpenAI APIによる職種分類の共通処理
+選択肢を番号付きで送信し、回答は番号のみを受け取るプロトコルで分類する
+"""
+
+import concurrent.futures
+import logging
+import random
+import re
+import threading
+import time
+
+import openai
+
+from jobins_cancellation import ConversionCancelled
+from jobins_rate_limiter import create_rate_limiter
+
+try:
+    import tiktoken
+except ImportError:  # 未インストールの場合、トークン数の見積もりは文字数からの概算
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# gpt_settings（YAML）のデフォルト値
+DEFAULT_GPT_SETTINGS = {
+    'model': DEFAULT_MODEL,
+    'request_timeout': 15.0,           # 1リクエストあたりのタイムアウト（秒）
+    'max_retries': 3,                  # 429/5xx/タイムアウト時の再試行回数
+    'backoff_base': 1.0,               # バックオフの初期待ち時間（秒）
+    'backoff_max': 30.0,               # バックオフの最大待ち時間（秒）
+    'circuit_breaker_threshold': 5,    # 連続失敗でサーキットを開く回数
+    'circuit_breaker_probe_interval': 60.0,  # サーキットを開いてから復旧確認するまでの秒数
+    'concurrency': 1,                  # 同時に実行するAPI呼び出し数
+    'estimated_latency': 1.0,          # 見積もり用の1リクエストあたりの所要時間（秒）
+    'hierarchical_classification': False,  # 職種で絞り込めない場合に大分類→中分類の2段階で分類
+    'local_confidence_threshold': None,    # ローカル分類の確信度がこの値以上ならAPIを呼ばない（Noneは常にAPI）
+    'requests_per_minute': None,       # 1分あたりのリクエスト数の上限（Noneはレスポンスヘッダーの上限のみ）
+    'tokens_per_minute': None,         # 1分あたりのトークン数の上限（Noneはレスポンスヘッダーの上限のみ）
+    'rate_limit_state_file': None,     # 指定するとレート制限の予算を同じファイルを使うプロセス間で共有
+}
+
+# 見積もり用の1リクエストあたりのcompletionトークン数（番号のみの回答）
+ESTIMATED_COMPLETION_TOKENS = 2
+
+# 回答の最大トークン数（レート制限ではこの値までcompletionトークンを使うとみなして予約する）
+MAX_COMPLETION_TOKENS = 8
+
+# チャット形式のメッセージごとの付加トークン数
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_PRIMING_TOKENS = 3
+
+# 回答フォーマットの指示（全リクエスト共通）
+RESPONSE_FORMAT_INSTRUCTION = "回答は選択肢の番号（半角数字）のみを出力してください。職種名や説明は書かないでください。"
+
+
+class CircuitOpenError(Exception):
+    """サーキットブレーカーが開いているためAPIを呼び出さなかった"""
+
+
+class CircuitBreaker:
+    """
+    連続失敗でAPI呼び出しを遮断するサーキットブレーカー
+
+    closed: 通常状態
+    open: 遮断中（probe_interval経過後に1回だけ試行を許可）
+    half_open: 復旧確認の試行中
+    """
+
+    def __init__(self, failure_threshold=5, probe_interval=60.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.clock = clock
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """API呼び出しを許可するか判定"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and self.clock() - self.opened_at >= self.probe_interval:
+                self.state = 'half_open'
+                logger.info("サーキットブレーカー: 復旧確認のためAPI呼び出しを試行")
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logger.info("サーキットブレーカー: API復旧を確認、通常モードに戻ります")
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or (
+                    self.state == 'closed' and self.consecutive_failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = self.clock()
+                logger.warning(f"サーキットブレーカー: 連続 {self.consecutive_failures} 回失敗のため、"
+                               f"{self.probe_interval:.0f} 秒間ローカル分類に切り替えます")
+
+
+def _is_retryable(error):
+    """再試行対象のエラーか判定（429・5xx・タイムアウト・接続エラー）"""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+def _retry_after_seconds(error):
+    """Retry-Afterヘッダーの秒数（なければNone）"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+class GPTJobClassifier:
+    """番号ベースのプロンプトで職種分類を行うクラス"""
+
+    def __init__(self, openai_client, instructions="", settings=None):
+        """
+        初期化
+
+        Args:
+            openai_client: OpenAIクライアント
+            instructions (str): 判定ルールなどの静的な指示文
+            settings (dict): YAMLのgpt_settings（未指定の項目はデフォルト値）
+        """
+        self.settings = dict(DEFAULT_GPT_SETTINGS)
+        self.settings.update(settings or {})
+        self.model = self.settings['model']
+
+        # タイムアウトと再試行は自前で制御する（SDKの自動再試行は無効化）
+        if openai_client is not None and hasattr(openai_client, 'with_options'):
+            openai_client = openai_client.with_options(
+                timeout=float(self.settings['request_timeout']), max_retries=0
+            )
+        self.openai_client = openai_client
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=int(self.settings['circuit_breaker_threshold']),
+            probe_interval=float(self.settings['circuit_breaker_probe_interval'])
+        )
+        # RPM/TPMのレート制限（並列の分類ワーカー間、状態ファイル指定時はプロセス間でも共有）
+        self.rate_limiter = create_rate_limiter(self.settings)
+        self.system_prompt = self._build_system_prompt(instructions)
+        self._encoding = None
+        # 変換のキャンセル要求（設定されている場合、API呼び出しと再試行・レート制限の待ちを中断する）
+        self.cancel_token = None
+        # キャンセル可能なAPI呼び出しを実行するスレッド（同時実行数ぶんを作り、呼び出しごとには作らない）
+        self._request_executor = None
+        self._executor_lock = threading.Lock()
+
+        # トークン使用量の集計
+        self.usage = {
+            'requests': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'cached_tokens': 0,
+            'invalid_responses': 0,
+            'retries': 0,
+            'failures': 0,
+        }
+        self._usage_lock = threading.Lock()
+
+    def _executor(self):
+        with self._executor_lock:
+            if self._request_executor is None:
+                self._request_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(1, int(self.settings['concurrency'])), thread_name_prefix='jobins-api'
+                )
+            return self._request_executor
+
+    def shutdown(self):
+        """API呼び出し用のスレッドを終了（キャンセルで破棄した呼び出しの完了は待たない）"""
+        with self._executor_lock:
+            executor, self._request_executor = self._request_executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _cancelled(self):
+        return self.cancel_token is not None and self.cancel_token.cancelled
+
+    def _build_system_prompt(self, instructions):
+        """静的な指示文を組み立て（プレフィックスキャッシュが効くよう先頭に固定）"""
+        parts = ["あなたは職種分類の専門家です。求人タイトルを分析して、選択肢から最も適した職種分類を1つだけ選んでください。"]
+        if instructions:
+            parts.append(instructions.strip())
+        parts.append(RESPONSE_FORMAT_INSTRUCTION)
+        return "\n\n".join(parts)
+
+    def build_messages(self, title, job_options):
+        """
+        APIに送信するメッセージを作成
+
+        静的な指示 → 選択肢 → 求人タイトル の順に並べ、
+        同じ選択肢リストを使うリクエスト同士で先頭部分が一致するようにする。
+        """
+        job_options_text = "\n".join(f"{i + 1}. {option}" for i, option in enumerate(job_options))
+        user_prompt = f"【職種分類の選択肢】\n{job_options_text}\n\n【求人タイトル】\n{title}"
+        return [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+
+    def count_tokens(self, text):
+        """
+        テキストのトークン数を数える
+
+        tiktokenがあればモデルのエンコーディングで数え、なければ
+        ASCIIは4文字で1トークン、それ以外（日本語など）は1文字1トークンとして概算する。
+        """
+        if tiktoken is not None:
+            if self._encoding is None:
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("o200k_base")
+            return len(self._encoding.encode(text))
+        ascii_chars = sum(1 for char in text if ord(char) < 128)
+        return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+    def estimate_prompt_tokens(self, title, job_options):
+        """分類1回分のpromptトークン数を見積もり（APIは呼び出さない）"""
+        return self.estimate_message_tokens(self.build_messages(title, job_options))
+
+    def estimate_message_tokens(self, messages):
+        """送信するメッセージのpromptトークン数を見積もり"""
+        return sum(
+            self.count_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS for message in messages
+        ) + REPLY_PRIMING_TOKENS
+
+    @staticmethod
+    def parse_option_id(answer, option_count):
+        """
+        回答から選択肢番号を取り出して検証
+
+        Returns:
+            int: 0始まりの選択肢インデックス（不正な回答の場合はNone）
+        """
+        if not answer:
+            return None
+        match = re.fullmatch(r'\s*(\d+)\s*[.:：]?\s*', answer)
+        if not match:
+            return None
+        option_id = int(match.group(1))
+        if 1 <= option_id <= option_count:
+            return option_id - 1
+        return None
+
+    def _record_usage(self, response):
+        """
+        レスポンスのトークン数を記録してログ出力
+
+        Returns:
+            int: prompt・completionの合計トークン数（レスポンスにない場合はNone）
+        """
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            with self._usage_lock:
+                self.usage['requests'] += 1
+            return None
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = (getattr(details, 'cached_tokens', 0) or 0) if details is not None else 0
+
+        with self._usage_lock:
+            self.usage['requests'] += 1
+            self.usage['prompt_tokens'] += prompt_tokens
+            self.usage['completion_tokens'] += completion_tokens
+            self.usage['cached_tokens'] += cached_tokens
+        logger.info(f"トークン数: prompt={prompt_tokens} (キャッシュ={cached_tokens}), completion={completion_tokens}")
+        return prompt_tokens + completion_tokens
+
+    def _request(self, messages, reserved_tokens):
+        """
+        APIを1回呼び出して回答テキストを返す
+
+        Raises:
+            ConversionCancelled: 応答を受け取る前に変換がキャンセルされた場合（結果は使わず、集計もしない）
+        """
+        completions = self.openai_client.chat.completions
+        request = dict(model=self.model, messages=messages, max_tokens=MAX_COMPLETION_TOKENS, temperature=0)
+        # x-ratelimit-*ヘッダーを読めるよう、SDKが対応していれば生のレスポンスを受け取る
+        raw_completions = getattr(completions, 'with_raw_response', None)
+        if raw_completions is not None:
+            raw_response = raw_completions.create(**request)
+            self.rate_limiter.update_from_headers(raw_response.headers)
+            response = raw_response.parse()
+        else:
+            response = completions.create(**request)
+        if self._cancelled():
+            raise ConversionCancelled("変換がキャンセルされました")
+        used_tokens = self._record_usage(response)
+        if used_tokens is not None:
+            self.rate_limiter.settle(reserved_tokens, used_tokens)
+        return (response.choices[0].message.content or "").strip()
+
+    def _request_cancellable(self, messages, reserved_tokens):
+        """
+        APIを1回呼び出し、応答かキャンセルまで待つ
+
+        キャンセル要求がある場合、呼び出しはAPI呼び出し用のスレッドで実行し、キャンセルされたら
+        応答を待たずにConversionCancelledを送出する。破棄した呼び出しはrequest_timeoutまでに
+        バックグラウンドで終わり、その結果は使わない。
+
+        Raises:
+            ConversionCancelled: 応答の前に変換がキャンセルされた場合
+        """
+        cancel_token = self.cancel_token
+        if cancel_token is None:
+            return self._request(messages, reserved_tokens)
+        cancel_token.raise_if_cancelled()
+        future = self._executor().submit(self._request, messages, reserved_tokens)
+        finished = threading.Event()
+        future.add_done_callback(lambda _: finished.set())
+        cancel_token.add_callback(finished.set)
+        try:
+            finished.wait()
+        finally:
+            cancel_token.remove_callback(finished.set)
+        if not future.done():
+            raise ConversionCancelled("変換がキャンセルされました")
+        return future.result()
+
+    def _backoff_delay(self, attempt, error):
+        """指数バックオフ（フルジッター）の待ち時間"""
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, float(self.settings['backoff_max']))
+        cap = min(float(self.settings['backoff_max']), float(self.settings['backoff_base']) * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def _request_with_retry(self, messages):
+        """
+        タイムアウト・バックオフ・サーキットブレーカー付きでAPIを呼び出す
+
+        Raises:
+            CircuitOpenError: サーキットブレーカーが開いている場合
+            ConversionCancelled: 変換がキャンセルされた場合
+        """
+        max_retries = int(self.settings['max_retries'])
+        reserved_tokens = self.estimate_message_tokens(messages) + MAX_COMPLETION_TOKENS
+        for attempt in range(max_retries + 1):
+            if self.cancel_token is not None:
+                self.cancel_token.raise_if_cancelled()
+            if not self.circuit_breaker.allow_request():
+                raise CircuitOpenError("サーキットブレーカーが開いているためAPI呼び出しをスキップ")
+            # RPM/TPMの予算が空くまで待つ（再試行も1リクエストとして数える）
+            self.rate_limiter.acquire(reserved_tokens, self.cancel_token)
+            try:
+                answer = self._request_cancellable(messages, reserved_tokens)
+            except ConversionCancelled:
+                raise
+            except Exception as e:
+                if self._cancelled():
+                    # キャンセル後に届いたエラーは失敗として数えない
+                    raise ConversionCancelled("変換がキャンセルされました") from e
+                with self._usage_lock:
+                    self.usage['failures'] += 1
+                if not _is_retryable(e):
+                    # リクエスト自体の誤り・認証エラーなどはAPIが応答しているため、障害として数えない
+                    # （復旧確認の試行だった場合は復旧とみなす）
+                    self.circuit_breaker.record_success()
+                    raise
+                # 429の場合は、ヘッダーのリセットまでの時間は全ワーカーが新しいリクエストを送らない
+                rate_limited = (isinstance(e, openai.RateLimitError)
+                                and self.rate_limiter.penalize(getattr(getattr(e, 'response', None), 'headers', None)))
+                if attempt == max_retries or self.circuit_breaker.state == 'half_open':
+                    # 失敗は再試行を使い切った呼び出しごとに1回だけ数える（復旧確認の試行は再試行せずに遮断に戻す）
+                    self.circuit_breaker.record_failure()
+                    raise
+                # レート制限の待ちで足りる場合はバックオフしない
+                delay = 0.0 if rate_limited else self._backoff_delay(attempt, e)
+                with self._usage_lock:
+                    self.usage['retries'] += 1
+                logger.warning(f"OpenAI APIエラーのため {delay:.1f} 秒後に再試行 ({attempt + 1}/{max_retries}): {e}")
+                if self.cancel_token is not None:
+                    if self.cancel_token.wait(delay):
+                        raise ConversionCancelled("変換がキャンセルされました")
+                else:
+                    time.sleep(delay)
+                continue
+            self.circuit_breaker.record_success()
+            return answer
+
+    def classify(self, title, job_options):
+        """
+        職種分類を判定
+
+        回答が選択肢の番号として不正な場合のみ1回だけ再試行する。
+
+        Args:
+            title (str): 求人タイトル
+            job_options (list): 職種分類（中分類）の選択肢
+
+        Returns:
+            str: 選択された職種分類（判定できなかった場合はNone）
+
+        Raises:
+            CircuitOpenError: API障害中でローカル分類に切り替えるべき場合
+            ConversionCancelled: 変換がキャンセルされた場合
+        """
+        if not job_options:
+            return None
+
+        messages = self.build_messages(title, job_options)
+        for attempt in range(2):
+            answer = self._request_with_retry(messages)
+            logger.debug(f"GPT回答: {answer}")
+            index = self.parse_option_id(answer, len(job_options))
+            if index is not None:
+                return job_options[index]
+            with self._usage_lock:
+                self.usage['invalid_responses'] += 1
+            if attempt == 0:
+                logger.warning(f"不正な回答のため再試行: {answer!r}")
+        logger.warning(f"有効な回答が得られませんでした: {title}")
+        return None
+
+    def usage_summary(self):
+        """トークン使用量のサマリー文字列"""
+        summary = (f"API呼び出し: {self.usage['requests']} 回, "
+                   f"promptトークン: {self.usage['prompt_tokens']} (キャッシュ: {self.usage['cached_tokens']}), "
+                   f"completionトークン: {self.usage['completion_tokens']}, "
+                   f"不正回答: {self.usage['invalid_responses']} 件, "
+                   f"再試行: {self.usage['retries']} 回, 失敗: {self.usage['failures']} 回")
+        if self.rate_limiter.waits:
+            summary += f"\n{self.rate_limiter.summary()}"
+        return summary
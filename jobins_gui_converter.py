@@ -11,12 +11,31 @@ import csv
 import yaml
 import os
 import threading
+import time
+from contextlib import closing
 from datetime import datetime
 import re
 import logging
 import pandas as pd
 from dotenv import load_dotenv
 from openai import OpenAI
+from jobins_gpt_classifier import GPTJobClassifier, CircuitOpenError
+from jobins_output_writer import open_output_writer
+from jobins_local_classifier import pre_filter_technical_jobs, keyword_based_classification, create_local_classifier
+from jobins_title_model import create_title_model_store, training_labels
+from jobins_title_normalizer import TitleNormalizer
+from jobins_transform_memo import TransformMemo, DEFAULT_MEMO_SIZE
+from jobins_company_scope import CompanyScopeCache, DEFAULT_COMPANY_KEY_FIELD
+from jobins_classification_cache import (
+    cache_file_path, major_cache_file_path, create_classification_cache, api_labels,
+    SOURCE_API, SOURCE_KEYWORD, SOURCE_FALLBACK,
+)
+from jobins_typed_columns import TypedColumns
+from jobins_cancellation import CancellationToken, ConversionCancelled
+from jobins_pipeline import OrderedPipeline, DEFAULT_PIPELINE_WINDOW
+from jobins_input_reader import open_input
+from jobins_reject_log import RejectLog, TooManyRowErrors, iter_rows, screen_row
+from jobins_deadline import DegradedRowLog, create_deadline_budget
 
 # ログ設定
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -33,9 +52,12 @@ class JobinsGUIConverter:
         self.input_file_path = tk.StringVar()
         self.output_file_path = tk.StringVar()
         self.config_file_path = tk.StringVar(value='jobins_yaml_mapping.yaml')
+        self.xlsx_output = tk.BooleanVar(value=False)
+        self.deadline = tk.StringVar()
         
         # 変換クラス初期化
         self.converter = None
+        self.cancel_token = None
         
         # UI構築
         self.create_widgets()
@@ -74,27 +96,37 @@ class JobinsGUIConverter:
         ttk.Entry(main_frame, textvariable=self.config_file_path, width=50).grid(row=3, column=1, sticky=(tk.W, tk.E), padx=(10, 5))
         ttk.Button(main_frame, text="選択", command=self.select_config_file).grid(row=3, column=2, padx=(5, 0))
         
-        # 実行ボタン
-        self.convert_button = ttk.Button(main_frame, text="変換実行", command=self.start_conversion)
-        self.convert_button.grid(row=4, column=0, columnspan=3, pady=20)
+        # 出力形式
+        ttk.Checkbutton(main_frame, text="JOBINS用書式（Excel）で出力", variable=self.xlsx_output).grid(row=4, column=1, sticky=tk.W, padx=(10, 5), pady=(5, 0))
+        
+        # 実行・キャンセルボタン
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=5, column=0, columnspan=3, pady=20)
+        self.convert_button = ttk.Button(button_frame, text="変換実行", command=self.start_conversion)
+        self.convert_button.grid(row=0, column=0, padx=5)
+        self.cancel_button = ttk.Button(button_frame, text="キャンセル", command=self.cancel_conversion, state='disabled')
+        self.cancel_button.grid(row=0, column=1, padx=5)
+        # 期限（空欄は期限なし）。間に合わない見込みになると残りのタイトルをローカル分類に切り替える
+        ttk.Label(button_frame, text="期限（例: 45m / 17:30）:").grid(row=0, column=2, padx=(20, 5))
+        ttk.Entry(button_frame, textvariable=self.deadline, width=10).grid(row=0, column=3)
         
         # 進捗バー
         self.progress_var = tk.StringVar(value="準備完了")
-        ttk.Label(main_frame, text="進捗:").grid(row=5, column=0, sticky=tk.W)
-        ttk.Label(main_frame, textvariable=self.progress_var).grid(row=5, column=1, sticky=tk.W, padx=(10, 0))
+        ttk.Label(main_frame, text="進捗:").grid(row=6, column=0, sticky=tk.W)
+        ttk.Label(main_frame, textvariable=self.progress_var).grid(row=6, column=1, sticky=tk.W, padx=(10, 0))
         
         self.progress_bar = ttk.Progressbar(main_frame, mode='determinate')
-        self.progress_bar.grid(row=6, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(5, 20))
+        self.progress_bar.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(5, 20))
         
         # 詳細進捗表示
         self.detail_progress_var = tk.StringVar(value="")
-        ttk.Label(main_frame, textvariable=self.detail_progress_var, font=('Arial', 8)).grid(row=7, column=0, columnspan=3, sticky=tk.W)
+        ttk.Label(main_frame, textvariable=self.detail_progress_var, font=('Arial', 8)).grid(row=8, column=0, columnspan=3, sticky=tk.W)
         
         # ログ表示エリア
-        ttk.Label(main_frame, text="ログ:").grid(row=8, column=0, sticky=(tk.W, tk.N))
+        ttk.Label(main_frame, text="ログ:").grid(row=9, column=0, sticky=(tk.W, tk.N))
         
         log_frame = ttk.Frame(main_frame)
-        log_frame.grid(row=9, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(5, 0))
+        log_frame.grid(row=10, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(5, 0))
         log_frame.columnconfigure(0, weight=1)
         log_frame.rowconfigure(0, weight=1)
         
@@ -106,7 +138,7 @@ class JobinsGUIConverter:
         scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
         
         # グリッド重み設定
-        main_frame.rowconfigure(9, weight=1)
+        main_frame.rowconfigure(10, weight=1)
     
     def log_message(self, message):
         """ログメッセージを表示"""
@@ -126,7 +158,7 @@ class JobinsGUIConverter:
         """入力ファイル選択ダイアログ"""
         filename = filedialog.askopenfilename(
             title="求人マスタCSVファイルを選択",
-            filetypes=[("CSVファイル", "*.csv"), ("すべてのファイル", "*.*")]
+            filetypes=[("CSVファイル", "*.csv *.csv.gz *.csv.zst"), ("すべてのファイル", "*.*")]
         )
         if filename:
             self.input_file_path.set(filename)
@@ -176,16 +208,27 @@ class JobinsGUIConverter:
         
         # UI無効化
         self.convert_button.config(state='disabled')
+        self.cancel_button.config(state='normal')
+        self.cancel_token = CancellationToken()
         self.progress_bar['value'] = 0
         self.progress_var.set("変換準備中...")
         self.detail_progress_var.set("")
         
         # 別スレッドで変換実行
-        thread = threading.Thread(target=self.run_conversion)
+        thread = threading.Thread(target=self.run_conversion, args=(self.cancel_token,))
         thread.daemon = True
         thread.start()
     
-    def run_conversion(self):
+    def cancel_conversion(self):
+        """実行中の変換をキャンセル（書き込み済みの出力と分類キャッシュは保存される）"""
+        if self.cancel_token is None or self.cancel_token.cancelled:
+            return
+        self.cancel_token.cancel()
+        self.cancel_button.config(state='disabled')
+        self.progress_var.set("キャンセル中...")
+        self.log_message("キャンセルを要求しました（書き込み済みの出力と分類キャッシュを保存して終了します）")
+    
+    def run_conversion(self, cancel_token=None):
         """実際の変換処理"""
         try:
             self.log_message("=" * 50)
@@ -194,11 +237,17 @@ class JobinsGUIConverter:
             # 変換器初期化
             self.converter = SimpleJobinsConverter(self.config_file_path.get())
             self.log_message("設定ファイルを読み込みました")
+            if self.deadline.get().strip():
+                self.converter.deadline = create_deadline_budget(
+                    self.deadline.get(), self.converter.gpt_classifier.settings, self.converter.processing_rules
+                )
+                self.log_message(f"期限: {self.deadline.get().strip()}（間に合わない場合はローカル分類に切り替え）")
             
             # 出力ファイル名生成
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             input_filename = os.path.basename(self.input_file_path.get())
-            output_filename = f"JOBINS掲載用_{timestamp}.csv"
+            extension = "xlsx" if self.xlsx_output.get() else "csv"
+            output_filename = f"JOBINS掲載用_{timestamp}.{extension}"
             
             if self.output_file_path.get():
                 output_path = os.path.join(self.output_file_path.get(), output_filename)
@@ -213,10 +262,14 @@ class JobinsGUIConverter:
                 self.input_file_path.get(), 
                 output_path,
                 self.log_message,
-                progress_callback=self.update_progress
+                progress_callback=self.update_progress,
+                cancel_token=cancel_token
             )
             
-            if success:
+            if cancel_token is not None and cancel_token.cancelled:
+                self.log_message("⏹ 変換をキャンセルしました")
+                self.log_message(f"途中までの出力: {os.path.abspath(output_path)}")
+            elif success:
                 self.log_message("✅ 変換が正常に完了しました！")
                 self.log_message(f"出力ファイル: {os.path.abspath(output_path)}")
                 
@@ -254,6 +307,7 @@ class JobinsGUIConverter:
         self.progress_var.set("準備完了")
         self.detail_progress_var.set("")
         self.convert_button.config(state='normal')
+        self.cancel_button.config(state='disabled')
 
 class SimpleJobinsConverter:
     """CSV変換クラス（simple_converterから移植）"""
@@ -488,6 +542,18 @@ class SimpleJobinsConverter:
         ("ITエンジニア【システム開発・SE・インフラ】", "サーバ運用・保守", ""),
     ]
     
+    # 職種分類の判定ルール（プロンプト先頭の静的部分）
+    CLASSIFICATION_RULES = """【最優先判定ルール（営業系絶対除外）】
+・「エンジニア」「開発」「プログラマー」「SE」「PG」+ プログラミング言語（Java/PHP/Python/JavaScript等）が含まれる場合
+  → 営業系職種は絶対に選択禁止、必ずITエンジニア系を選択
+・「デザイナー」「UI」「UX」「デザイン」が含まれる場合
+  → 営業系職種は絶対に選択禁止、必ずクリエイティブ系またはWeb系を選択
+
+【通常の判定ルール】
+・「マーケティング」「企画」が含まれる場合は企画・マーケティング系を選択
+・「採用」「人事」「HR」が含まれる場合は事務・管理系の人事関連を選択
+・「営業」「セールス」は技術系キーワードが一切ない場合のみ営業系を選択"""
+    
     def __init__(self, yaml_config_path):
         self.yaml_config_path = yaml_config_path
         self.config = self._load_yaml_config()
@@ -504,15 +570,69 @@ class SimpleJobinsConverter:
             self.openai_client = OpenAI(api_key=api_key)
         else:
             self.openai_client = None
+        self.gpt_classifier = GPTJobClassifier(
+            self.openai_client,
+            instructions=self.CLASSIFICATION_RULES,
+            settings=self.config.get('gpt_settings')
+        )
         
-        # キャッシュ機能
-        self.job_classification_cache = {}
+        # キャッシュ機能（分類テーブルの変更で無効化、前回までの分類結果をファイルから読み込み）
+        self.job_classification_cache = self._load_classification_cache()
+        # 2段階分類（大分類→中分類）の大分類の選択肢と1段階目のキャッシュ
+        self.major_options = list(dict.fromkeys(category[0] for category in self.JOB_CATEGORIES))
+        self.major_classification_cache = (
+            self._load_classification_cache(major=True)
+            if self.gpt_classifier.settings['hierarchical_classification'] else None
+        )
+        # 確信度付きローカル分類（opt-in、キャッシュのうちAPIで分類したエントリで較正し、確信度が高いタイトルはAPIを呼ばない）
+        self.local_classifier = create_local_classifier(
+            self.JOB_CATEGORIES, self.gpt_classifier.settings, api_labels(self.job_classification_cache)
+        )
+        # API分類の結果から学習した職種分類モデル（opt-in、キャッシュのAPI分類が増えると再学習）
+        self.title_model = create_title_model_store(self.config, self.JOB_CATEGORIES)
+        # 並列の分類ワーカー間でキャッシュと分類中のタイトルを共有するためのロック
+        self._classification_lock = threading.Lock()
+        self._titles_in_flight = {}
+        self.title_normalizer = TitleNormalizer(self.config.get('title_normalization'))
+        self.transform_memo = TransformMemo(self.processing_rules.get('transform_memo_size', DEFAULT_MEMO_SIZE))
+        # 職種分類モデル・ローカル分類の判定のメモ（キャッシュには保存しないため、同じタイトルの行で判定を繰り返さないよう変換中に保持）
+        self.local_memo = TransformMemo(self.processing_rules.get('transform_memo_size', DEFAULT_MEMO_SIZE))
+        self._local_memo_lock = threading.Lock()
+        self.company_scope = CompanyScopeCache(
+            self.field_mapping, self.processing_rules.get('company_key_field', DEFAULT_COMPANY_KEY_FIELD)
+        )
+        self.typed_columns = TypedColumns(
+            self.config.get('typed_columns'), [mapping['target_column'] for mapping in self.field_mapping]
+        )
+        # 期限付きの変換の期限（GUIの期限欄で指定）
+        self.deadline = None
         
     def _load_yaml_config(self):
         """YAMLマッピング設定を読み込み"""
         with open(self.yaml_config_path, 'r', encoding='utf-8') as file:
             return yaml.safe_load(file)
     
+    def _load_classification_cache(self, major=False):
+        """職種分類キャッシュ（majorの場合は2段階分類の大分類キャッシュ）を作成し、前回までの分類結果をファイルから読み込み"""
+        cache = create_classification_cache(self.processing_rules, self.JOB_CATEGORIES, major=major)
+        path = major_cache_file_path(self.processing_rules) if major else cache_file_path(self.processing_rules)
+        try:
+            cache.load(path)
+        except Exception as e:
+            logger.warning(f"{cache.name}の読み込みに失敗、空のキャッシュで開始: {e}")
+        return cache
+    
+    def save_classification_cache(self, path=None):
+        """職種分類キャッシュ（2段階分類の場合は大分類キャッシュも）をファイルに保存し、必要なら職種分類モデルを再学習"""
+        with self._classification_lock:
+            self.job_classification_cache.save(path or cache_file_path(self.processing_rules))
+            if self.major_classification_cache is not None:
+                self.major_classification_cache.save(major_cache_file_path(self.processing_rules))
+            labels = training_labels(self.job_classification_cache)
+        if self.title_model is not None:
+            # API分類が前回の学習から増えていれば職種分類モデルを別スレッドで再学習
+            self.title_model.maybe_retrain(labels)
+    
     def _should_include_row(self, row, headers):
         """行がフィルタ条件を満たすかチェック"""
         # 含める条件
@@ -548,6 +668,25 @@ class SimpleJobinsConverter:
         
         return ""
     
+    def _company_scoped_values(self, row, headers):
+        """会社単位の列を (企業名, ソース値) ごとに1回だけ変換"""
+        if not self.company_scope:
+            return {}
+        
+        source_values = [
+            self._get_source_value(row, headers, mapping['source_field'])
+            for mapping in self.company_scope.mappings
+        ]
+        
+        def compute():
+            return {
+                mapping['target_column']: self._transform_field(source_value, mapping['transform'], row, headers)
+                for mapping, source_value in zip(self.company_scope.mappings, source_values)
+            }
+        
+        company_name = self._get_source_value(row, headers, self.company_scope.company_key_field)
+        return self.company_scope.get_values(company_name, source_values, compute)
+    
     def _transform_field(self, source_value, transform_rule, row=None, headers=None):
         """フィールド変換ルールを適用"""
         if transform_rule == "そのまま":
@@ -567,10 +706,13 @@ class SimpleJobinsConverter:
             if "職種分類" in transform_rule:
                 return self._classify_job_category_with_gpt(source_value, transform_rule, row, headers)
             else:
-                return self._simple_classification(source_value, transform_rule, row, headers)
+                return self.transform_memo.get_or_compute(
+                    transform_rule, source_value,
+                    lambda value: self._simple_classification(value, transform_rule, row, headers)
+                )
         
         elif "採用人数" in transform_rule:
-            return self._extract_hiring_count(source_value)
+            return self.transform_memo.get_or_compute(transform_rule, source_value, self._extract_hiring_count)
         
         elif "年齢" in transform_rule and "記載がない場合" in transform_rule:
             if source_value and source_value.strip():
@@ -581,7 +723,7 @@ class SimpleJobinsConverter:
                 return "25"
         
         elif "都道府県正規化" in transform_rule:
-            return self._normalize_prefecture(source_value)
+            return self.transform_memo.get_or_compute(transform_rule, source_value, self._normalize_prefecture)
         
         return source_value
     
@@ -590,23 +732,54 @@ class SimpleJobinsConverter:
         if not source_value or not source_value.strip():
             return ""
         
-        # キャッシュから検索
-        cache_key = source_value.strip()
-        if cache_key in self.job_classification_cache:
-            return self.job_classification_cache[cache_key]
+        # タイトルを正規化してからキャッシュ検索・分類（タグや全角半角の違いを同じキーにまとめる）
+        title = self.title_normalizer.normalize(source_value)
+        cache_key = title
+        
+        # 並列の分類ワーカー間で、同じタイトルの分類（API呼び出し）は1回にまとめる
+        with self._classification_lock:
+            cached = self.job_classification_cache.get(cache_key)
+            if cached is not None:
+                return cached
+            in_flight = self._titles_in_flight.get(cache_key)
+            if in_flight is None:
+                self._titles_in_flight[cache_key] = threading.Event()
+        
+        if in_flight is not None:
+            # 他のワーカーの分類結果を待つ（キャッシュされなかった場合はこのワーカーで分類）
+            in_flight.wait()
+            with self._classification_lock:
+                cached = self.job_classification_cache.peek(cache_key)
+            if cached is not None:
+                return cached
         
+        try:
+            result, source = self._classify_uncached_title(title, row, headers)
+            if source is not None:
+                with self._classification_lock:
+                    self.job_classification_cache.put(cache_key, result, source=source)
+            return result
+        finally:
+            if in_flight is None:
+                with self._classification_lock:
+                    self._titles_in_flight.pop(cache_key).set()
+    
+    def _classify_uncached_title(self, title, row, headers):
+        """
+        キャッシュにない正規化済みタイトルを分類
+        
+        Returns:
+            tuple: (職種分類, 分類の出所)。キャッシュに保存しない結果の出所はNone
+        """
         if not self.openai_client:
             # API未設定の場合はキーワードベースフォールバック
-            result = self._keyword_based_classification(source_value)
-            self.job_classification_cache[cache_key] = result
-            return result
+            return self._keyword_based_classification(title), SOURCE_KEYWORD
         
         try:
             # 事前フィルタリング: 技術系の場合は営業系を完全除外
-            pre_filtered_result = self._pre_filter_technical_jobs(source_value)
+            pre_filtered_result = self._pre_filter_technical_jobs(title)
             if pre_filtered_result:
-                self.job_classification_cache[cache_key] = pre_filtered_result
-                return pre_filtered_result
+                return pre_filtered_result, SOURCE_KEYWORD
             
             # AH列（職種）の値を取得して動的フィルタリング
             ah_value = ""
@@ -616,6 +789,7 @@ class SimpleJobinsConverter:
                     ah_value = row[field_index].strip() if row[field_index] else ""
             
             # AH列の値に基づいて選択肢をフィルタリング
+            matched = False
             if ah_value:
                 filtered_categories = [
                     category for category in self.JOB_CATEGORIES 
@@ -623,6 +797,7 @@ class SimpleJobinsConverter:
                 ]
                 if filtered_categories:
                     job_options = [category[1] for category in filtered_categories]
+                    matched = True
                     logger.info(f"AH列の値 '{ah_value}' に基づいて {len(job_options)} の選択肢にフィルタリング")
                 else:
                     # 一致する選択肢がない場合は全選択肢を使用
@@ -633,72 +808,88 @@ class SimpleJobinsConverter:
                 job_options = [category[1] for category in self.JOB_CATEGORIES]
                 logger.info("AH列の値なし、全選択肢を使用")
             
-            job_options_text = "\n".join([f"{i+1}. {option}" for i, option in enumerate(job_options)])
+            # 職種分類モデル・ローカル分類の確信度がしきい値以上ならAPIを呼ばない
+            # （学習・較正をAPI分類の結果だけで行えるよう、キャッシュには保存しない）
+            if self.title_model is not None or self.local_classifier is not None:
+                result = self._resolve_local(title, ah_value, job_options)
+                if result is not None:
+                    return result, None
             
-            # プロンプト作成
-            prompt = f"""以下の求人タイトルに最も適した職種分類を、下記の選択肢から1つだけ選んでください。
-
-【最優先判定ルール（営業系絶対除外）】
-・「エンジニア」「開発」「プログラマー」「SE」「PG」+ プログラミング言語（Java/PHP/Python/JavaScript等）が含まれる場合
-  → 営業系職種は絶対に選択禁止、必ずITエンジニア系を選択
-・「デザイナー」「UI」「UX」「デザイン」が含まれる場合
-  → 営業系職種は絶対に選択禁止、必ずクリエイティブ系またはWeb系を選択
-
-【通常の判定ルール】
-・「マーケティング」「企画」が含まれる場合は企画・マーケティング系を選択
-・「採用」「人事」「HR」が含まれる場合は事務・管理系の人事関連を選択
-・「営業」「セールス」は技術系キーワードが一切ない場合のみ営業系を選択
-
-【求人タイトル】
-{source_value}
-
-【職種分類の選択肢】
-{job_options_text}
-
-回答は「番号: 職種名」の形式で、最も適切な1つだけを選択してください。
-例: 1: 企画営業【法人営業・個人営業】"""
-
-            # OpenAI API呼び出し
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "あなたは職種分類の専門家です。業務内容を分析して最適な職種分類を選択してください。"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=100,
-                temperature=0.1
-            )
+            # 期限に間に合わない場合はキーワードベースに切り替え（次回の変換で再分類できるようキャッシュしない）
+            if self.deadline is not None and self.deadline.should_degrade():
+                result = self._keyword_based_classification(title)
+                self.deadline.record_degraded(title, result)
+                return result, None
             
-            # レスポンス解析
-            answer = response.choices[0].message.content.strip()
+            # OpenAI API呼び出し（選択肢は番号で送信し、番号のみの回答を検証）
+            started = time.monotonic()
+            if not matched and self.major_classification_cache is not None:
+                result = self._classify_two_stage(title)
+            else:
+                result = self.gpt_classifier.classify(title, job_options)
+            if self.deadline is not None:
+                self.deadline.record_call(time.monotonic() - started)
+            if result is None:
+                return "その他営業関連職", SOURCE_FALLBACK  # デフォルト
+            return result, SOURCE_API
             
-            # 回答から職種名を抽出
-            result = "その他営業関連職"  # デフォルト
-            for line in answer.split('\n'):
-                if ':' in line:
-                    try:
-                        parts = line.split(':', 1)
-                        if len(parts) == 2:
-                            job_name = parts[1].strip()
-                            # フィルタリングされた選択肢内に存在するかチェック
-                            if job_name in job_options:
-                                result = job_name
-                                break
-                    except:
-                        continue
-                    if result != "その他営業関連職":
-                        break
+        except ConversionCancelled:
+            raise
             
-            # キャッシュに保存
-            self.job_classification_cache[cache_key] = result
-            return result
+        except CircuitOpenError:
+            # API障害中はキーワードベースに切り替え（復旧後に再判定できるようキャッシュしない）
+            return self._keyword_based_classification(title), None
             
         except Exception as e:
-            # API呼び出し失敗時のキーワードベースフォールバック
-            print(f"OpenAI API呼び出しエラー: {e}")
-            result = self._keyword_based_classification(source_value)
-            self.job_classification_cache[cache_key] = result
-            return result
+            # API呼び出し失敗時のキーワードベースフォールバック（キャッシュしない）
+            logger.error(f"OpenAI API呼び出しエラー: {e}")
+            return self._keyword_based_classification(title), None
+    
+    def _resolve_local(self, title, ah_value, job_options):
+        """
+        職種分類モデル・ローカル分類の確信度がしきい値以上ならその分類を返す（APIで分類すべき場合はNone）
+        
+        判定は (正規化したタイトル, 職種) ごとにメモし、同じタイトルの行ではモデルの予測や確信度を計算し直さない。
+        モデルを再学習した後の判定はモデルのバージョンごとに別にメモする。
+        """
+        def resolve(_):
+            if self.title_model is not None:
+                result = self.title_model.resolve(title, job_options)
+                if result is not None:
+                    return result
+            if self.local_classifier is not None:
+                return self.local_classifier.resolve(title, job_options)
+            return None
+        
+        model_version = self.title_model.version if self.title_model is not None else None
+        with self._local_memo_lock:
+            return self.local_memo.get_or_compute(
+                ("ローカル分類", model_version), (title, ah_value), resolve
+            )
+    
+    def _classify_two_stage(self, title):
+        """
+        大分類を選んでから、その大分類の中分類の中から選ぶ（全選択肢を1回で送るより短いプロンプトで分類）
+        
+        1段階目の大分類は大分類キャッシュに保存し、2段階目の中分類は呼び出し元で職種分類キャッシュに保存する。
+        
+        Returns:
+            str: 職種分類（中分類）（判定できなかった場合はNone）
+        """
+        with self._classification_lock:
+            major = self.major_classification_cache.get(title)
+        if major is None:
+            major = self.gpt_classifier.classify(title, self.major_options)
+            if major is None:
+                return None
+            with self._classification_lock:
+                self.major_classification_cache[title] = major
+        job_options = [category[1] for category in self.JOB_CATEGORIES if category[0] == major]
+        return self.gpt_classifier.classify(title, job_options)
+    
+    def classify_title(self, title, job_type=""):
+        """求人タイトルと職種から職種分類（中分類）を判定（キャッシュのウォームアップ用）"""
+        return self._classify_job_category_with_gpt(title, None, [job_type], ["職種"])
     
     def _get_job_major_category(self, job_minor_category):
         """職種中分類から職種大分類を取得"""
@@ -795,8 +986,60 @@ class SimpleJobinsConverter:
         else:
             return "若干名"
     
-    def convert_csv_with_callback(self, input_csv_path, output_csv_path, log_callback, progress_callback=None):
-        """CSVファイルを変換（コールバック付き）"""
+    def _transform_row(self, row, headers, sorted_field_mapping, classified_values, row_number):
+        """
+        1行を変換して出力行（元のカラム順）を返す
+        
+        Args:
+            sorted_field_mapping (list): 優先度順のフィールドマッピング
+            classified_values (dict): 分類ステージで変換済みの列の値
+            row_number (int): 出力の行番号（数値列の検証レポート用）
+        """
+        # 会社単位の列は (企業名, ソース値) ごとに計算済みの値を使用
+        transformed_values = dict(self._company_scoped_values(row, headers))
+        job_minor_category = ""
+        
+        for mapping in sorted_field_mapping:  # 優先度順で処理
+            source_field = mapping['source_field']
+            target_column = mapping['target_column']
+            transform_rule = mapping['transform']
+            
+            if target_column in transformed_values:
+                continue
+            
+            if target_column in classified_values:
+                # 分類ステージで変換済み
+                transformed_value = classified_values[target_column]
+            else:
+                # ソース値取得・変換適用
+                source_value = self._get_source_value(row, headers, source_field)
+                transformed_value = self._transform_field(source_value, transform_rule, row, headers)
+            
+            # 職種分類（中分類）の場合は値を保存
+            if target_column == "職種分類（中分類）":
+                job_minor_category = transformed_value
+            
+            # 職種（大分類）の場合は職種分類（中分類）から取得
+            elif target_column == "職種（大分類）":
+                transformed_value = self._get_job_major_category(job_minor_category)
+            
+            transformed_values[target_column] = transformed_value
+        
+        # 数値列（年収・年齢・従業員数）の型付けと検証
+        if self.typed_columns:
+            self.typed_columns.apply_row(transformed_values, row_number)
+        
+        # 元の順序で出力行を構築
+        return [transformed_values.get(mapping['target_column'], "") for mapping in self.field_mapping]
+    
+    def convert_csv_with_callback(self, input_csv_path, output_csv_path, log_callback, progress_callback=None,
+                                  cancel_token=None):
+        """
+        CSVファイルを変換（コールバック付き）
+        
+        cancel_tokenがキャンセルされた場合は、行の間または実行中のAPI呼び出しの待ちで中断し、
+        それまでに書き込んだ出力と分類キャッシュを保存してFalseを返す。
+        """
         log_callback(f"CSVファイル読み込み開始: {os.path.basename(input_csv_path)}")
         
         # フィールドマッピングを処理順序で並び替え（職種分類（中分類）を先に処理）
@@ -805,258 +1048,198 @@ class SimpleJobinsConverter:
         # 出力カラムの準備（元の順序を維持）
         output_columns = [mapping['target_column'] for mapping in self.field_mapping]
         
+        # API呼び出しを伴う列（職種分類）は分類ワーカーで並行に変換
+        classification_mappings = [
+            mapping for mapping in self.field_mapping
+            if "GPT" in mapping['transform'] and "職種分類" in mapping['transform']
+            and mapping['target_column'] not in self.company_scope.target_columns
+        ]
+        
         input_count = 0
         output_count = 0
         total_rows = 0
+        self.typed_columns.violations.clear()
+        self.gpt_classifier.cancel_token = cancel_token
+        cancelled = False
+        aborted = False
+        reject_log = None
+        degraded_log = DegradedRowLog(output_csv_path, self.processing_rules) if self.deadline is not None else None
         
         try:
             # 総行数をカウント
-            with open(input_csv_path, 'r', encoding='utf-8-sig') as temp_file:
+            with open_input(input_csv_path, errors='surrogateescape') as temp_file:
                 total_rows = sum(1 for line in temp_file) - 1  # ヘッダーを除く
             log_callback(f"総行数: {total_rows} 行")
             
             if progress_callback:
                 progress_callback(0, total_rows, "CSV読み込み開始")
             
-            with open(input_csv_path, 'r', encoding='utf-8-sig') as infile, \
-                 open(output_csv_path, 'w', encoding='utf-8-sig', newline='') as outfile:
+            with open_input(input_csv_path, errors='surrogateescape') as infile, \
+                 open_output_writer(output_csv_path, output_columns, self.processing_rules) as writer:
                 
                 reader = csv.reader(infile)
-                writer = csv.writer(outfile)
                 
                 # ヘッダー行処理
                 input_headers = next(reader)
                 input_count += 1
                 log_callback(f"ヘッダー読み込み完了: {len(input_headers)} 列")
+                reject_log = RejectLog(output_csv_path, input_headers, self.processing_rules)
                 
-                # 出力ヘッダー書き込み
-                writer.writerow(output_columns)
+                # 読み込みステージ（別スレッド）: フィルタ条件を満たす行（形式上の問題がある行を含む）と
+                # 解析できなかった行を (入力行番号, 行, 問題の理由) で順に渡す
+                # 空行・フィルタ条件を満たさない行はエラー行に数えない
+                def filtered_rows():
+                    nonlocal input_count
+                    for row, parse_error in iter_rows(reader):
+                        if cancel_token is not None:
+                            cancel_token.raise_if_cancelled()
+                        input_count += 1
+                        if parse_error:
+                            yield input_count, row, parse_error
+                            continue
+                        screened = screen_row(row, input_headers, self._should_include_row)
+                        if screened is not None:
+                            yield (input_count, *screened)
                 
-                # データ行処理
-                for row in reader:
-                    input_count += 1
-                    
-                    # 進捗表示
-                    if progress_callback:
-                        stage_message = "フィルタリング中"
-                        if input_count % 100 == 0:  # 100行ごとに更新
-                            progress_callback(input_count, total_rows, stage_message)
-                    
-                    # フィルタリングチェック
-                    if not self._should_include_row(row, input_headers):
-                        continue
-                    
-                    # 進捗表示更新
-                    if progress_callback:
-                        cache_info = f"(キャッシュ: {len(self.job_classification_cache)}件)"
-                        progress_callback(input_count, total_rows, f"データ変換中 {cache_info}")
-                    
-                    # 出力行作成
-                    output_row = []
-                    job_minor_category = ""
-                    
-                    for mapping in sorted_field_mapping:  # 優先度順で処理
-                        source_field = mapping['source_field']
-                        target_column = mapping['target_column']
-                        transform_rule = mapping['transform']
-                        
-                        # ソース値取得
-                        source_value = self._get_source_value(row, input_headers, source_field)
-                        
-                        # 職種分類判定の場合は特別表示
-                        if target_column == "職種分類（中分類）" and "GPT" in transform_rule:
-                            if progress_callback:
-                                progress_callback(input_count, total_rows, f"AI職種判定中 (行:{output_count+1})")
+                # 分類ステージ（ワーカー）: API呼び出しを伴う列（職種分類）を先に変換
+                def classify_row(item):
+                    _, row, problem = item
+                    if problem:
+                        return {}, None
+                    try:
+                        return {
+                            mapping['target_column']: self._transform_field(
+                                self._get_source_value(row, input_headers, mapping['source_field']),
+                                mapping['transform'], row, input_headers
+                            )
+                            for mapping in classification_mappings
+                        }, None
+                    except ConversionCancelled:
+                        raise
+                    except Exception as e:
+                        return {}, f"変換エラー: {type(e).__name__}: {e}"
+                
+                pipeline = OrderedPipeline(
+                    workers=self.gpt_classifier.settings['concurrency'],
+                    window=self.processing_rules.get('pipeline_window', DEFAULT_PIPELINE_WINDOW)
+                )
+                
+                # 変換・書き込みステージ: 分類済みの行を入力の順序で受け取り、残りの列を変換して書き込み
+                # 変換できない行はエラー行ファイルに書き出して続行
+                with reject_log, closing(pipeline.run(filtered_rows(), classify_row)) as classified_rows:
+                    for (row_number, row, problem), (classified_values, error) in classified_rows:
+                        if cancel_token is not None:
+                            cancel_token.raise_if_cancelled()
                         
-                        # 変換適用
-                        transformed_value = self._transform_field(
-                            source_value, transform_rule, row, input_headers
-                        )
+                        if problem or error:
+                            reject_log.record(row_number, row, problem or error)
+                            continue
                         
-                        # 職種分類（中分類）の場合は値を保存
-                        if target_column == "職種分類（中分類）":
-                            job_minor_category = transformed_value
+                        # 進捗表示更新
+                        if progress_callback:
+                            cache_info = f"(キャッシュ: {len(self.job_classification_cache)}件)"
+                            progress_callback(row_number, total_rows, f"データ変換中 {cache_info}")
                         
-                        # 職種（大分類）の場合は職種分類（中分類）から取得
-                        elif target_column == "職種（大分類）":
-                            transformed_value = self._get_job_major_category(job_minor_category)
-                    
-                    # 元の順序で出力行を構築
-                    final_output_row = []
-                    for original_mapping in self.field_mapping:
-                        target_column = original_mapping['target_column']
+                        try:
+                            final_output_row = self._transform_row(
+                                row, input_headers, sorted_field_mapping, classified_values, output_count + 1
+                            )
+                        except Exception as e:
+                            reject_log.record(row_number, row, f"変換エラー: {type(e).__name__}: {e}")
+                            continue
                         
-                        # 対応する値を見つけて追加
-                        found_value = ""
-                        for processed_mapping in sorted_field_mapping:
-                            if processed_mapping['target_column'] == target_column:
-                                # 処理済みの値を使用（簡略化のため、再処理）
-                                source_field = processed_mapping['source_field']
-                                transform_rule = processed_mapping['transform']
-                                source_value = self._get_source_value(row, input_headers, source_field)
-                                
-                                if target_column == "職種分類（中分類）":
-                                    found_value = job_minor_category
-                                elif target_column == "職種（大分類）":
-                                    found_value = self._get_job_major_category(job_minor_category)
-                                else:
-                                    found_value = self._transform_field(
-                                        source_value, transform_rule, row, input_headers
-                                    )
-                                break
+                        # 出力行書き込み
+                        writer.writerow(final_output_row)
+                        output_count += 1
                         
-                        final_output_row.append(found_value)
-                    
-                    # 出力行書き込み
-                    writer.writerow(final_output_row)
-                    output_count += 1
+                        if self.deadline is not None:
+                            self.deadline.set_progress(row_number, total_rows)
+                            self._record_degraded_row(degraded_log, row, input_headers, classification_mappings,
+                                                      classified_values, output_count)
+        
+        except TooManyRowErrors as e:
+            # 書き込み済みの行は出力ファイルに残す
+            aborted = True
+            log_callback(f"{e}（{output_count} 行を出力済み）")
+        
+        except ConversionCancelled:
+            # 出力ファイルはwithを抜けた時点で書き込み済みの行まで保存されている
+            cancelled = True
+            log_callback(f"変換をキャンセルしました（{output_count} 行を出力済み）")
         
         except Exception as e:
             log_callback(f"変換処理でエラーが発生: {e}")
+            # 途中で失敗してもそれまでのAPI分類の結果は捨てない
+            if self.openai_client:
+                self._save_cache_logged(log_callback)
             return False
         
+        finally:
+            self.gpt_classifier.cancel_token = None
+            self.gpt_classifier.shutdown()
+            if degraded_log is not None:
+                degraded_log.close()
+        
         # 最終進捗更新
-        if progress_callback:
+        if progress_callback and not cancelled and not aborted:
             progress_callback(total_rows, total_rows, "変換完了")
         
         log_callback(f"入力行数: {input_count}")
         log_callback(f"出力行数: {output_count}")
-        log_callback(f"フィルタリング: {input_count - output_count} 行除外")
-        log_callback(f"キャッシュヒット数: {len(self.job_classification_cache)} 件")
-        
-        return True
+        log_callback(f"フィルタリング: {input_count - output_count - reject_log.count} 行除外")
+        log_callback(reject_log.summary())
+        log_callback(self.job_classification_cache.summary())
+        if self.major_classification_cache is not None:
+            log_callback(self.major_classification_cache.summary())
+        if self.title_model is not None:
+            log_callback(self.title_model.summary())
+        if self.local_classifier is not None:
+            log_callback(self.local_classifier.summary())
+        if self.deadline is not None:
+            log_callback(self.deadline.summary())
+            log_callback(degraded_log.summary())
+        log_callback(self.transform_memo.summary())
+        if self.company_scope:
+            log_callback(self.company_scope.summary())
+        if self.typed_columns:
+            log_callback(self.typed_columns.summary())
+            report_path = self.typed_columns.write_report(output_csv_path)
+            if report_path:
+                log_callback(f"数値列の検証レポート: {os.path.basename(report_path)}")
+        if self.openai_client:
+            log_callback(self.gpt_classifier.usage_summary())
+            # API分類の結果は次回以降の変換のためにキャッシュファイルへ保存
+            self._save_cache_logged(log_callback)
+        
+        return not cancelled and not aborted
+    
+    def _save_cache_logged(self, log_callback):
+        """職種分類キャッシュを保存し、失敗した場合はログに出して続行"""
+        try:
+            self.save_classification_cache()
+        except Exception as e:
+            log_callback(f"職種分類キャッシュの保存に失敗: {e}")
+    
+    def _record_degraded_row(self, degraded_log, row, headers, classification_mappings, classified_values, output_row):
+        """ローカル分類に切り替えたタイトルの行をローカル分類行ファイルに書き出し"""
+        if not self.deadline.degraded_titles:
+            return
+        for mapping in classification_mappings:
+            if "職種分類" not in mapping['transform']:
+                continue
+            source_value = self._get_source_value(row, headers, mapping['source_field'])
+            if source_value and source_value.strip() and \
+                    self.deadline.is_degraded_title(self.title_normalizer.normalize(source_value)):
+                job_type = self._get_source_value(row, headers, "職種")
+                degraded_log.record(output_row, source_value, job_type, classified_values[mapping['target_column']])
     
     def _pre_filter_technical_jobs(self, source_value):
         """技術系職種の事前フィルタリング（営業系誤分類防止）"""
-        if not source_value:
-            return None
-        
-        content = source_value.lower()
-        
-        # 技術系の強力なシグナル
-        engineer_keywords = ["エンジニア", "開発", "プログラマー", "se", "pg"]
-        tech_languages = ["java", "php", "python", "javascript", "react", "vue", "angular", "go", "ruby", "c++", "c#", "swift", "kotlin"]
-        tech_tools = ["docker", "kubernetes", "aws", "azure", "gcp", "git", "github"]
-        
-        has_engineer = any(keyword in content for keyword in engineer_keywords)
-        has_language = any(keyword in content for keyword in tech_languages)
-        has_tools = any(keyword in content for keyword in tech_tools)
-        
-        # エンジニア + プログラミング言語 = 絶対的技術職
-        if has_engineer and (has_language or has_tools):
-            if any(keyword in content for keyword in ["バックエンド", "backend", "サーバー", "api"]):
-                return "Web・オープン系 SE【アプリケーション設計】"
-            elif any(keyword in content for keyword in ["フロントエンド", "frontend", "react", "vue"]):
-                return "Webデザイナー、フロントエンドエンジニア、コーダー、フラッシャー"
-            elif any(keyword in content for keyword in ["インフラ", "サーバー", "ネットワーク", "aws", "azure"]):
-                return "サーバ設計・サーバ構築"
-            else:
-                return "Web・オープン系 プログラマ【PG】"
-        
-        # デザイナー系の事前フィルタリング
-        designer_keywords = ["デザイナー", "ui", "ux"]
-        if any(keyword in content for keyword in designer_keywords):
-            if any(keyword in content for keyword in ["ui", "ux"]):
-                return "情報アーキテクト、UI/UXデザイナー"
-            elif "web" in content:
-                return "Webデザイナー、フロントエンドエンジニア、コーダー、フラッシャー"
-            else:
-                return "グラフィックデザイナー"
-        
-        return None  # 事前フィルタリング該当なし
+        return pre_filter_technical_jobs(source_value)
     
     def _keyword_based_classification(self, source_value):
         """キーワードベースでの職種分類（GPT API未設定時のフォールバック）"""
-        if not source_value:
-            return "その他営業関連職"
-        
-        content = source_value.lower()
-        
-        # エンジニア系（強力な優先判定）
-        engineer_keywords = ["エンジニア", "開発", "プログラマー", "se", "pg"]
-        engineer_strong_keywords = engineer_keywords
-        tech_languages = ["java", "php", "python", "javascript", "react", "vue", "angular", "go", "ruby", "c++", "c#"]
-        tech_keywords = [
-            "プログラム", "コーディング", "プログラミング", "バックエンド", "フロントエンド",
-            "サーバー", "インフラ", "ネットワーク", "データベース", "mysql", "sql", "api"
-        ]
-        
-        # 技術系キーワード + プログラミング言語の組み合わせで絶対的にエンジニア判定
-        has_engineer_keyword = any(keyword in content for keyword in engineer_strong_keywords)
-        has_tech_language = any(keyword in content for keyword in tech_languages)
-        has_tech_keyword = any(keyword in content for keyword in tech_keywords)
-        
-        if has_engineer_keyword and (has_tech_language or has_tech_keyword):
-            if any(keyword in content for keyword in ["バックエンド", "サーバー", "api", "java", "php", "python"]):
-                return "Web・オープン系 SE【アプリケーション設計】"
-            elif any(keyword in content for keyword in ["フロントエンド", "react", "vue", "angular", "javascript"]):
-                return "Webデザイナー、フロントエンドエンジニア、コーダー、フラッシャー"
-            elif any(keyword in content for keyword in ["インフラ", "サーバー", "ネットワーク"]):
-                return "サーバ設計・サーバ構築"
-            else:
-                return "Web・オープン系 プログラマ【PG】"
-        
-        # デザイナー系
-        designer_keywords = [
-            "デザイナー", "デザイン", "ui", "ux", "グラフィック", "webデザイン",
-            "figma", "photoshop", "illustrator", "アートディレクター"
-        ]
-        if any(keyword in content for keyword in designer_keywords):
-            if any(keyword in content for keyword in ["ui", "ux", "webデザイン"]):
-                return "情報アーキテクト、UI/UXデザイナー"
-            elif any(keyword in content for keyword in ["web"]):
-                return "Webデザイナー、フロントエンドエンジニア、コーダー、フラッシャー"
-            else:
-                return "グラフィックデザイナー"
-        
-        # マーケティング系
-        marketing_keywords = [
-            "マーケティング", "企画", "広告", "宣伝", "プロモーション", "商品企画",
-            "事業企画", "経営企画", "webマーケティング", "デジタルマーケティング"
-        ]
-        if any(keyword in content for keyword in marketing_keywords):
-            if "経営" in content:
-                return "経営企画"
-            elif any(keyword in content for keyword in ["web", "デジタル"]):
-                return "Webマーケティング、デジタルマーケティング"
-            elif "商品" in content:
-                return "商品企画、商品開発"
-            else:
-                return "販促企画、営業企画"
-        
-        # 人事・採用系
-        hr_keywords = [
-            "人事", "採用", "hr", "リクルート", "キャリアアドバイザー", "キャリアコンサルタント"
-        ]
-        if any(keyword in content for keyword in hr_keywords):
-            if any(keyword in content for keyword in ["キャリア", "アドバイザー", "コンサルタント"]):
-                return "キャリアカウンセラー、キャリアコンサルタント、人材派遣コーディネーター"
-            else:
-                return "人事、給与、労務、採用"
-        
-        # ディレクター系（エンジニアやデザイナーが誤分類されやすい）
-        director_keywords = ["ディレクター", "プロデューサー", "pm", "プロジェクトマネージャー"]
-        if any(keyword in content for keyword in director_keywords):
-            if any(keyword in content for keyword in engineer_keywords):
-                return "Web・オープン系 プロジェクトマネージャー【PM】、リーダー【PL】"
-            elif any(keyword in content for keyword in ["web"]):
-                return "Webプロデューサー、Webディレクター、Webマスター、Web企画、Webプランナー"
-            else:
-                return "管理職【その他】"
-        
-        # 営業系（技術系キーワードがない場合のみ）
-        sales_keywords = ["営業", "セールス", "法人営業", "個人営業"]
-        all_tech_keywords = engineer_strong_keywords + tech_languages + tech_keywords + designer_keywords
-        
-        has_sales = any(keyword in content for keyword in sales_keywords)
-        has_any_tech = any(keyword in content for keyword in all_tech_keywords)
-        
-        # 営業キーワードがあっても技術系キーワードがある場合は営業系を選択しない
-        if has_sales and not has_any_tech:
-            return "企画営業【法人営業・個人営業】"
-        
-        # デフォルト
-        return "その他営業関連職"
+        return keyword_based_classification(source_value)
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析済み入力のキャッシュ（Feather/Parquet）
+同じ求人マスタで何度も変換する場合に、pd.read_csvの解析結果（変換に使う列のみ）を保存しておき、
+次回以降はメモリマップで読み込んでCSVの解析を省く
+
+キャッシュのキーは入力ファイルのサイズ・内容のハッシュ・読み込む列。
+pyarrowが必要（未インストールの場合は通常どおりCSVを読み込む）。
+"""
+
+import glob
+import hashlib
+import logging
+import os
+
+try:
+    import pyarrow.feather as feather
+    import pyarrow.parquet as parquet
+except ImportError:
+    feather = None
+    parquet = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".jobins_input_cache"
+DEFAULT_CACHE_FORMAT = "feather"
+CACHE_FORMATS = ("feather", "parquet")
+
+# ハッシュ計算時の読み込み単位
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    """ファイル内容のハッシュ（16進）"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def columns_digest(columns):
+    """読み込む列の組み合わせのハッシュ（16進）"""
+    digest = hashlib.blake2b(digest_size=4)
+    for column in sorted(columns):
+        digest.update(column.encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+class InputCache:
+    """解析済み入力のキャッシュ"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, cache_format=DEFAULT_CACHE_FORMAT):
+        if cache_format not in CACHE_FORMATS:
+            raise ValueError(f"不明なキャッシュ形式です: {cache_format}（{'/'.join(CACHE_FORMATS)}）")
+        self.cache_dir = cache_dir
+        self.cache_format = cache_format
+        self.available = feather is not None
+        if not self.available:
+            logger.warning("pyarrowがインストールされていないため、入力キャッシュを使用しません")
+
+    def _cache_path(self, input_path, columns):
+        stem = os.path.splitext(os.path.basename(str(input_path)))[0]
+        size = os.path.getsize(input_path)
+        key = f"{size}_{file_digest(input_path)}_{columns_digest(columns)}"
+        return os.path.join(self.cache_dir, f"{stem}_{key}.{self.cache_format}")
+
+    def _read(self, path):
+        # Featherは非圧縮で保存しているのでメモリマップでそのまま読める
+        if self.cache_format == "feather":
+            table = feather.read_table(path, memory_map=True)
+        else:
+            table = parquet.read_table(path, memory_map=True)
+        return table.to_pandas()
+
+    def _write(self, df, path):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = path + ".tmp"
+        if self.cache_format == "feather":
+            df.to_feather(temp_path, compression='uncompressed')
+        else:
+            df.to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
+
+    def _remove_stale(self, input_path, current_path):
+        """同じ入力ファイル・同じ列の古いキャッシュ（入力の内容が変わる前のもの）を削除"""
+        stem = os.path.splitext(os.path.basename(str(input_path)))[0]
+        pattern = os.path.join(glob.escape(self.cache_dir), f"{glob.escape(stem)}_*.{self.cache_format}")
+        columns_key = os.path.basename(current_path).rsplit("_", 1)[-1]
+        for path in glob.glob(pattern):
+            # {stem}_{サイズ}_{ハッシュ}_{列}.{形式} のうち、列が同じで内容が異なるもの
+            key = os.path.basename(path)[len(stem) + 1:]
+            if path != current_path and key.count("_") == 2 and key.endswith("_" + columns_key):
+                os.remove(path)
+
+    def read_csv(self, input_path, columns, read_csv):
+        """
+        キャッシュがあれば読み込み、なければread_csvで解析してキャッシュに保存
+
+        Args:
+            input_path (str): 入力CSVファイルパス
+            columns (set): 読み込む列
+            read_csv (callable): キャッシュがない場合にCSVを解析する関数
+
+        Returns:
+            DataFrame: 解析済みの入力
+        """
+        if not self.available:
+            return read_csv()
+
+        path = self._cache_path(input_path, columns)
+        if os.path.exists(path):
+            try:
+                df = self._read(path)
+                logger.info(f"入力キャッシュを使用: {path}")
+                return df
+            except Exception as e:
+                logger.warning(f"入力キャッシュの読み込みに失敗、CSVを読み込みます: {e}")
+
+        df = read_csv()
+        try:
+            self._write(df, path)
+            self._remove_stale(input_path, path)
+            logger.info(f"入力キャッシュを保存: {path}")
+        except Exception as e:
+            logger.warning(f"入力キャッシュの保存に失敗: {e}")
+        return df
+
+
+def create_input_cache(processing_rules):
+    """YAMLのprocessing_rulesの設定で入力キャッシュを作成"""
+    return InputCache(
+        cache_dir=processing_rules.get('input_cache_dir', DEFAULT_CACHE_DIR),
+        cache_format=processing_rules.get('input_cache_format', DEFAULT_CACHE_FORMAT),
+    )
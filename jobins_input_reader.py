@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+入力CSVを開く共通処理
+パスが「-」の場合は標準入力から読み込む（パイプラインでの利用）
+.gz / .zst のファイルは展開しながら読み込む（BOMの判定は展開後のテキストに対して行う）
+
+文字コードは先頭のブロックから判定する（BOM付き・BOMなしのUTF-8、ExcelのCSV出力のCP932（Shift_JIS））。
+判定したブロックはそのまま読み込みに使い、以降も読みながら変換するため、ファイル全体の事前変換は行わない。
+先頭のブロックがASCIIのみの場合はどちらの文字コードとも解釈できるため、最初に非ASCIIのバイトが
+現れた時点でそこから先のブロックで判定する（ASCIIの部分はどちらでも同じ文字になる）。
+"""
+
+import codecs
+import io
+import logging
+import sys
+
+from jobins_compression import open_binary
+
+logger = logging.getLogger(__name__)
+
+# 標準入力・標準出力を表すパス
+STDIO_PATH = "-"
+
+# 文字コードの判定に使う先頭のバイト数
+SNIFF_BYTES = 64 * 1024
+# 判定する文字コード（先に解釈できたものを使う）
+CANDIDATE_ENCODINGS = ('utf-8-sig', 'cp932')
+ENCODING_LABELS = {'utf-8-sig': 'UTF-8', 'cp932': 'CP932（Shift_JIS）'}
+# 行単位でエラー行に隔離する場合でも、先頭のブロックにこれより多く解釈できないバイトがあれば
+# 対応していない文字コードとみなして中止する
+MAX_SNIFF_ERRORS = 8
+
+
+class InputEncodingError(ValueError):
+    """入力CSVの文字コードを解釈できない"""
+
+
+def is_stdio(path):
+    """パスが標準入力・標準出力（「-」）か判定"""
+    return str(path) == STDIO_PATH
+
+
+def _undecodable_count(head, encoding, final):
+    """headをencodingで解釈できないバイト数（ブロック末尾の途中の文字は数えない）"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors='surrogateescape')
+    text = decoder.decode(head, final=final)
+    return sum(1 for char in text if '\udc80' <= char <= '\udcff')
+
+
+def sniff_encoding(head, final=False, errors='strict', max_errors=MAX_SNIFF_ERRORS):
+    """
+    先頭のブロックから入力の文字コードを判定
+
+    Args:
+        head (bytes): 先頭のブロック
+        final (bool): headがファイル全体の場合True
+        errors (str): open_inputのerrors（'strict'の場合は解釈できないバイトがあれば中止する）
+        max_errors (int): 'strict'以外でも中止する解釈できないバイト数（Noneは中止しない）
+
+    Returns:
+        str: 'utf-8-sig' または 'cp932'
+
+    Raises:
+        InputEncodingError: どの文字コードでも解釈できない場合
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    counts = {}
+    for encoding in CANDIDATE_ENCODINGS:
+        counts[encoding] = _undecodable_count(head, encoding, final)
+        if counts[encoding] == 0:
+            return encoding
+    encoding = min(CANDIDATE_ENCODINGS, key=lambda candidate: counts[candidate])
+    if errors == 'strict' or (max_errors is not None and counts[encoding] > max_errors):
+        tried = "・".join(ENCODING_LABELS[candidate] for candidate in CANDIDATE_ENCODINGS)
+        raise InputEncodingError(f"入力CSVの文字コードを判定できません（{tried} のいずれでも先頭 {len(head)} バイトに"
+                                 f"解釈できないバイトがあります）。UTF-8 または CP932 で保存し直してください")
+    logger.warning(f"入力CSVの先頭に解釈できないバイトが {counts[encoding]} 件あります"
+                   f"（{ENCODING_LABELS[encoding]} として読み込み、該当行はエラー行に隔離します）")
+    return encoding
+
+
+def _is_ambiguous(head, final):
+    """先頭のブロックがASCIIのみで、続きがあるため文字コードを判定できないか"""
+    return not final and head.isascii()
+
+
+class _SniffedStream(io.RawIOBase):
+    """文字コードの判定に読んだ先頭のブロックを戻したバイトストリーム"""
+
+    def __init__(self, head, stream, close_stream=True):
+        self._head = memoryview(head)
+        self._stream = stream
+        self._close_stream = close_stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._head:
+            size = min(len(buffer), len(self._head))
+            buffer[:size] = self._head[:size]
+            self._head = self._head[size:]
+            return size
+        # パイプから読む場合に要求したサイズが埋まるまで待たないよう、読める分だけ読む
+        readinto1 = getattr(self._stream, 'readinto1', None)
+        if readinto1 is not None:
+            return readinto1(buffer)
+        return self._stream.readinto(buffer)
+
+    def close(self):
+        if not self.closed and self._close_stream:
+            self._stream.close()
+        super().close()
+
+
+class _DeferredStream(io.RawIOBase):
+    """
+    文字コードの判定を最初の非ASCIIのバイトまで遅らせ、UTF-8に変換して返すバイトストリーム
+
+    ASCIIの部分はそのまま返し、非ASCIIのバイトが現れたらそこから先のブロックで文字コードを判定して、
+    以降はUTF-8に変換する（解釈できないバイトはsurrogateescapeで元のバイトに戻し、読み込み側のerrorsで扱う）。
+    """
+
+    def __init__(self, head, stream, errors='strict', close_stream=True):
+        self._pending = bytes(head)
+        self._stream = stream
+        self._errors = errors
+        self._close_stream = close_stream
+        self._decoder = None
+        self._output = b""
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _read_chunk(self):
+        read1 = getattr(self._stream, 'read1', None)
+        return read1(SNIFF_BYTES) if read1 is not None else self._stream.read(SNIFF_BYTES)
+
+    def _transcode(self, data, final=False):
+        text = self._decoder.decode(data, final=final)
+        return text.encode('utf-8', errors='surrogateescape')
+
+    def _fill(self):
+        data, self._pending = self._pending, b""
+        if not data:
+            data = self._read_chunk()
+        if not data:
+            self._eof = True
+            if self._decoder is not None:
+                self._output += self._transcode(b"", final=True)
+            return
+        if self._decoder is not None:
+            self._output += self._transcode(data)
+            return
+        if data.isascii():
+            self._output += data
+            return
+        # 最初の非ASCIIのバイトから先のブロックで文字コードを判定
+        position = next(i for i, byte in enumerate(data) if byte >= 0x80)
+        self._output += data[:position]
+        rest, final = _read_head(self._stream, data[position:])
+        # 途中まで読み進めているため、行単位で隔離する場合は解釈できないバイトが多くても中止しない
+        encoding = sniff_encoding(rest, final, self._errors, max_errors=None)
+        _log_encoding(encoding)
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors='surrogateescape')
+        self._output += self._transcode(rest)
+
+    def readinto(self, buffer):
+        while not self._output and not self._eof:
+            self._fill()
+        size = min(len(buffer), len(self._output))
+        buffer[:size] = self._output[:size]
+        self._output = self._output[size:]
+        return size
+
+    def close(self):
+        if not self.closed and self._close_stream:
+            self._stream.close()
+        super().close()
+
+
+def _read_head(stream, head=b""):
+    """先頭のブロックを読む（短く返すストリームでもSNIFF_BYTESかファイル末尾まで読む、headは読み込み済みの先頭）"""
+    chunks = [head]
+    size = len(head)
+    while size < SNIFF_BYTES:
+        chunk = stream.read(SNIFF_BYTES - size)
+        if not chunk:
+            return b"".join(chunks), True
+        chunks.append(chunk)
+        size += len(chunk)
+    return b"".join(chunks), False
+
+
+def detect_input_encoding(path):
+    """
+    入力CSVの文字コードを先頭のブロックから判定（pandasのread_csvに渡す用）
+
+    Returns:
+        str: 'utf-8-sig' または 'cp932'（先頭のブロックがASCIIのみで判定できない場合はNone。
+            open_inputで開いたストリームを読めば、非ASCIIのバイトが現れた時点で判定される）
+
+    Raises:
+        InputEncodingError: 文字コードを解釈できない場合
+    """
+    with open_binary(path, 'rb') as stream:
+        head, final = _read_head(stream)
+    if _is_ambiguous(head, final):
+        return None
+    encoding = sniff_encoding(head, final)
+    _log_encoding(encoding)
+    return encoding
+
+
+def _log_encoding(encoding):
+    if encoding != 'utf-8-sig':
+        logger.info(f"入力CSVの文字コード: {ENCODING_LABELS[encoding]}（UTF-8に変換しながら読み込みます）")
+
+
+def open_input(path, errors='strict'):
+    """
+    入力CSVをテキストとして開く（文字コードは先頭のブロックから判定、csvモジュール用に改行は変換しない）
+
+    Args:
+        path (str): 入力CSVファイルパス（「-」は標準入力、.gz / .zst は展開しながら読み込む）
+        errors (str): 解釈できないバイトの扱い（行単位でエラー行に隔離する場合は'surrogateescape'）
+
+    Raises:
+        InputEncodingError: 文字コードを解釈できない場合（読み込みやAPI呼び出しの前に中止する）
+    """
+    if is_stdio(path):
+        # 標準入力自体は閉じない
+        stream, close_stream = sys.stdin.buffer, False
+    else:
+        stream, close_stream = open_binary(path, 'rb'), True
+    try:
+        head, final = _read_head(stream)
+        if _is_ambiguous(head, final):
+            # 最初の非ASCIIのバイトで判定し、UTF-8に変換しながら読む
+            raw = _DeferredStream(head, stream, errors, close_stream)
+            return io.TextIOWrapper(io.BufferedReader(raw), encoding='utf-8', errors=errors, newline='')
+        encoding = sniff_encoding(head, final, errors)
+    except Exception:
+        if close_stream:
+            stream.close()
+        raise
+    _log_encoding(encoding)
+    raw = _SniffedStream(head, stream, close_stream)
+    return io.TextIOWrapper(io.BufferedReader(raw), encoding=encoding, errors=errors, newline='')
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ローカル（APIを使わない）職種分類
+キーワードルールによる職種分類（中分類）の判定と、確信度付きの判定（APIを呼ぶかどうかの判断に使用）
+
+確信度のしきい値ごとの判定率とAPI分類との一致率は次のコマンドで確認できる:
+    python jobins_local_classifier.py report --threshold 0.8
+"""
+
+import argparse
+import logging
+import re
+import threading
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# 職種分類（中分類）名をキーワードに分解する区切り
+CATEGORY_TERM_SEPARATORS = re.compile(r'[、・/／【】（）()\[\]\s]+')
+MIN_TERM_LENGTH = 2
+
+# キーワードルール（事前判定・キーワード分類）の判定に加える重み
+PRE_FILTER_WEIGHT = 6.0
+KEYWORD_RULE_WEIGHT = 3.0
+# 根拠が少ない場合に確信度を下げるための定数（どの分類でもない可能性の重み）
+UNKNOWN_WEIGHT = 2.0
+# キーワード分類で根拠がない場合の既定値（確信度の根拠にしない）
+DEFAULT_KEYWORD_LABEL = "その他営業関連職"
+
+# 確信度の較正に使うビン数と最大サンプル数
+CALIBRATION_BINS = 10
+CALIBRATION_SAMPLE_SIZE = 2000
+
+# レポートで確認するしきい値
+REPORT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95)
+
+
+def pre_filter_technical_jobs(source_value):
+    """技術系職種の事前フィルタリング（営業系誤分類防止）"""
+    if not source_value:
+        return None
+
+    content = source_value.lower()
+
+    # 技術系の強力なシグナル
+    engineer_keywords = ["エンジニア", "開発", "プログラマー", "se", "pg"]
+    tech_languages = ["java", "php", "python", "javascript", "react", "vue", "angular", "go", "ruby", "c++", "c#", "swift", "kotlin"]
+    tech_tools = ["docker", "kubernetes", "aws", "azure", "gcp", "git", "github"]
+
+    has_engineer = any(keyword in content for keyword in engineer_keywords)
+    has_language = any(keyword in content for keyword in tech_languages)
+    has_tools = any(keyword in content for keyword in tech_tools)
+
+    # エンジニア + プログラミング言語 = 絶対的技術職
+    if has_engineer and (has_language or has_tools):
+        if any(keyword in content for keyword in ["バックエンド", "backend", "サーバー", "api"]):
+            return "Web・オープン系 SE【アプリケーション設計】"
+        elif any(keyword in content for keyword in ["フロントエンド", "frontend", "react", "vue"]):
+            return "Webデザイナー、フロントエンドエンジニア、コーダー、フラッシャー"
+        elif any(keyword in content for keyword in ["インフラ", "サーバー", "ネットワーク", "aws", "azure"]):
+            return "サーバ設計・サーバ構築"
+        else:
+            return "Web・オープン系 プログラマ【PG】"
+
+    # デザイナー系の事前フィルタリング
+    designer_keywords = ["デザイナー", "ui", "ux"]
+    if any(keyword in content for keyword in designer_keywords):
+        if any(keyword in content for keyword in ["ui", "ux"]):
+            return "情報アーキテクト、UI/UXデザイナー"
+        elif "web" in content:
+            return "Webデザイナー、フロントエンドエンジニア、コーダー、フラッシャー"
+        else:
+            return "グラフィックデザイナー"
+
+    return None  # 事前フィルタリング該当なし
+
+
+def keyword_based_classification(source_value):
+    """キーワードベースでの職種分類（GPT API未設定時のフォールバック）"""
+    if not source_value:
+        return "その他営業関連職"
+
+    content = source_value.lower()
+
+    # エンジニア系（強力な優先判定）
+    engineer_keywords = ["エンジニア", "開発", "プログラマー", "se", "pg"]
+    engineer_strong_keywords = engineer_keywords
+    tech_languages = ["java", "php", "python", "javascript", "react", "vue", "angular", "go", "ruby", "c++", "c#"]
+    tech_keywords = [
+        "プログラム", "コーディング", "プログラミング", "バックエンド", "フロントエンド",
+        "サーバー", "インフラ", "ネットワーク", "データベース", "mysql", "sql", "api"
+    ]
+
+    # 技術系キーワード + プログラミング言語の組み合わせで絶対的にエンジニア判定
+    has_engineer_keyword = any(keyword in content for keyword in engineer_strong_keywords)
+    has_tech_language = any(keyword in content for keyword in tech_languages)
+    has_tech_keyword = any(keyword in content for keyword in tech_keywords)
+
+    if has_engineer_keyword and (has_tech_language or has_tech_keyword):
+        if any(keyword in content for keyword in ["バックエンド", "サーバー", "api", "java", "php", "python"]):
+            return "Web・オープン系 SE【アプリケーション設計】"
+        elif any(keyword in content for keyword in ["フロントエンド", "react", "vue", "angular", "javascript"]):
+            return "Webデザイナー、フロントエンドエンジニア、コーダー、フラッシャー"
+        elif any(keyword in content for keyword in ["インフラ", "サーバー", "ネットワーク"]):
+            return "サーバ設計・サーバ構築"
+        else:
+            return "Web・オープン系 プログラマ【PG】"
+
+    # デザイナー系
+    designer_keywords = [
+        "デザイナー", "デザイン", "ui", "ux", "グラフィック", "webデザイン",
+        "figma", "photoshop", "illustrator", "アートディレクター"
+    ]
+    if any(keyword in content for keyword in designer_keywords):
+        if any(keyword in content for keyword in ["ui", "ux", "webデザイン"]):
+            return "情報アーキテクト、UI/UXデザイナー"
+        elif any(keyword in content for keyword in ["web"]):
+            return "Webデザイナー、フロントエンドエンジニア、コーダー、フラッシャー"
+        else:
+            return "グラフィックデザイナー"
+
+    # マーケティング系
+    marketing_keywords = [
+        "マーケティング", "企画", "広告", "宣伝", "プロモーション", "商品企画",
+        "事業企画", "経営企画", "webマーケティング", "デジタルマーケティング"
+    ]
+    if any(keyword in content for keyword in marketing_keywords):
+        if "経営" in content:
+            return "経営企画"
+        elif any(keyword in content for keyword in ["web", "デジタル"]):
+            return "Webマーケティング、デジタルマーケティング"
+        elif "商品" in content:
+            return "商品企画、商品開発"
+        else:
+            return "販促企画、営業企画"
+
+    # 人事・採用系
+    hr_keywords = [
+        "人事", "採用", "hr", "リクルート", "キャリアアドバイザー", "キャリアコンサルタント"
+    ]
+    if any(keyword in content for keyword in hr_keywords):
+        if any(keyword in content for keyword in ["キャリア", "アドバイザー", "コンサルタント"]):
+            return "キャリアカウンセラー、キャリアコンサルタント、人材派遣コーディネーター"
+        else:
+            return "人事、給与、労務、採用"
+
+    # ディレクター系（エンジニアやデザイナーが誤分類されやすい）
+    director_keywords = ["ディレクター", "プロデューサー", "pm", "プロジェクトマネージャー"]
+    if any(keyword in content for keyword in director_keywords):
+        if any(keyword in content for keyword in engineer_keywords):
+            return "Web・オープン系 プロジェクトマネージャー【PM】、リーダー【PL】"
+        elif any(keyword in content for keyword in ["web"]):
+            return "Webプロデューサー、Webディレクター、Webマスター、Web企画、Webプランナー"
+        else:
+            return "管理職【その他】"
+
+    # 営業系（技術系キーワードがない場合のみ）
+    sales_keywords = ["営業", "セールス", "法人営業", "個人営業"]
+    all_tech_keywords = engineer_strong_keywords + tech_languages + tech_keywords + designer_keywords
+
+    has_sales = any(keyword in content for keyword in sales_keywords)
+    has_any_tech = any(keyword in content for keyword in all_tech_keywords)
+
+    # 営業キーワードがあっても技術系キーワードがある場合は営業系を選択しない
+    if has_sales and not has_any_tech:
+        return "企画営業【法人営業・個人営業】"
+
+    # デフォルト
+    return "その他営業関連職"
+
+
+def _normalize(text):
+    return unicodedata.normalize('NFKC', str(text)).lower()
+
+
+class LocalClassifier:
+    """
+    確信度付きのローカル職種分類
+
+    職種分類テーブルの全ての中分類名を分解したキーワードと、既存のキーワードルールの判定を根拠として
+    分類ごとにスコアを付け、(最高スコア) / (全分類のスコア合計 + UNKNOWN_WEIGHT) を確信度とする。
+    API分類の結果（職種分類キャッシュ）で較正すると、確信度は同じ確信度帯の判定がAPI分類と一致した割合になる。
+    """
+
+    def __init__(self, job_categories, threshold=None):
+        """
+        初期化
+
+        Args:
+            job_categories (list): 職種分類テーブル（(大分類, 中分類, Notion紐づけ) のリスト）
+            threshold (float): この確信度以上の場合はAPIを呼ばずにローカルの判定を使う（Noneは使わない）
+        """
+        self.valid_labels = {category[1] for category in job_categories}
+        self.threshold = threshold
+        self.calibration = None
+
+        # キーワード → そのキーワードを名前に含む分類（ASCIIのキーワードは単語単位で照合）
+        terms = {}
+        for label in self.valid_labels:
+            for term in CATEGORY_TERM_SEPARATORS.split(_normalize(label)):
+                if len(term) >= MIN_TERM_LENGTH:
+                    terms.setdefault(term, set()).add(label)
+        self._terms = [
+            (term, labels, re.compile(rf'(?<![a-z]){re.escape(term)}(?![a-z])') if term.isascii() else None)
+            for term, labels in sorted(terms.items())
+        ]
+
+        self.local_count = 0
+        self.remote_count = 0
+        self._lock = threading.Lock()
+
+    def scores(self, title):
+        """タイトルに対する分類ごとのスコア"""
+        content = _normalize(title)
+        scores = {}
+        for term, labels, pattern in self._terms:
+            if (pattern.search(content) if pattern is not None else term in content):
+                # 複数の分類に共通するキーワードは弱い根拠として分配
+                weight = len(term) / len(labels)
+                for label in labels:
+                    scores[label] = scores.get(label, 0.0) + weight
+
+        pre_filtered = pre_filter_technical_jobs(title)
+        if pre_filtered in self.valid_labels:
+            scores[pre_filtered] = scores.get(pre_filtered, 0.0) + PRE_FILTER_WEIGHT
+        else:
+            keyword_label = keyword_based_classification(title)
+            if keyword_label != DEFAULT_KEYWORD_LABEL and keyword_label in self.valid_labels:
+                scores[keyword_label] = scores.get(keyword_label, 0.0) + KEYWORD_RULE_WEIGHT
+        return scores
+
+    def raw_confidence(self, title):
+        """
+        較正前の判定
+
+        Returns:
+            tuple: (分類, 確信度)。根拠がない場合は (None, 0.0)
+        """
+        scores = self.scores(title)
+        if not scores:
+            return None, 0.0
+        label = max(scores, key=lambda key: (scores[key], key))
+        return label, scores[label] / (sum(scores.values()) + UNKNOWN_WEIGHT)
+
+    def classify(self, title):
+        """
+        確信度付きで判定
+
+        Returns:
+            tuple: (分類, 確信度)。根拠がない場合は (None, 0.0)
+        """
+        label, confidence = self.raw_confidence(title)
+        if label is None or self.calibration is None:
+            return label, confidence
+        return label, self.calibration[min(int(confidence * CALIBRATION_BINS), CALIBRATION_BINS - 1)]
+
+    def calibrate(self, labeled_titles):
+        """
+        (タイトル, 正解の分類) のサンプルで確信度を較正
+
+        較正前の確信度のビンごとに一致率を求め、確信度が高いほど一致率が下がらないよう隣接するビンを統合する。
+
+        Returns:
+            int: 較正に使ったサンプル数
+        """
+        bins = [[0, 0] for _ in range(CALIBRATION_BINS)]
+        used = 0
+        for title, expected in labeled_titles:
+            if expected not in self.valid_labels:
+                continue
+            label, confidence = self.raw_confidence(title)
+            if label is None:
+                continue
+            index = min(int(confidence * CALIBRATION_BINS), CALIBRATION_BINS - 1)
+            bins[index][0] += label == expected
+            bins[index][1] += 1
+            used += 1
+        if not used:
+            return 0
+
+        # ビンごとの一致率（件数が少ないビンは0.5に寄せる）を単調非減少に統合（PAV）
+        blocks = []
+        for correct, total in bins:
+            blocks.append([correct + 1, total + 2, 1])
+            while len(blocks) > 1 and blocks[-2][0] / blocks[-2][1] > blocks[-1][0] / blocks[-1][1]:
+                correct, total, width = blocks.pop()
+                blocks[-1][0] += correct
+                blocks[-1][1] += total
+                blocks[-1][2] += width
+        self.calibration = [correct / total for correct, total, width in blocks for _ in range(width)]
+        return used
+
+    def resolve(self, title, job_options):
+        """
+        確信度がしきい値以上で、選択肢に含まれる場合はローカルの判定を返す
+
+        Returns:
+            str: ローカルで判定した分類（APIで分類すべき場合はNone）
+        """
+        label, confidence = self.classify(title)
+        local = (
+            self.threshold is not None and label is not None
+            and confidence >= self.threshold and label in job_options
+        )
+        with self._lock:
+            if local:
+                self.local_count += 1
+            else:
+                self.remote_count += 1
+        if local:
+            logger.debug(f"ローカル分類（確信度 {confidence:.2f}）: {title} → {label}")
+            return label
+        return None
+
+    def summary(self):
+        """ローカル判定とAPI分類の件数のサマリー文字列"""
+        total = self.local_count + self.remote_count
+        share = self.local_count / total if total else 0.0
+        return (f"ローカル分類: {self.local_count} 件, API分類: {self.remote_count} 件 "
+                f"(ローカル {share:.1%}, しきい値: {self.threshold})")
+
+
+def create_local_classifier(job_categories, gpt_settings, labeled_titles=()):
+    """
+    gpt_settingsのlocal_confidence_thresholdが設定されていれば、較正したローカル分類を作成
+
+    Args:
+        labeled_titles (iterable): 較正に使う (タイトル, API分類) のサンプル（職種分類キャッシュのうちAPIで分類したもの）
+
+    Returns:
+        LocalClassifier（しきい値が未設定の場合はNone）
+    """
+    threshold = (gpt_settings or {}).get('local_confidence_threshold')
+    if threshold is None:
+        return None
+    classifier = LocalClassifier(job_categories, threshold=float(threshold))
+    samples = list(labeled_titles)[-CALIBRATION_SAMPLE_SIZE:]
+    used = classifier.calibrate(samples)
+    if used:
+        logger.info(f"ローカル分類の確信度を較正: {used} 件")
+    else:
+        logger.warning("較正に使える分類済みのタイトルがないため、ローカル分類の確信度は較正前の値を使用")
+    return classifier
+
+
+def evaluate(classifier, labeled_titles, thresholds=REPORT_THRESHOLDS):
+    """
+    ラベル付きサンプルでしきい値ごとのローカル判定率とAPI分類との一致率を評価
+
+    Returns:
+        list: (しきい値, ローカル判定数, ローカル判定のうち一致した数) のリスト
+    """
+    judged = [classifier.classify(title) + (expected,) for title, expected in labeled_titles]
+    results = []
+    for threshold in thresholds:
+        local = [(label, expected) for label, confidence, expected in judged
+                 if label is not None and confidence >= threshold]
+        results.append((threshold, len(local), sum(1 for label, expected in local if label == expected)))
+    return results
+
+
+def main():
+    """ローカル分類のレポート（職種分類キャッシュのAPI分類をラベルとして評価）"""
+    parser = argparse.ArgumentParser(description='確信度付きローカル職種分類のレポート')
+    parser.add_argument('command', choices=['report'])
+    parser.add_argument('-c', '--config', default='jobins_yaml_mapping.yaml', help='YAMLマッピング設定ファイル')
+    parser.add_argument('--cache', help='ラベルに使う職種分類キャッシュファイル（YAMLの設定より優先）')
+    parser.add_argument('--threshold', type=float, help='確認するしきい値（YAMLのlocal_confidence_thresholdより優先）')
+    parser.add_argument('--holdout', type=float, default=0.5,
+                        help='評価に使う割合（残りで較正、default: 0.5）')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from jobins_classification_cache import _create_converter, api_labels, cache_file_path, read_cache_file
+    converter = _create_converter('csv', args.config)
+    cache_path = args.cache or cache_file_path(converter.processing_rules)
+    valid_labels = {category[1] for category in converter.JOB_CATEGORIES}
+    labeled = [(title, label) for title, label in api_labels(read_cache_file(cache_path)) if label in valid_labels]
+    if not labeled:
+        print(f"ラベルに使える分類済みのタイトルがありません: {cache_path}")
+        return 1
+
+    # 較正と評価に同じタイトルを使わないよう分割（キャッシュの古い順に並んでいるので交互に振り分け）
+    step = max(2, round(1 / max(min(args.holdout, 0.9), 0.1)))
+    evaluation = labeled[::step]
+    calibration = [item for i, item in enumerate(labeled) if i % step]
+    threshold = args.threshold
+    if threshold is None:
+        threshold = converter.gpt_classifier.settings.get('local_confidence_threshold')
+    classifier = LocalClassifier(converter.JOB_CATEGORIES, threshold=threshold)
+    classifier.calibrate(calibration)
+
+    thresholds = sorted(set(REPORT_THRESHOLDS) | ({threshold} if threshold is not None else set()))
+    print(f"ラベル: {cache_path}（較正: {len(calibration)} 件, 評価: {len(evaluation)} 件）")
+    (_, judged, agreed), = evaluate(classifier, evaluation, thresholds=(0.0,))
+    print(f"しきい値なしの一致率: {agreed / len(evaluation):.1%}（根拠なし: {len(evaluation) - judged} 件）")
+    print(f"{'しきい値':>8} {'ローカル判定':>12} {'API分類':>10} {'一致率':>8}")
+    for value, local, agreed in evaluate(classifier, evaluation, thresholds):
+        marker = " ←設定値" if value == threshold else ""
+        agreement = f"{agreed / local:.1%}" if local else "-"
+        print(f"{value:>10.2f} {local / len(evaluation):>14.1%} {1 - local / len(evaluation):>12.1%} "
+              f"{agreement:>10}{marker}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
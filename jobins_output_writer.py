@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+変換結果の出力ライター
+出力ファイルの拡張子に応じてCSV（BOM付きUTF-8）またはXLSX（JOBINS用書式）で書き込む
+CSVは拡張子が .gz / .zst の場合に圧縮しながら書き込む（BOMは圧縮前のテキストの先頭に付く）
+"""
+
+import csv
+import io
+import logging
+import os
+import sys
+from copy import copy
+from datetime import datetime
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.worksheet.dimensions import ColumnDimension, RowDimension
+
+from jobins_compression import open_binary
+
+logger = logging.getLogger(__name__)
+
+# Excelのシート名の最大文字数
+MAX_SHEET_TITLE_LENGTH = 31
+
+
+class CsvOutputWriter:
+    """CSV出力ライター（BOM付きUTF-8、パスが「-」の場合は標準出力に1行ずつ書き出す、.gz / .zst は圧縮）"""
+
+    def __init__(self, output_path, columns):
+        self.output_path = output_path
+        self.to_stdout = str(output_path) == "-"
+        if self.to_stdout:
+            # パイプの後段がすぐに処理できるよう1行ごとにフラッシュする
+            self._file = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8-sig', newline='')
+        else:
+            self._file = io.TextIOWrapper(open_binary(output_path, 'wb'), encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._file)
+        self.writerow(columns)
+
+    def writerow(self, row):
+        self._writer.writerow(row)
+        if self.to_stdout:
+            self._file.flush()
+
+    def write_frame(self, df):
+        """データフレームの行をまとめて書き込み（pandas版の分割処理用、ヘッダーは書き込まない）"""
+        df.to_csv(self._file, header=False, index=False, lineterminator='\r\n')
+        if self.to_stdout:
+            self._file.flush()
+
+    def close(self):
+        if self.to_stdout:
+            # 標準出力自体は閉じない
+            self._file.flush()
+            self._file.detach()
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class XlsxTemplateWriter:
+    """
+    XLSX出力ライター
+
+    JOBINS用書式（テンプレート）のシートをコピーし、そのシートにデータ行を書き込む。
+    write-onlyモードで1行ずつ書き出すため、ライター自体のメモリ使用量は行数によらず一定
+    （pandas版の通常の変換では、書き込む前に出力のデータフレーム全体がメモリ上にある）。
+
+    テンプレートシートからは、ヘッダー行までのセル（値・書式・行の高さ・結合セル）、列幅、
+    ウィンドウ枠の固定、入力規則（プルダウン）をコピーする。入力規則の範囲はテンプレートのままで、
+    範囲より下の行には付かない。条件付き書式・画像・コメント・印刷設定と、
+    その他のシート（値のみコピー）の書式・列幅はコピーしない。
+    """
+
+    def __init__(self, output_path, columns, template_path=None, sheet_name=None, sheet_prefix="JOBINS掲載用"):
+        """
+        初期化
+
+        Args:
+            output_path (str): 出力XLSXファイルパス
+            columns (list): 出力カラム名
+            template_path (str): JOBINS用書式のXLSXファイルパス（なければヘッダーのみのシートを作成）
+            sheet_name (str): コピー元のテンプレートシート名
+            sheet_prefix (str): コピーしたシートの名前の接頭辞
+        """
+        self.output_path = output_path
+        self.workbook = Workbook(write_only=True)
+        self._template = None
+        self._template_sheet_name = sheet_name
+
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        title = f"{sheet_prefix}_{timestamp}"[:MAX_SHEET_TITLE_LENGTH]
+        self.sheet = self.workbook.create_sheet(title=title)
+
+        if template_path and os.path.exists(template_path):
+            # 列幅・入力規則・結合セルは読み込み専用モードでは読めないため、通常モードで読み込む（書式のみの小さなブック）
+            self._template = load_workbook(template_path)
+            if sheet_name in self._template.sheetnames:
+                template_sheet = self._template[sheet_name]
+                self._copy_template_layout(template_sheet)
+                header_rows = self._copy_template_header(template_sheet, columns)
+                self._copy_merged_cells(template_sheet, header_rows)
+            else:
+                logger.warning(f"テンプレートシートが見つかりません: {sheet_name}、ヘッダーのみのシートを作成します")
+                self.sheet.append(columns)
+        else:
+            if template_path:
+                logger.warning(f"テンプレートファイルが見つかりません: {template_path}、ヘッダーのみのシートを作成します")
+            self.sheet.append(columns)
+
+    def _copy_template_layout(self, template_sheet):
+        """
+        テンプレートシートの列幅・ウィンドウ枠の固定・入力規則をコピー
+
+        write-onlyのシートでは列幅とウィンドウ枠は先頭の行より前に書き出されるため、ヘッダーのコピーより先に設定する。
+        """
+        for key, dimension in template_sheet.column_dimensions.items():
+            self.sheet.column_dimensions[key] = ColumnDimension(
+                self.sheet, index=key, width=dimension.width, hidden=dimension.hidden,
+                outlineLevel=dimension.outlineLevel, min=dimension.min, max=dimension.max,
+            )
+        self.sheet.freeze_panes = template_sheet.freeze_panes
+        for validation in template_sheet.data_validations.dataValidation:
+            self.sheet.data_validations.append(copy(validation))
+
+    def _copy_merged_cells(self, template_sheet, header_rows):
+        """ヘッダー行までの結合セルをコピー（データ行にかかる結合はコピーしない）"""
+        for merged in template_sheet.merged_cells.ranges:
+            if merged.max_row <= header_rows:
+                self.sheet.merged_cells.add(merged.coord)
+
+    def _copy_template_header(self, template_sheet, columns):
+        """
+        テンプレートシートのヘッダー行まで（書式・行の高さ付き）をコピー
+
+        Returns:
+            int: コピーしたテンプレートの行数
+        """
+        header_found = False
+        header_rows = 0
+        for row_index, row in enumerate(template_sheet.iter_rows(), start=1):
+            values = [cell.value for cell in row]
+            dimension = template_sheet.row_dimensions.get(row_index)
+            if dimension is not None and (dimension.ht is not None or dimension.hidden):
+                self.sheet.row_dimensions[row_index] = RowDimension(
+                    self.sheet, index=row_index, ht=dimension.ht, hidden=dimension.hidden
+                )
+            self.sheet.append([self._copy_cell(cell) for cell in row])
+            header_rows = row_index
+            if columns and columns[0] in values:
+                header_found = True
+                template_columns = [str(value) for value in values if value is not None]
+                if template_columns != list(columns):
+                    logger.warning("テンプレートのヘッダーと出力カラムが一致しません")
+                break
+
+        if not header_found:
+            logger.warning("テンプレートシートにヘッダー行が見つかりません、出力カラムをヘッダーとして書き込みます")
+            self.sheet.append(columns)
+        return header_rows
+
+    def _copy_cell(self, cell):
+        """テンプレートのセルを書式付きの書き込み専用セルに変換"""
+        if getattr(cell, 'value', None) is None and not getattr(cell, 'has_style', False):
+            return None
+        new_cell = WriteOnlyCell(self.sheet, value=cell.value)
+        if cell.has_style:
+            new_cell.font = copy(cell.font)
+            new_cell.fill = copy(cell.fill)
+            new_cell.border = copy(cell.border)
+            new_cell.alignment = copy(cell.alignment)
+            new_cell.number_format = cell.number_format
+        return new_cell
+
+    def _copy_other_sheets(self):
+        """テンプレートのその他のシート（職種分類など）を値のみコピー（テンプレートシート自体はコピーしない）"""
+        for template_sheet in self._template.worksheets:
+            if template_sheet.title == self._template_sheet_name:
+                continue
+            sheet = self.workbook.create_sheet(title=template_sheet.title)
+            for values in template_sheet.iter_rows(values_only=True):
+                sheet.append(values)
+
+    def writerow(self, row):
+        # 空文字は空セルとして書き込む
+        self.sheet.append([None if value == "" else value for value in row])
+
+    def write_frame(self, df):
+        for row in df.itertuples(index=False, name=None):
+            self.writerow(row)
+
+    def close(self):
+        if self._template is not None:
+            self._copy_other_sheets()
+            self._template.close()
+        self.workbook.save(self.output_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_output_writer(output_path, columns, processing_rules=None):
+    """
+    出力先の拡張子に応じたライターを作成（ヘッダー行は書き込み済み）
+
+    Args:
+        output_path (str): 出力ファイルパス（.xlsxの場合はJOBINS用書式で出力）
+        columns (list): 出力カラム名
+        processing_rules (dict): YAMLのprocessing_rules
+
+    Returns:
+        CsvOutputWriter または XlsxTemplateWriter
+    """
+    if str(output_path).lower().endswith('.xlsx'):
+        processing_rules = processing_rules or {}
+        return XlsxTemplateWriter(
+            output_path,
+            columns,
+            template_path=processing_rules.get('template_file'),
+            sheet_name=processing_rules.get('sheet_name'),
+            sheet_prefix=processing_rules.get('output_sheet_copy_prefix', "JOBINS掲載用")
+        )
+    return CsvOutputWriter(output_path, columns)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+読み込み → 分類 → 変換・書き込み のパイプライン
+読み込みスレッドと分類ワーカー（複数）を上限付きのキューでつなぎ、
+結果は入力の順序に並べ直して呼び出し元（変換・書き込みステージ）に渡す。
+
+API呼び出しの待ち時間の間も読み込み・変換・書き込みが進み、
+処理中の行数はwindow行までに制限されるため、メモリ使用量は入力の大きさによらず一定。
+"""
+
+import queue
+import threading
+
+# 処理中（読み込み済みで未書き込み）の最大行数
+DEFAULT_PIPELINE_WINDOW = 64
+
+# 停止要求を確認する間隔（秒）
+STOP_POLL_INTERVAL = 0.1
+
+# ワーカーの終了を表す印
+_DONE = object()
+
+
+class OrderedPipeline:
+    """入力の順序を保ったまま、各要素の処理を複数のワーカーで並行に行うパイプライン"""
+
+    def __init__(self, workers=1, window=DEFAULT_PIPELINE_WINDOW):
+        """
+        初期化
+
+        Args:
+            workers (int): 分類ワーカー数（gpt_settingsのconcurrency）
+            window (int): 処理中の最大要素数（ワーカー数より小さい場合はワーカー数）
+        """
+        self.workers = max(1, int(workers))
+        self.window = max(self.workers, int(window))
+
+    def run(self, items, func):
+        """
+        itemsを読み込みスレッドで順に取り出し、ワーカーでfunc(item)を実行
+
+        Args:
+            items (iterable): 入力（読み込みスレッドで反復する）
+            func (callable): ワーカーで実行する処理
+
+        Yields:
+            tuple: (item, func(item)) を入力の順序で
+
+        Raises:
+            読み込み・ワーカーで発生した例外（それより前の要素を渡し終えてから送出）
+        """
+        stop = threading.Event()
+        slots = threading.Semaphore(self.window)
+        tasks = queue.Queue(maxsize=self.window + self.workers)
+        results = queue.Queue()
+        read_error = []
+
+        def read():
+            try:
+                for seq, item in enumerate(items):
+                    # 処理中の要素がwindow個に達したら書き込みが追いつくまで待つ
+                    while not slots.acquire(timeout=STOP_POLL_INTERVAL):
+                        if stop.is_set():
+                            return
+                    if stop.is_set():
+                        return
+                    tasks.put((seq, item))
+            except BaseException as e:
+                read_error.append(e)
+            finally:
+                for _ in range(self.workers):
+                    tasks.put(_DONE)
+
+        def work():
+            while True:
+                task = tasks.get()
+                if task is _DONE:
+                    results.put(_DONE)
+                    return
+                seq, item = task
+                if stop.is_set():
+                    continue
+                try:
+                    results.put((seq, item, func(item), None))
+                except BaseException as e:
+                    results.put((seq, item, None, e))
+
+        threads = [threading.Thread(target=read, daemon=True)]
+        threads += [threading.Thread(target=work, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        pending = {}
+        next_seq = 0
+        finished_workers = 0
+        try:
+            while True:
+                # 次の順番の結果が揃っていれば順に渡す
+                while next_seq in pending:
+                    item, result, error = pending.pop(next_seq)
+                    next_seq += 1
+                    if error is not None:
+                        raise error
+                    yield item, result
+                    slots.release()
+                if finished_workers == self.workers:
+                    break
+                outcome = results.get()
+                if outcome is _DONE:
+                    finished_workers += 1
+                    continue
+                seq, item, result, error = outcome
+                pending[seq] = (item, result, error)
+            if read_error:
+                raise read_error[0]
+        finally:
+            # 途中で終了した場合（例外・キャンセル）は読み込みとワーカーを止める
+            stop.set()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OpenAI APIのレート制限（RPM/TPM）のクライアント側での制御
+1分あたりのリクエスト数（RPM）とトークン数（TPM）のトークンバケットで、API呼び出しの前に
+予算が空くまで待つ。並列の分類ワーカー（スレッド）間で共有し、状態ファイルを指定すると
+同じアカウントで同時に動く別のプロセス（GUI・バッチ・キャッシュのウォームアップ）とも共有する。
+
+レスポンスにx-ratelimit-*ヘッダーがあれば、残り回数・上限に合わせてバケットを補正する
+（RPM/TPMを設定していなくても、ヘッダーで上限が分かればその上限で制御する）。
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# 予算が空くのを待つ間にキャンセルを確認する最大間隔（秒）
+MAX_WAIT_INTERVAL = 1.0
+
+# x-ratelimit-reset-* の "6m0s" "1.5s" "20ms" などの期間
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+
+
+def parse_duration(text):
+    """x-ratelimit-reset-* の期間を秒に変換（解釈できない場合はNone）"""
+    if not text:
+        return None
+    parts = _DURATION_PART.findall(str(text))
+    if not parts:
+        try:
+            return float(text)
+        except ValueError:
+            return None
+    return sum(float(value) * _DURATION_UNITS[unit] for value, unit in parts)
+
+
+def _header_number(headers, name):
+    try:
+        value = headers.get(name)
+        return None if value is None else float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MemoryStateBackend:
+    """プロセス内（スレッド間）で共有する状態"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def transact(self, func):
+        """状態をロックした状態でfunc(state)を実行し、その戻り値を返す（stateの変更は保存される）"""
+        with self._lock:
+            return func(self._state)
+
+
+class FileStateBackend:
+    """プロセス間で共有する状態（JSONファイルをファイルロックして読み書き）"""
+
+    def __init__(self, path):
+        self.path = path
+        # 同じプロセス内のスレッドはファイルロックの前にこのロックで直列化する
+        self._lock = threading.Lock()
+
+    def _acquire_file_lock(self, file):
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            return
+        file.seek(0)
+        while True:
+            try:
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                # LK_LOCKは約10秒で諦めるため、取れるまで繰り返す
+                continue
+
+    def _release_file_lock(self, file):
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+            return
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def transact(self, func):
+        with self._lock:
+            # 'a+' で開くと存在しない場合だけ作成される（既存の内容は消さない）
+            with open(self.path, 'a+', encoding='utf-8') as file:
+                self._acquire_file_lock(file)
+                try:
+                    file.seek(0)
+                    content = file.read()
+                    try:
+                        state = json.loads(content) if content.strip() else {}
+                    except ValueError:
+                        logger.warning(f"レート制限の状態ファイルを解釈できないため初期化: {self.path}")
+                        state = {}
+                    result = func(state)
+                    file.seek(0)
+                    file.truncate()
+                    file.write(json.dumps(state))
+                    file.flush()
+                    return result
+                finally:
+                    self._release_file_lock(file)
+
+
+class RateLimiter:
+    """RPM/TPMのトークンバケット（設定値とx-ratelimit-*ヘッダーの上限のうち小さい方で制御）"""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, backend=None, clock=time.time):
+        """
+        初期化
+
+        Args:
+            requests_per_minute (float): 1分あたりのリクエスト数の上限（Noneはヘッダーで分かるまで制限なし）
+            tokens_per_minute (float): 1分あたりのトークン数の上限（Noneはヘッダーで分かるまで制限なし）
+            backend: 状態の共有先（MemoryStateBackend / FileStateBackend）
+            clock: 現在時刻（プロセス間で共有するため壁時計の秒）
+        """
+        self.limits = {
+            'requests': float(requests_per_minute) if requests_per_minute else None,
+            'tokens': float(tokens_per_minute) if tokens_per_minute else None,
+        }
+        self.backend = backend or MemoryStateBackend()
+        self.clock = clock
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _capacity(self, state, kind):
+        """設定値とヘッダーで分かった上限のうち小さい方（どちらもなければNone）"""
+        limits = [limit for limit in (self.limits[kind], state.get(f'{kind}_limit')) if limit]
+        return min(limits) if limits else None
+
+    def _refill(self, state, now):
+        """前回の更新からの経過時間分だけバケットを補充"""
+        elapsed = max(0.0, now - state.get('updated', now))
+        state['updated'] = now
+        for kind in ('requests', 'tokens'):
+            capacity = self._capacity(state, kind)
+            if capacity is None:
+                state.pop(kind, None)
+                continue
+            level = state.get(kind)
+            level = capacity if level is None else level + elapsed * capacity / 60.0
+            state[kind] = min(capacity, level)
+
+    def _try_take(self, state, tokens):
+        """
+        予算があれば1リクエストとtokensトークンを消費
+
+        Returns:
+            float: 予算が空くまでの待ち時間（秒）。消費できた場合は0
+        """
+        self._refill(state, self.clock())
+        costs = {'requests': 1.0, 'tokens': float(tokens)}
+        wait = 0.0
+        for kind, cost in costs.items():
+            capacity = self._capacity(state, kind)
+            if capacity is None:
+                continue
+            # 1回のコストが上限を超える場合は、バケットが満杯になれば通す
+            cost = min(cost, capacity)
+            if state[kind] < cost:
+                wait = max(wait, (cost - state[kind]) * 60.0 / capacity)
+        if wait > 0:
+            return wait
+        for kind, cost in costs.items():
+            if kind in state:
+                state[kind] -= min(cost, self._capacity(state, kind))
+        return 0.0
+
+    def acquire(self, tokens, cancel_token=None):
+        """
+        1リクエスト分とtokensトークン分の予算が空くまで待って消費
+
+        Raises:
+            ConversionCancelled: 待ち中に変換がキャンセルされた場合
+        """
+        waited = 0.0
+        while True:
+            wait = self.backend.transact(lambda state: self._try_take(state, tokens))
+            if wait <= 0:
+                break
+            if waited == 0.0:
+                logger.info(f"レート制限のため {wait:.1f} 秒待機")
+            interval = min(wait, MAX_WAIT_INTERVAL)
+            if cancel_token is not None:
+                if cancel_token.wait(interval):
+                    cancel_token.raise_if_cancelled()
+            else:
+                time.sleep(interval)
+            waited += interval
+        if waited:
+            with self._stats_lock:
+                self.waits += 1
+                self.waited_seconds += waited
+
+    def settle(self, estimated_tokens, actual_tokens):
+        """見積もりで消費したトークン数と実際のトークン数の差をバケットに戻す（超過分は差し引く）"""
+        difference = float(estimated_tokens) - float(actual_tokens)
+        if not difference:
+            return
+
+        def adjust(state):
+            if 'tokens' in state:
+                state['tokens'] = min(self._capacity(state, 'tokens'), state['tokens'] + difference)
+        self.backend.transact(adjust)
+
+    def update_from_headers(self, headers):
+        """
+        x-ratelimit-*ヘッダーで上限と残りを補正
+
+        上限（limit）はバケットの容量に、残り（remaining）はバケットの残量の上限に使う。
+        """
+        if not headers:
+            return
+        values = {
+            kind: (_header_number(headers, f'x-ratelimit-limit-{kind}'),
+                   _header_number(headers, f'x-ratelimit-remaining-{kind}'))
+            for kind in ('requests', 'tokens')
+        }
+        if all(limit is None and remaining is None for limit, remaining in values.values()):
+            return
+
+        def update(state):
+            self._refill(state, self.clock())
+            for kind, (limit, remaining) in values.items():
+                if limit:
+                    state[f'{kind}_limit'] = limit
+                if remaining is not None and self._capacity(state, kind) is not None:
+                    level = state.get(kind, self._capacity(state, kind))
+                    state[kind] = min(level, remaining, self._capacity(state, kind))
+        self.backend.transact(update)
+
+    def penalize(self, headers):
+        """
+        429応答を受けた場合、サーバー側の残りがリセットされるまで予算を空にする
+
+        x-ratelimit-reset-*（なければRetry-After）の時間が経つまで予算が空かないよう、バケットをマイナスにする。
+
+        Returns:
+            bool: 待ち時間を反映できた場合True（ヘッダーがない・上限が分からない場合はFalse）
+        """
+        if not headers:
+            return False
+        self.update_from_headers(headers)
+        resets = {kind: parse_duration(headers.get(f'x-ratelimit-reset-{kind}')) for kind in ('requests', 'tokens')}
+        retry_after = _header_number(headers, 'retry-after')
+
+        def update(state):
+            self._refill(state, self.clock())
+            applied = False
+            for kind, reset in resets.items():
+                capacity = self._capacity(state, kind)
+                reset = reset if reset is not None else retry_after
+                if capacity is None or reset is None:
+                    continue
+                state[kind] = min(state[kind], -reset * capacity / 60.0)
+                applied = True
+            return applied
+        return self.backend.transact(update)
+
+    @property
+    def active(self):
+        """上限が分かっていて制御しているかどうか"""
+        return self.backend.transact(lambda state: any(
+            self._capacity(state, kind) is not None for kind in ('requests', 'tokens')
+        ))
+
+    def summary(self):
+        """レート制限による待機のサマリー文字列"""
+        def limits(state):
+            return {kind: self._capacity(state, kind) for kind in ('requests', 'tokens')}
+        current = self.backend.transact(limits)
+        described = ", ".join(
+            f"{label}: {current[kind]:.0f}/分" for kind, label in (('requests', 'RPM'), ('tokens', 'TPM'))
+            if current[kind] is not None
+        ) or "上限なし"
+        return f"レート制限（{described}）: 待機 {self.waits} 回, 合計 {self.waited_seconds:.1f} 秒"
+
+
+def create_rate_limiter(gpt_settings):
+    """
+    YAMLのgpt_settingsのrequests_per_minute / tokens_per_minute / rate_limit_state_file でレート制限を作成
+
+    rate_limit_state_fileを指定すると、同じファイルを指定した全プロセスで予算を共有する。
+    """
+    state_file = gpt_settings.get('rate_limit_state_file')
+    if state_file:
+        directory = os.path.dirname(os.path.abspath(state_file))
+        os.makedirs(directory, exist_ok=True)
+        backend = FileStateBackend(state_file)
+    else:
+        backend = MemoryStateBackend()
+    return RateLimiter(
+        requests_per_minute=gpt_settings.get('requests_per_minute'),
+        tokens_per_minute=gpt_settings.get('tokens_per_minute'),
+        backend=backend,
+    )
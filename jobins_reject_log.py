@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+変換できなかった行の隔離
+列数が合わない行・文字コードを解釈できない行・変換中に例外が発生した行を
+変換全体を止めずにエラー行ファイル（CSV）へ書き出し、残りの行の変換を続ける。
+空行と、フィルタ条件で出力しない行はエラー行に数えない。末尾の空の列が省略された行は空の値で補う。
+
+エラー行ファイルには 行番号・理由 と元の行の値をそのまま書き出す。
+エラー行が上限（processing_rules.max_row_errors）を超えた場合は変換を中止する。
+"""
+
+import csv
+import os
+
+from jobins_compression import strip_compression_suffix
+
+DEFAULT_MAX_ROW_ERRORS = 100
+DEFAULT_REJECT_SUFFIX = "_エラー行.csv"
+# 標準出力に書き出す場合のエラー行ファイル名
+STDOUT_REJECT_FILE = "標準出力" + DEFAULT_REJECT_SUFFIX
+REJECT_COLUMNS = ["行番号", "理由"]
+
+
+class TooManyRowErrors(Exception):
+    """エラー行が上限を超えた"""
+
+
+def row_problem(row, headers):
+    """
+    行の形式上の問題（変換前に検出できるもの）
+
+    Returns:
+        str: 問題の理由（問題がなければNone）
+    """
+    if len(row) != len(headers):
+        return f"列数が一致しません（{len(row)} 列、ヘッダーは {len(headers)} 列）"
+    # 入力はerrors='surrogateescape'で開くため、解釈できないバイトはサロゲート文字として残る
+    for value in row:
+        if any('\udc80' <= char <= '\udcff' for char in value):
+            return "文字コードを解釈できない文字が含まれています"
+    return None
+
+
+def screen_row(row, headers, include=None):
+    """
+    行をヘッダーの列数に揃え、出力する行か・形式上の問題がないかを判定
+
+    末尾の空の列が省略された行は空の値で補い、ヘッダーより多い列がすべて空なら取り除く。
+    フィルタ条件は形式上の判定より先に適用し、出力されない行はエラー行にしない。
+
+    Args:
+        row (list): csv.readerの行
+        headers (list): 入力CSVのヘッダー
+        include (callable): include(row, headers) でフィルタ条件を満たすか判定する関数
+
+    Returns:
+        tuple: (揃えた行, 問題の理由（問題がなければNone）)。空行・フィルタ条件を満たさない行はNone
+    """
+    if not any(value.strip() for value in row):
+        return None
+    if len(row) < len(headers):
+        row = row + [""] * (len(headers) - len(row))
+    elif len(row) > len(headers) and not any(value.strip() for value in row[len(headers):]):
+        row = row[:len(headers)]
+    if include is not None and not include(row, headers):
+        return None
+    return row, row_problem(row, headers)
+
+
+def iter_rows(reader):
+    """
+    csv.readerの行を順に返す（解析できない行はその行を飛ばして続ける）
+
+    Yields:
+        tuple: (行, 解析エラーの理由)。解析できた行の理由はNone、解析できなかった行は (None, 理由)
+    """
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield None, f"CSV解析エラー: {e}"
+            continue
+        yield row, None
+
+
+class RejectLog:
+    """エラー行ファイルへの書き出しとエラー件数の上限チェック"""
+
+    def __init__(self, output_path, headers, processing_rules=None):
+        """
+        初期化（ファイルは最初のエラー行で作成する）
+
+        Args:
+            output_path (str): 変換の出力ファイルパス（エラー行ファイル名の元）
+            headers (list): 入力CSVのヘッダー
+            processing_rules (dict): YAMLのprocessing_rules（reject_file / max_row_errors）
+        """
+        processing_rules = processing_rules or {}
+        self.path = processing_rules.get('reject_file') or self._default_path(output_path)
+        max_errors = processing_rules.get('max_row_errors', DEFAULT_MAX_ROW_ERRORS)
+        self.max_errors = None if max_errors is None else int(max_errors)
+        self.headers = headers
+        self.count = 0
+        self.reasons = {}
+        self._file = None
+        self._writer = None
+
+    @staticmethod
+    def _default_path(output_path):
+        if str(output_path) == "-":
+            return STDOUT_REJECT_FILE
+        # 出力を圧縮する場合もエラー行ファイルは圧縮しない（"出力.csv.gz" → "出力_エラー行.csv"）
+        base, _ = os.path.splitext(strip_compression_suffix(output_path))
+        return base + DEFAULT_REJECT_SUFFIX
+
+    def record(self, row_number, row, reason):
+        """
+        エラー行を書き出し
+
+        Raises:
+            TooManyRowErrors: エラー行が上限を超えた場合
+        """
+        if self._file is None:
+            # 解釈できなかったバイトは元のまま書き戻す
+            self._file = open(self.path, 'w', encoding='utf-8-sig', errors='surrogateescape', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(REJECT_COLUMNS + list(self.headers))
+        self._writer.writerow([row_number, reason] + list(row or []))
+        self._file.flush()
+        self.count += 1
+        category = reason.split("（")[0].split(":")[0]
+        self.reasons[category] = self.reasons.get(category, 0) + 1
+        if self.max_errors is not None and self.count > self.max_errors:
+            raise TooManyRowErrors(f"エラー行が上限（{self.max_errors} 件）を超えたため変換を中止しました")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def summary(self):
+        """エラー行のサマリー文字列"""
+        if not self.count:
+            return "エラー行: なし"
+        details = ", ".join(f"{reason}: {count}" for reason, count in
+                            sorted(self.reasons.items(), key=lambda item: item[1], reverse=True))
+        return f"エラー行: {self.count} 件（{details}）→ {self.path}"
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API分類の結果から学習するローカルの職種分類モデル
+職種分類キャッシュに蓄積した (求人タイトル, API分類) から、文字n-gram（ハッシュ化）の特徴量と
+多クラスのロジスティック回帰（NumPy）で職種分類（中分類）を予測するモデルを学習する。
+
+変換時はAPIを呼ぶ前にモデルで予測し、確率がしきい値以上なら（職種で絞り込んだ選択肢の中で）その分類を使う。
+学習したモデルはバージョン番号付きのファイルで保存し、キャッシュにAPI分類が一定数増えるたびに
+（変換の終了を待たせないよう別スレッドで）再学習する。学習にはキャッシュのうちAPIで分類したエントリだけを使う。
+
+使い方:
+    python jobins_title_model.py train
+    python jobins_title_model.py info
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+from jobins_classification_cache import category_table_version, SOURCE_API
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_DIR = ".jobins_title_model"
+MODEL_FILE_PATTERN = "title_model_v{version:04d}.npz"
+MODEL_FILE_REGEX = re.compile(r'title_model_v(\d+)\.npz$')
+
+# YAMLのtitle_modelのデフォルト値
+DEFAULT_TITLE_MODEL_SETTINGS = {
+    'enabled': False,
+    'model_dir': DEFAULT_MODEL_DIR,
+    'confidence_threshold': 0.9,     # 予測確率がこの値以上ならAPIを呼ばない
+    'retrain_min_new_labels': 500,   # 前回の学習からAPI分類がこの件数増えたら再学習
+    'min_training_labels': 200,      # 学習に必要な最小件数
+    'keep_versions': 3,              # 残す過去のバージョン数
+    'feature_bits': 15,              # 特徴量のハッシュの次元（2のべき乗）
+    'ngram_max': 3,                  # 文字n-gramの最大長
+    'epochs': 8,
+    'learning_rate': 0.5,
+}
+
+# 学習時のミニバッチの大きさと評価用に取り分ける割合
+BATCH_SIZE = 256
+HOLDOUT_RATIO = 0.1
+ADAGRAD_EPSILON = 1e-8
+
+
+def _normalize(text):
+    return unicodedata.normalize('NFKC', str(text)).lower()
+
+
+def title_features(title, dimension, ngram_max):
+    """
+    タイトルの文字n-gram（1〜ngram_max文字、先頭・末尾の印を含む）のハッシュ値
+
+    Returns:
+        ndarray: 重複のない特徴量の番号（int64）
+    """
+    text = f"\x02{_normalize(title)}\x03"
+    indices = {
+        zlib.crc32(text[start:start + size].encode('utf-8')) % dimension
+        for size in range(1, ngram_max + 1)
+        for start in range(len(text) - size + 1)
+    }
+    return np.fromiter(sorted(indices), dtype=np.int64, count=len(indices))
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class TitleModel:
+    """文字n-gramの特徴量による多クラスのロジスティック回帰"""
+
+    def __init__(self, labels, feature_bits=15, ngram_max=3, weights=None, bias=None, metadata=None):
+        self.labels = list(labels)
+        self.label_index = {label: i for i, label in enumerate(self.labels)}
+        self.feature_bits = int(feature_bits)
+        self.dimension = 1 << self.feature_bits
+        self.ngram_max = int(ngram_max)
+        self.weights = (weights if weights is not None
+                        else np.zeros((self.dimension, len(self.labels)), dtype=np.float32))
+        self.bias = bias if bias is not None else np.zeros(len(self.labels), dtype=np.float32)
+        self.metadata = metadata or {}
+
+    def _features(self, title):
+        return title_features(title, self.dimension, self.ngram_max)
+
+    def _batch_logits(self, features):
+        """
+        特徴量のリストのロジット
+
+        Returns:
+            tuple: (ロジット, 連結した特徴量番号, 特徴量ごとのスケール, 各サンプルの開始位置)
+        """
+        lengths = np.fromiter((len(indices) for indices in features), dtype=np.int64, count=len(features))
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        indices = np.concatenate(features)
+        # 長いタイトルほど特徴量が多いため、1/sqrt(特徴量数) で大きさをそろえる
+        scale = np.repeat(1.0 / np.sqrt(lengths), lengths).astype(np.float32)
+        logits = np.add.reduceat(self.weights[indices] * scale[:, None], offsets, axis=0) + self.bias
+        return logits, indices, scale, offsets
+
+    def fit(self, titles, labels, epochs=8, learning_rate=0.5, seed=0):
+        """
+        ミニバッチのAdaGradで学習（クロスエントロピー損失）
+
+        ハッシュ化した文字n-gramは出現頻度の差が大きいため、特徴量ごとに学習率を調整するAdaGradを使う。
+        """
+        features = [self._features(title) for title in titles]
+        targets = np.array([self.label_index[label] for label in labels], dtype=np.int64)
+        accumulated = np.zeros_like(self.weights)
+        accumulated_bias = np.zeros_like(self.bias)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(features))
+            for start in range(0, len(order), BATCH_SIZE):
+                batch = order[start:start + BATCH_SIZE]
+                logits, indices, scale, offsets = self._batch_logits([features[i] for i in batch])
+                gradient = _softmax(logits)
+                gradient[np.arange(len(batch)), targets[batch]] -= 1.0
+                # 同じ特徴量の勾配をまとめてから更新
+                rows = np.repeat(np.arange(len(batch)), np.diff(np.append(offsets, len(indices))))
+                unique, inverse = np.unique(indices, return_inverse=True)
+                weight_gradient = np.zeros((len(unique), len(self.labels)), dtype=np.float32)
+                np.add.at(weight_gradient, inverse, gradient[rows] * scale[:, None])
+                accumulated[unique] += weight_gradient ** 2
+                self.weights[unique] -= learning_rate * weight_gradient / np.sqrt(accumulated[unique] + ADAGRAD_EPSILON)
+                bias_gradient = gradient.sum(axis=0)
+                accumulated_bias += bias_gradient ** 2
+                self.bias -= learning_rate * bias_gradient / np.sqrt(accumulated_bias + ADAGRAD_EPSILON)
+        return self
+
+    def predict(self, title, options=None):
+        """
+        職種分類を予測
+
+        Args:
+            options (list): 選択肢（職種で絞り込んだ中分類）。指定した場合は選択肢の中で確率を求める
+
+        Returns:
+            tuple: (職種分類, 確率)。選択肢にモデルの分類がない場合は (None, 0.0)
+        """
+        logits, _, _, _ = self._batch_logits([self._features(title)])
+        logits = logits[0]
+        if options is not None:
+            columns = [self.label_index[option] for option in options if option in self.label_index]
+            if not columns:
+                return None, 0.0
+            probabilities = _softmax(logits[columns])
+            best = int(np.argmax(probabilities))
+            return self.labels[columns[best]], float(probabilities[best])
+        probabilities = _softmax(logits)
+        best = int(np.argmax(probabilities))
+        return self.labels[best], float(probabilities[best])
+
+    def save(self, path):
+        """モデルをファイルに保存（書き込み途中のファイルを読まれないよう一時ファイルから置き換え）"""
+        temp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            temp_path,
+            weights=self.weights, bias=self.bias, labels=np.array(self.labels),
+            settings=np.array([self.feature_bits, self.ngram_max]),
+            metadata=np.array(json.dumps(self.metadata, ensure_ascii=False)),
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            feature_bits, ngram_max = (int(value) for value in data['settings'])
+            return cls(
+                [str(label) for label in data['labels']], feature_bits=feature_bits, ngram_max=ngram_max,
+                weights=data['weights'], bias=data['bias'], metadata=json.loads(str(data['metadata'])),
+            )
+
+
+def model_versions(model_dir):
+    """保存済みのモデルの (バージョン, パス) の一覧（古い順）"""
+    versions = []
+    for path in glob.glob(os.path.join(glob.escape(model_dir), "title_model_v*.npz")):
+        match = MODEL_FILE_REGEX.search(os.path.basename(path))
+        if match:
+            versions.append((int(match.group(1)), path))
+    return sorted(versions)
+
+
+def train_model(records, job_categories, settings, seed=0):
+    """
+    (タイトル, 職種分類, 保存時刻) の一覧からモデルを学習
+
+    評価用に一部を取り分けて予測の精度と、しきい値以上の予測の割合（判定率）・一致率を求めてから、全件で学習し直す。
+
+    Returns:
+        TitleModel（学習に使える件数が足りない場合はNone）
+    """
+    valid_labels = [category[1] for category in job_categories]
+    valid = set(valid_labels)
+    samples = [(title, label) for title, label, _ in records if title and label in valid]
+    if len(samples) < settings['min_training_labels']:
+        logger.info(f"学習に使えるAPI分類が {len(samples)} 件のため学習しません"
+                    f"（{settings['min_training_labels']} 件以上必要）")
+        return None
+    seen = {label for _, label in samples}
+    labels = [label for label in dict.fromkeys(valid_labels) if label in seen]
+
+    def new_model(metadata=None):
+        return TitleModel(labels, feature_bits=settings['feature_bits'], ngram_max=settings['ngram_max'],
+                          metadata=metadata)
+
+    def fit(model, part):
+        return model.fit([title for title, _ in part], [label for _, label in part],
+                         epochs=settings['epochs'], learning_rate=settings['learning_rate'], seed=seed)
+
+    started = time.perf_counter()
+    order = np.random.default_rng(seed).permutation(len(samples))
+    holdout_size = max(1, int(len(samples) * HOLDOUT_RATIO))
+    holdout = [samples[i] for i in order[:holdout_size]]
+    evaluation_model = fit(new_model(), [samples[i] for i in order[holdout_size:]])
+    threshold = settings['confidence_threshold']
+    predictions = [evaluation_model.predict(title) + (label,) for title, label in holdout]
+    confident = [(predicted, label) for predicted, probability, label in predictions if probability >= threshold]
+    metrics = {
+        'holdout': len(holdout),
+        'accuracy': sum(1 for predicted, _, label in predictions if predicted == label) / len(holdout),
+        'threshold': threshold,
+        'coverage': len(confident) / len(holdout),
+        'agreement': (sum(1 for predicted, label in confident if predicted == label) / len(confident)
+                      if confident else None),
+    }
+
+    model = fit(new_model(), samples)
+    model.metadata = {
+        'trained_at': datetime.now().isoformat(timespec='seconds'),
+        'samples': len(samples),
+        # 学習に使ったAPI分類の最新の保存時刻（これより後に保存されたAPI分類を再学習の判定に数える）
+        'labels_until': max((stored_at for _, _, stored_at in records), default=None),
+        'table_version': category_table_version(job_categories),
+        'seconds': round(time.perf_counter() - started, 1),
+        **metrics,
+    }
+    return model
+
+
+class TitleModelStore:
+    """バージョン付きで保存したモデルの読み込み・変換時の予測・再学習"""
+
+    def __init__(self, settings, job_categories):
+        """
+        初期化（最新のバージョンのモデルを読み込む）
+
+        Args:
+            settings (dict): YAMLのtitle_model
+            job_categories (list): 職種分類テーブル
+        """
+        self.settings = {**DEFAULT_TITLE_MODEL_SETTINGS, **(settings or {})}
+        self.job_categories = job_categories
+        self.model_dir = self.settings['model_dir']
+        self.threshold = float(self.settings['confidence_threshold'])
+        self.model = None
+        self.version = None
+        self.local_count = 0
+        self.remote_count = 0
+        self._lock = threading.Lock()
+        self._retrain_thread = None
+        self._load_latest()
+
+    def _load_latest(self):
+        versions = model_versions(self.model_dir)
+        if not versions:
+            return
+        version, path = versions[-1]
+        try:
+            model = TitleModel.load(path)
+        except Exception as e:
+            logger.warning(f"職種分類モデルの読み込みに失敗: {path}: {e}")
+            return
+        if model.metadata.get('table_version') != category_table_version(self.job_categories):
+            # 分類テーブルが変わった場合は次の再学習まで使わない
+            logger.warning(f"職種分類テーブルが学習時と異なるため、職種分類モデルを使用しません: {path}")
+            return
+        self.model, self.version = model, version
+        logger.info(f"職種分類モデルを読み込み: v{version}（学習件数: {model.metadata.get('samples')} 件）")
+
+    def resolve(self, title, job_options):
+        """
+        予測確率がしきい値以上の場合はモデルの予測を返す
+
+        Returns:
+            str: モデルで判定した分類（APIで分類すべき場合はNone）
+        """
+        if self.model is None:
+            return None
+        label, probability = self.model.predict(title, job_options)
+        local = label is not None and probability >= self.threshold
+        with self._lock:
+            if local:
+                self.local_count += 1
+            else:
+                self.remote_count += 1
+        if local:
+            logger.debug(f"職種分類モデル（確率 {probability:.2f}）: {title} → {label}")
+            return label
+        return None
+
+    def train(self, records):
+        """
+        モデルを学習して新しいバージョンとして保存（古いバージョンはkeep_versions個まで残す）
+
+        Returns:
+            int: 保存したバージョン（学習しなかった場合はNone）
+        """
+        model = train_model(records, self.job_categories, self.settings)
+        if model is None:
+            return None
+        os.makedirs(self.model_dir, exist_ok=True)
+        versions = model_versions(self.model_dir)
+        version = versions[-1][0] + 1 if versions else 1
+        model.metadata['version'] = version
+        model.save(os.path.join(self.model_dir, MODEL_FILE_PATTERN.format(version=version)))
+        for _, path in versions[:max(0, len(versions) + 1 - int(self.settings['keep_versions']))]:
+            os.remove(path)
+        with self._lock:
+            self.model, self.version = model, version
+        logger.info(f"職種分類モデルを保存: v{version} {describe(model)}")
+        return version
+
+    def new_label_count(self, records):
+        """
+        前回の学習より後に保存されたAPI分類の件数
+
+        キャッシュは件数の上限で古いものから追い出されるため、件数の差ではなく保存時刻で数える。
+        """
+        metadata = self.model.metadata
+        until = metadata.get('labels_until')
+        if until is None:
+            # labels_untilを記録する前のモデルは学習した時刻で数える
+            until = datetime.fromisoformat(metadata['trained_at']).timestamp()
+        return sum(1 for _, _, stored_at in records if stored_at > until)
+
+    def needs_retraining(self, records):
+        """前回の学習からAPI分類がretrain_min_new_labels件以上増えた場合True"""
+        if self.model is None:
+            return len(records) >= self.settings['min_training_labels']
+        return self.new_label_count(records) >= self.settings['retrain_min_new_labels']
+
+    def maybe_retrain(self, records):
+        """
+        キャッシュのAPI分類が増えていれば別スレッドで再学習（変換の終了・GUIの操作を待たせない）
+
+        学習が終わると新しいバージョンに切り替わる。再学習中に呼ばれた場合は何もしない。
+
+        Args:
+            records (list): training_labels() の (タイトル, API分類, 保存時刻) の一覧
+
+        Returns:
+            threading.Thread: 再学習のスレッド（再学習しない場合はNone）
+        """
+        records = list(records)
+        if not self.needs_retraining(records):
+            return None
+        with self._lock:
+            if self._retrain_thread is not None and self._retrain_thread.is_alive():
+                return None
+            # デーモンにしないので、CLIの変換でも学習を終えてから終了する
+            self._retrain_thread = threading.Thread(target=self._retrain, args=(records,), name="title-model-retrain")
+            thread = self._retrain_thread
+        logger.info(f"職種分類モデルを別スレッドで再学習: API分類 {len(records)} 件")
+        thread.start()
+        return thread
+
+    def _retrain(self, records):
+        try:
+            self.train(records)
+        except Exception as e:
+            # 再学習に失敗しても変換結果・キャッシュには影響させない（次回の保存時に再試行）
+            logger.warning(f"職種分類モデルの再学習に失敗: {e}")
+
+    def summary(self):
+        """モデルで判定した件数とAPI分類の件数のサマリー文字列"""
+        if self.model is None:
+            return "職種分類モデル: 未学習"
+        total = self.local_count + self.remote_count
+        share = self.local_count / total if total else 0.0
+        return (f"職種分類モデル v{self.version}: {self.local_count} 件, API分類へ: {self.remote_count} 件 "
+                f"(モデル {share:.1%}, しきい値: {self.threshold})")
+
+
+def describe(model):
+    """モデルの学習時の情報の文字列"""
+    metadata = model.metadata
+    agreement = metadata.get('agreement')
+    agreement = f"{agreement:.1%}" if agreement is not None else "-"
+    return (f"(学習: {metadata.get('trained_at')}, {metadata.get('samples')} 件, {len(model.labels)} 分類, "
+            f"評価精度: {metadata.get('accuracy', 0):.1%}, しきい値 {metadata.get('threshold')} での"
+            f"判定率: {metadata.get('coverage', 0):.1%} / 一致率: {agreement})")
+
+
+def create_title_model_store(config, job_categories):
+    """YAMLのtitle_modelが有効な場合にモデルの保存先を作成（無効な場合はNone）"""
+    settings = config.get('title_model') or {}
+    if not settings.get('enabled', DEFAULT_TITLE_MODEL_SETTINGS['enabled']):
+        return None
+    return TitleModelStore(settings, job_categories)
+
+
+def training_labels(cache):
+    """職種分類キャッシュのうちAPIで分類したエントリの (タイトル, API分類, 保存時刻) の一覧"""
+    return [(title, label, stored_at) for title, label, stored_at, _, source in cache.records()
+            if source == SOURCE_API]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API分類の結果から職種分類モデルを学習')
+    parser.add_argument('command', choices=['train', 'info'],
+                        help='train: 職種分類キャッシュから学習して新しいバージョンを保存 / info: 保存済みのモデルを表示')
+    parser.add_argument('-c', '--config', default='jobins_yaml_mapping.yaml', help='YAMLマッピング設定ファイル')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from jobins_classification_cache import _create_converter
+    converter = _create_converter('csv', args.config)
+    store = TitleModelStore(converter.config.get('title_model'), converter.JOB_CATEGORIES)
+
+    if args.command == 'train':
+        version = store.train(training_labels(converter.job_classification_cache))
+        if version is None:
+            return 1
+        print(f"v{version} {describe(store.model)}")
+    else:
+        versions = model_versions(store.model_dir)
+        if not versions:
+            print(f"保存済みのモデルがありません: {store.model_dir}")
+            return 1
+        for version, path in versions:
+            marker = " ←使用中" if version == store.version else ""
+            print(f"v{version} {describe(TitleModel.load(path))}{marker}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+求人タイトルの正規化
+【急募】などのタグ・全角半角の違い・絵文字・給与や勤務地の付記だけが異なるタイトルを
+同じキャッシュキーにまとめ、職種分類のAPI呼び出し回数を減らす
+
+単体で実行すると、入力CSVのタイトルの種類数が正規化でどれだけ減るかを表示する
+"""
+
+import argparse
+import csv
+import re
+import sys
+import unicodedata
+from collections import Counter, defaultdict
+
+import yaml
+
+from jobins_input_reader import open_input
+
+PREFECTURES = [
+    "北海道", "青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県",
+    "茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県",
+    "新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県",
+    "静岡県", "愛知県", "三重県", "滋賀県", "京都府", "大阪府", "兵庫県",
+    "奈良県", "和歌山県", "鳥取県", "島根県", "岡山県", "広島県", "山口県",
+    "徳島県", "香川県", "愛媛県", "高知県", "福岡県", "佐賀県", "長崎県",
+    "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県",
+]
+
+# 【急募】［未経験歓迎］などのタグ（NFKC後の括弧）
+BRACKET_TAG_PATTERN = re.compile(r'【[^】]*】|\[[^\]]*\]|〔[^〕]*〕|《[^》]*》|≪[^≫]*≫|<[^>]*>')
+
+# 末尾の勤務地（「/ 東京」「@大阪」「（東京勤務）」など）
+_PREFECTURE_NAMES = "|".join(
+    sorted({name if name == "北海道" else name[:-1] for name in PREFECTURES} | set(PREFECTURES), key=len, reverse=True)
+)
+LOCATION_SUFFIX_PATTERN = re.compile(
+    rf'[\s/|@・-]*\(?(?:{_PREFECTURE_NAMES})(?:勤務|配属|本社|エリア)?\)?\s*$'
+)
+
+# デフォルトのノイズパターン（給与の付記・条件の括弧書き）
+DEFAULT_NOISE_PATTERNS = [
+    r'(?:月給|年収|時給|日給|年俸)\s*\d[\d,.]*\s*万?円?(?:\s*[~〜-]\s*(?:\d[\d,.]*\s*万?円?)?)?',
+    r'\d[\d,.]*\s*万円?\s*[~〜-]\s*(?:\d[\d,.]*\s*万?円?)?',
+    r'\((?:未経験|急募|経験者|高収入|残業|リモート|在宅|土日|週休|賞与|年間休日)[^)]*\)',
+]
+
+
+class TitleNormalizer:
+    """求人タイトルを正規化してキャッシュキー・分類入力を作るクラス"""
+
+    def __init__(self, settings=None):
+        """
+        初期化
+
+        Args:
+            settings (dict): YAMLのtitle_normalization
+                enabled / strip_bracket_tags / remove_emoji / strip_location_suffix / noise_patterns
+        """
+        settings = settings or {}
+        self.enabled = settings.get('enabled', True)
+        self.strip_bracket_tags = settings.get('strip_bracket_tags', True)
+        self.remove_emoji = settings.get('remove_emoji', True)
+        self.strip_location_suffix = settings.get('strip_location_suffix', True)
+        self.noise_patterns = [
+            re.compile(pattern) for pattern in settings.get('noise_patterns', DEFAULT_NOISE_PATTERNS)
+        ]
+
+    @property
+    def settings_key(self):
+        """正規化の設定（同じ値なら同じタイトルから同じキャッシュキーを作る）"""
+        return (self.enabled, self.strip_bracket_tags, self.remove_emoji, self.strip_location_suffix,
+                tuple(pattern.pattern for pattern in self.noise_patterns))
+
+    @staticmethod
+    def _remove_symbols(text):
+        """絵文字・記号（★♪など）と異体字セレクタを除去"""
+        return "".join(
+            char for char in text
+            if unicodedata.category(char) not in ('So', 'Cs', 'Co') and not 0xFE00 <= ord(char) <= 0xFE0F
+        )
+
+    def normalize(self, title):
+        """
+        タイトルを正規化
+
+        NFKC → タグ除去 → 絵文字除去 → ノイズパターン除去 → 勤務地除去 → 空白の統一 の順に適用。
+        正規化の結果が空になる場合はNFKCと空白の統一のみを適用した値を返す。
+        """
+        if not title:
+            return ""
+        base = " ".join(unicodedata.normalize('NFKC', str(title)).split())
+        if not self.enabled:
+            return base
+
+        text = base
+        if self.strip_bracket_tags:
+            text = BRACKET_TAG_PATTERN.sub(" ", text)
+        if self.remove_emoji:
+            text = self._remove_symbols(text)
+        for pattern in self.noise_patterns:
+            text = pattern.sub(" ", text)
+        text = " ".join(text.split())
+        if self.strip_location_suffix:
+            text = LOCATION_SUFFIX_PATTERN.sub("", text)
+        text = " ".join(text.split()).strip(" /|・-")
+
+        return text or base
+
+
+def report_collapse(titles, normalizer, top=10):
+    """
+    正規化によるタイトル種類数の削減を集計
+
+    Returns:
+        dict: raw_distinct / normalized_distinct / groups（まとめられたタイトルの多い順）
+    """
+    groups = defaultdict(Counter)
+    for title in titles:
+        raw = (title or "").strip()
+        if not raw:
+            continue
+        groups[normalizer.normalize(raw)][raw] += 1
+
+    raw_distinct = sum(len(variants) for variants in groups.values())
+    collapsed = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)
+    return {
+        'raw_distinct': raw_distinct,
+        'normalized_distinct': len(groups),
+        'groups': [(key, variants) for key, variants in collapsed[:top] if len(variants) > 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='求人タイトル正規化による種類数の削減を確認')
+    parser.add_argument('input_csv', help='入力CSVファイルパス')
+    parser.add_argument('-c', '--config', default='jobins_yaml_mapping.yaml',
+                        help='YAMLマッピング設定ファイル (title_normalizationを使用)')
+    parser.add_argument('--column', default='名前', help='タイトルの列名 (default: 名前)')
+    parser.add_argument('--top', type=int, default=10, help='表示するまとめ例の件数')
+
+    args = parser.parse_args()
+
+    with open(args.config, 'r', encoding='utf-8') as file:
+        config = yaml.safe_load(file)
+    normalizer = TitleNormalizer(config.get('title_normalization'))
+
+    with open_input(args.input_csv) as infile:
+        reader = csv.DictReader(infile)
+        if args.column not in (reader.fieldnames or []):
+            print(f"列が見つかりません: {args.column}", file=sys.stderr)
+            return 1
+        result = report_collapse((row[args.column] for row in reader), normalizer, args.top)
+
+    raw_distinct = result['raw_distinct']
+    normalized_distinct = result['normalized_distinct']
+    reduction = 1 - normalized_distinct / raw_distinct if raw_distinct else 0.0
+    print(f"タイトルの種類数: {raw_distinct} → {normalized_distinct} ({reduction:.1%} 削減)")
+    for key, variants in result['groups']:
+        print(f"\n{key}  ({len(variants)} 種類)")
+        for raw, count in variants.most_common(5):
+            print(f"  {raw}  ×{count}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
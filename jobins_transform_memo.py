@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+純粋な変換処理のメモ化
+休日休暇・待遇・福利厚生・試用期間などは同じ企業の求人で同じ文章が繰り返されるため、
+(変換ルール, 正規化した値) をキーに結果を再利用する
+"""
+
+from collections import OrderedDict
+
+DEFAULT_MEMO_SIZE = 4096
+
+
+class TransformMemo:
+    """サイズ上限付きのLRUメモ（ヒット率の集計付き）"""
+
+    def __init__(self, maxsize=DEFAULT_MEMO_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(value):
+        """キー用に値を正規化（前後の空白を除去、欠損値はNone）"""
+        if value is None or value != value:  # NaN
+            return None
+        if isinstance(value, str):
+            return value.strip()
+        return value
+
+    def get_or_compute(self, rule, value, compute):
+        """
+        メモから結果を取得（なければ計算して保存）
+
+        Args:
+            rule (str): 変換ルール
+            value: ソース値
+            compute (callable): 正規化した値を受け取り変換結果を返す関数
+
+        Returns:
+            変換結果
+        """
+        normalized = self.normalize(value)
+        key = (rule, normalized)
+        try:
+            result = self._entries[key]
+        except KeyError:
+            pass
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = compute(normalized)
+        self._entries[key] = result
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return result
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        """ヒット率のサマリー文字列"""
+        return (f"変換メモ: ヒット率 {self.hit_rate:.1%} "
+                f"(ヒット: {self.hits}, ミス: {self.misses}, 追い出し: {self.evictions}, 保持: {len(self._entries)}件)")
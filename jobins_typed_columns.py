@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数値列（年収・年齢・従業員数）の型付けと検証
+全角数字・桁区切り・単位（万円・円・歳・名など）を解釈して数値に揃え、
+範囲外・下限＞上限・解釈できない値を検証レポート（CSV）に書き出す
+
+YAMLの typed_columns で対象列と範囲を指定する。
+pandas版は列単位のベクトル演算で、simple版・GUI版は1行ずつ同じ規則で処理する。
+"""
+
+import csv
+import logging
+import math
+import os
+import re
+import sys
+
+from jobins_compression import strip_compression_suffix
+
+logger = logging.getLogger(__name__)
+
+# 全角数字・記号を半角に変換するテーブル
+FULLWIDTH_TABLE = str.maketrans("０１２３４５６７８９．，－〜～", "0123456789.,-~~")
+
+# 数値 + 桁（億・万・千）+ 単位 + 付記（以上・以下など）
+NUMBER_PATTERN = r'^(?:約)?(\d+(?:\.\d+)?)(億|万|千)?(円|歳|才|名|人)?(?:以上|以下|程度|前後|まで|くらい)?$'
+NUMBER_REGEX = re.compile(NUMBER_PATTERN)
+
+# 単位ごとの 桁 → 倍率（対応しない桁は解釈できない値として扱う）
+UNIT_MULTIPLIERS = {
+    '万円': {None: 1.0, '万': 1.0, '億': 10000.0, '千': 0.1},
+    '歳': {None: 1.0},
+    '名': {None: 1.0, '千': 1000.0, '万': 10000.0},
+}
+
+# 単位ごとの許容する接尾辞
+UNIT_SUFFIXES = {
+    '万円': {None, '円'},
+    '歳': {None, '歳', '才'},
+    '名': {None, '名', '人'},
+}
+
+DEFAULT_REPORT_SUFFIX = "_検証レポート.csv"
+# 標準出力に書き出す場合（report_file未指定）は検証レポートを標準エラー出力に書き出す
+STDERR_REPORT = "標準エラー出力"
+REPORT_COLUMNS = ["行番号", "求人名", "列", "値", "理由"]
+
+
+def _multiplier(unit, scale, suffix):
+    """単位・桁・接尾辞から倍率を求める（解釈できない組み合わせはNone）"""
+    if suffix not in UNIT_SUFFIXES[unit]:
+        return None
+    multiplier = UNIT_MULTIPLIERS[unit].get(scale)
+    if multiplier is None:
+        return None
+    # 「350000円」のように万の桁がない円は万円に換算
+    if unit == '万円' and suffix == '円' and scale is None:
+        return 1.0 / 10000
+    return multiplier
+
+
+def normalize_text(value):
+    """全角数字・桁区切り・空白を正規化"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value).translate(FULLWIDTH_TABLE).replace(",", "").replace(" ", "").replace("　", "")
+
+
+def parse_number(value, unit):
+    """
+    1つの値を数値に変換
+
+    Returns:
+        tuple: (数値, 解釈できたか)。空の値は (None, True)
+    """
+    text = normalize_text(value)
+    if not text:
+        return None, True
+    match = NUMBER_REGEX.match(text)
+    if not match:
+        return None, False
+    multiplier = _multiplier(unit, match.group(2), match.group(3))
+    if multiplier is None:
+        return None, False
+    return float(match.group(1)) * multiplier, True
+
+
+def format_number(number):
+    """数値を出力用の文字列に変換（整数なら小数点なし）"""
+    if number is None:
+        return ""
+    if float(number).is_integer():
+        return str(int(number))
+    return f"{number:.4f}".rstrip("0").rstrip(".")
+
+
+class TypedColumns:
+    """YAMLのtyped_columnsに従って数値列を型付け・検証するクラス"""
+
+    def __init__(self, settings, output_columns):
+        """
+        初期化
+
+        Args:
+            settings (dict): YAMLのtyped_columns（columns / ordering / normalize_output / report_file）
+            output_columns (list): 出力カラム名（設定の列のうち出力にないものは無視）
+        """
+        settings = settings or {}
+        self.columns = [
+            spec for spec in settings.get('columns', []) if spec['target_column'] in output_columns
+        ]
+        self.ordering = [
+            (lower, upper) for lower, upper in settings.get('ordering', [])
+            if lower in output_columns and upper in output_columns
+        ]
+        self.normalize_output = settings.get('normalize_output', False)
+        self.report_file = settings.get('report_file')
+        self.label_column = output_columns[0] if output_columns else None
+        self.violations = []
+
+    def __bool__(self):
+        return bool(self.columns)
+
+    def report_path(self, output_path):
+        """検証レポートのパス（未指定なら出力ファイル名_検証レポート.csv、標準出力に書き出す場合はNone）"""
+        if self.report_file:
+            return self.report_file
+        if str(output_path) == "-":
+            return None
+        base, _ = os.path.splitext(strip_compression_suffix(output_path))
+        return base + DEFAULT_REPORT_SUFFIX
+
+    @staticmethod
+    def _range_label(spec):
+        minimum = spec.get('min')
+        maximum = spec.get('max')
+        return (f"範囲外（{format_number(minimum) if minimum is not None else ''}〜"
+                f"{format_number(maximum) if maximum is not None else ''}）")
+
+    def _range_reason(self, number, spec):
+        minimum = spec.get('min')
+        maximum = spec.get('max')
+        if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+            return self._range_label(spec)
+        return None
+
+    def apply_row(self, values, row_number):
+        """
+        1行分の出力値を型付け・検証（simple版・GUI版用）
+
+        Args:
+            values (dict): {出力カラム名: 値}（正規化した値で上書きする）
+            row_number (int): 出力の行番号（1始まり、ヘッダーを除く）
+        """
+        numbers = {}
+        label = values.get(self.label_column, "")
+        for spec in self.columns:
+            column = spec['target_column']
+            raw = values.get(column, "")
+            number, parsed = parse_number(raw, spec['unit'])
+            if not parsed:
+                self.violations.append((row_number, label, column, raw, "数値として解釈できません"))
+                continue
+            if number is None:
+                continue
+            numbers[column] = number
+            reason = self._range_reason(number, spec)
+            if reason:
+                self.violations.append((row_number, label, column, raw, reason))
+            if self.normalize_output:
+                values[column] = format_number(number)
+
+        for lower, upper in self.ordering:
+            if lower in numbers and upper in numbers and numbers[lower] > numbers[upper]:
+                self.violations.append((
+                    row_number, label, f"{lower}/{upper}",
+                    f"{format_number(numbers[lower])} > {format_number(numbers[upper])}", "下限が上限より大きい"
+                ))
+
+    def apply_frame(self, output_df, row_offset=0):
+        """
+        出力データフレームの数値列を列単位のベクトル演算で型付け・検証（pandas版用）
+
+        検証結果はself.violationsに追加し、正規化した値で列を置き換える。
+        row_offsetは分割して処理する場合の先頭行より前の出力行数。
+        """
+        # simple版はpandasなしで動かすため、pandasはこのメソッドでのみ使用
+        import numpy as np
+        import pandas as pd
+
+        numbers = {}
+        row_numbers = np.arange(row_offset + 1, row_offset + len(output_df) + 1)
+        labels = output_df[self.label_column] if self.label_column in output_df.columns else None
+        found = []
+
+        for spec in self.columns:
+            column = spec['target_column']
+            unit = spec['unit']
+            raw = output_df[column]
+            text = raw.where(raw.notna(), "").astype(str)
+            text = (text.str.translate(FULLWIDTH_TABLE)
+                    .str.replace(",", "", regex=False)
+                    .str.replace(r'[\s　]', "", regex=True))
+            parts = text.str.extract(NUMBER_PATTERN)
+            parts.columns = ['number', 'scale', 'suffix']
+
+            # 桁・接尾辞の組み合わせごとの倍率（組み合わせは数種類なのでユニーク値ごとに計算）
+            keys = parts['scale'].fillna("") + "|" + parts['suffix'].fillna("")
+            codes, uniques = pd.factorize(keys)
+            multipliers = np.array([
+                _multiplier(unit, scale or None, suffix or None) or np.nan
+                for scale, suffix in (key.split("|") for key in uniques)
+            ])
+            number = pd.to_numeric(parts['number'], errors='coerce').to_numpy(dtype=float) * multipliers[codes]
+
+            empty = (text == "").to_numpy()
+            unparsed = ~empty & np.isnan(number)
+            valid = ~np.isnan(number)
+            numbers[column] = number
+
+            reason = np.full(len(output_df), None, dtype=object)
+            reason[unparsed] = "数値として解釈できません"
+            out_of_range = np.zeros(len(output_df), dtype=bool)
+            if spec.get('min') is not None:
+                out_of_range |= valid & (number < spec['min'])
+            if spec.get('max') is not None:
+                out_of_range |= valid & (number > spec['max'])
+            if out_of_range.any():
+                reason[out_of_range] = self._range_label(spec)
+            flagged = np.flatnonzero(unparsed | out_of_range)
+            if len(flagged):
+                raw_values = raw.to_numpy(dtype=object)
+                found.append(pd.DataFrame({
+                    '行番号': row_numbers[flagged],
+                    '求人名': labels.to_numpy(dtype=object)[flagged] if labels is not None else "",
+                    '列': column,
+                    '値': raw_values[flagged],
+                    '理由': reason[flagged],
+                }))
+
+            if self.normalize_output and valid.any():
+                formatted = raw.to_numpy(dtype=object).copy()
+                formatted[empty] = ""
+                formatted[valid] = [format_number(value) for value in number[valid]]
+                output_df[column] = formatted
+
+        for lower, upper in self.ordering:
+            reversed_order = numbers[lower] > numbers[upper] if lower in numbers and upper in numbers else None
+            if reversed_order is None or not reversed_order.any():
+                continue
+            flagged = np.flatnonzero(reversed_order)
+            found.append(pd.DataFrame({
+                '行番号': row_numbers[flagged],
+                '求人名': labels.to_numpy(dtype=object)[flagged] if labels is not None else "",
+                '列': f"{lower}/{upper}",
+                '値': [f"{format_number(numbers[lower][i])} > {format_number(numbers[upper][i])}" for i in flagged],
+                '理由': "下限が上限より大きい",
+            }))
+
+        if found:
+            report = pd.concat(found).sort_values('行番号', kind='stable')
+            self.violations.extend(report.itertuples(index=False, name=None))
+        return output_df
+
+    def write_report(self, output_path):
+        """
+        検証レポートを書き出し（違反がなければ書き出さない）
+
+        出力が標準出力でreport_fileが未指定の場合は、実行するディレクトリにファイルを残さないよう
+        標準エラー出力に書き出す。
+
+        Returns:
+            str: 書き出したパス（標準エラー出力の場合はSTDERR_REPORT、違反がなければNone）
+        """
+        if not self.violations:
+            return None
+        path = self.report_path(output_path)
+        if path is None:
+            writer = csv.writer(sys.stderr, lineterminator='\n')
+            writer.writerow(REPORT_COLUMNS)
+            writer.writerows(self.violations)
+            sys.stderr.flush()
+            return STDERR_REPORT
+        with open(path, 'w', encoding='utf-8-sig', newline='') as report_file:
+            writer = csv.writer(report_file)
+            writer.writerow(REPORT_COLUMNS)
+            writer.writerows(self.violations)
+        return path
+
+    def summary(self):
+        """検証結果のサマリー文字列"""
+        return f"数値列の検証: {len(self.violations)} 件の問題（対象列: {len(self.columns)} 列）"
@@ -12,6 +12,12 @@ import sys
 import os
 from datetime import datetime
 import re
+from jobins_transform_memo import TransformMemo, DEFAULT_MEMO_SIZE
+from jobins_company_scope import CompanyScopeCache, DEFAULT_COMPANY_KEY_FIELD
+from jobins_output_writer import open_output_writer
+from jobins_input_reader import open_input, is_stdio
+from jobins_typed_columns import TypedColumns
+from jobins_reject_log import RejectLog, TooManyRowErrors, iter_rows, screen_row
 
 class SimpleJobinsConverter:
     def __init__(self, yaml_config_path):
@@ -19,6 +25,13 @@ class SimpleJobinsConverter:
         self.config = self._load_yaml_config()
         self.field_mapping = self.config['mapping_spec']['field_mapping']
         self.processing_rules = self.config['processing_rules']
+        self.transform_memo = TransformMemo(self.processing_rules.get('transform_memo_size', DEFAULT_MEMO_SIZE))
+        self.company_scope = CompanyScopeCache(
+            self.field_mapping, self.processing_rules.get('company_key_field', DEFAULT_COMPANY_KEY_FIELD)
+        )
+        self.typed_columns = TypedColumns(
+            self.config.get('typed_columns'), [mapping['target_column'] for mapping in self.field_mapping]
+        )
         
     def _load_yaml_config(self):
         """YAMLマッピング設定を読み込み"""
@@ -64,6 +77,25 @@ class SimpleJobinsConverter:
         
         return ""
     
+    def _company_scoped_values(self, row, headers):
+        """会社単位の列を (企業名, ソース値) ごとに1回だけ変換"""
+        if not self.company_scope:
+            return {}
+        
+        source_values = [
+            self._get_source_value(row, headers, mapping['source_field'])
+            for mapping in self.company_scope.mappings
+        ]
+        
+        def compute():
+            return {
+                mapping['target_column']: self._transform_field(source_value, mapping['transform'], row, headers)
+                for mapping, source_value in zip(self.company_scope.mappings, source_values)
+            }
+        
+        company_name = self._get_source_value(row, headers, self.company_scope.company_key_field)
+        return self.company_scope.get_values(company_name, source_values, compute)
+    
     def _transform_field(self, source_value, transform_rule, row=None, headers=None):
         """フィールド変換ルールを適用"""
         if transform_rule == "そのまま":
@@ -79,10 +111,13 @@ class SimpleJobinsConverter:
             return fixed_value
         
         elif "GPT" in transform_rule:
-            return self._simple_classification(source_value, transform_rule, row, headers)
+            return self.transform_memo.get_or_compute(
+                transform_rule, source_value,
+                lambda value: self._simple_classification(value, transform_rule, row, headers)
+            )
         
         elif "採用人数" in transform_rule:
-            return self._extract_hiring_count(source_value)
+            return self.transform_memo.get_or_compute(transform_rule, source_value, self._extract_hiring_count)
         
         elif "年齢" in transform_rule and "記載がない場合" in transform_rule:
             if source_value and source_value.strip():
@@ -149,91 +184,144 @@ class SimpleJobinsConverter:
         else:
             return "若干名"
     
-    def convert_csv(self, input_csv_path, output_csv_path=None):
-        """CSVファイルを変換"""
-        print(f"CSVファイル読み込み開始: {input_csv_path}")
+    def _convert_row(self, row, headers, output_columns, row_number):
+        """
+        フィルタ条件を満たす1行を変換
+        
+        Args:
+            row_number (int): 出力の行番号（数値列の検証レポート用）
+        """
+        # 出力行作成
+        output_row = []
+        company_values = self._company_scoped_values(row, headers)
+        for mapping in self.field_mapping:
+            source_field = mapping['source_field']
+            transform_rule = mapping['transform']
+            
+            # 会社単位の列は計算済みの値を使用
+            if mapping['target_column'] in company_values:
+                output_row.append(company_values[mapping['target_column']])
+                continue
+            
+            # ソース値取得
+            source_value = self._get_source_value(row, headers, source_field)
+            
+            # 変換適用
+            transformed_value = self._transform_field(source_value, transform_rule, row, headers)
+            
+            output_row.append(transformed_value)
+        
+        # 数値列（年収・年齢・従業員数）の型付けと検証
+        if self.typed_columns:
+            row_values = dict(zip(output_columns, output_row))
+            self.typed_columns.apply_row(row_values, row_number)
+            output_row = [row_values[column] for column in output_columns]
         
-        # 出力ファイル名生成
+        return output_row
+    
+    def convert_csv(self, input_csv_path, output_csv_path=None):
+        """CSVファイルを変換（入出力のパスが「-」の場合は標準入力・標準出力）"""
+        # 出力ファイル名生成（標準入力から読み込む場合は標準出力へ）
+        if not output_csv_path and is_stdio(input_csv_path):
+            output_csv_path = "-"
         if not output_csv_path:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             output_csv_path = f"JOBINS掲載用_{timestamp}.csv"
         
+        # 標準出力に変換結果を書き出す場合、メッセージは標準エラー出力へ
+        log_file = sys.stderr if is_stdio(output_csv_path) else sys.stdout
+        print(f"CSVファイル読み込み開始: {input_csv_path}", file=log_file)
+        
         # 出力カラムの準備
         output_columns = [mapping['target_column'] for mapping in self.field_mapping]
         
         input_count = 0
         output_count = 0
+        self.typed_columns.violations.clear()
+        reject_log = None
+        aborted = False
         
         try:
-            with open(input_csv_path, 'r', encoding='utf-8-sig') as infile, \
-                 open(output_csv_path, 'w', encoding='utf-8-sig', newline='') as outfile:
+            with open_input(input_csv_path, errors='surrogateescape') as infile, \
+                 open_output_writer(output_csv_path, output_columns, self.processing_rules) as writer:
                 
                 reader = csv.reader(infile)
-                writer = csv.writer(outfile)
                 
                 # ヘッダー行処理
                 input_headers = next(reader)
                 input_count += 1
+                reject_log = RejectLog(output_csv_path, input_headers, self.processing_rules)
                 
-                # 出力ヘッダー書き込み
-                writer.writerow(output_columns)
-                
-                # データ行処理
-                for row in reader:
-                    input_count += 1
-                    
-                    # フィルタリングチェック
-                    if not self._should_include_row(row, input_headers):
-                        continue
-                    
-                    # 出力行作成
-                    output_row = []
-                    for mapping in self.field_mapping:
-                        source_field = mapping['source_field']
-                        transform_rule = mapping['transform']
+                # データ行処理（変換できない行はエラー行ファイルに書き出して続行）
+                with reject_log:
+                    for row, parse_error in iter_rows(reader):
+                        input_count += 1
+                        if parse_error:
+                            reject_log.record(input_count, row, parse_error)
+                            continue
+                        # 空行・フィルタ条件を満たさない行は飛ばす（エラー行に数えない）
+                        screened = screen_row(row, input_headers, self._should_include_row)
+                        if screened is None:
+                            continue
+                        row, problem = screened
+                        if problem:
+                            reject_log.record(input_count, row, problem)
+                            continue
                         
-                        # ソース値取得
-                        source_value = self._get_source_value(row, input_headers, source_field)
+                        try:
+                            output_row = self._convert_row(row, input_headers, output_columns, output_count + 1)
+                        except Exception as e:
+                            reject_log.record(input_count, row, f"変換エラー: {type(e).__name__}: {e}")
+                            continue
                         
-                        # 変換適用
-                        transformed_value = self._transform_field(
-                            source_value, transform_rule, row, input_headers
-                        )
-                        
-                        output_row.append(transformed_value)
-                    
-                    # 出力行書き込み
-                    writer.writerow(output_row)
-                    output_count += 1
+                        # 出力行書き込み
+                        writer.writerow(output_row)
+                        output_count += 1
+        
+        except TooManyRowErrors as e:
+            # 書き込み済みの行は出力ファイルに残す
+            print(str(e), file=log_file)
+            aborted = True
         
         except Exception as e:
-            print(f"変換処理でエラーが発生: {e}")
+            print(f"変換処理でエラーが発生: {e}", file=log_file)
             return False
         
-        print(f"変換完了!")
-        print(f"入力: {input_csv_path} ({input_count} 行)")
-        print(f"出力: {output_csv_path} ({output_count} 行)")
-        print(f"出力ファイルパス: {os.path.abspath(output_csv_path)}")
+        print(f"変換を中止しました" if aborted else f"変換完了!", file=log_file)
+        print(f"入力: {input_csv_path} ({input_count} 行)", file=log_file)
+        print(f"出力: {output_csv_path} ({output_count} 行)", file=log_file)
+        if not is_stdio(output_csv_path):
+            print(f"出力ファイルパス: {os.path.abspath(output_csv_path)}", file=log_file)
+        print(self.transform_memo.summary(), file=log_file)
+        if self.company_scope:
+            print(self.company_scope.summary(), file=log_file)
+        if self.typed_columns:
+            print(self.typed_columns.summary(), file=log_file)
+            report_path = self.typed_columns.write_report(output_csv_path)
+            if report_path:
+                print(f"数値列の検証レポート: {report_path}", file=log_file)
+        print(reject_log.summary(), file=log_file)
         
-        return True
+        return not aborted
 
 def main():
     parser = argparse.ArgumentParser(description='求人マスタCSVをJobins用CSVへ変換（簡易版）')
-    parser.add_argument('input_csv', help='入力CSVファイルパス')
+    parser.add_argument('input_csv', help='入力CSVファイルパス（「-」で標準入力）')
     parser.add_argument('-c', '--config', default='jobins_yaml_mapping.yaml', 
                        help='YAMLマッピング設定ファイル')
-    parser.add_argument('-o', '--output', help='出力CSVファイルパス')
+    parser.add_argument('-o', '--output',
+                       help='出力ファイルパス（.xlsxの場合はJOBINS用書式で出力、「-」で標準出力）')
     
     args = parser.parse_args()
     
     # 入力ファイル存在チェック
-    if not os.path.exists(args.input_csv):
-        print(f"入力ファイルが見つかりません: {args.input_csv}")
+    if not is_stdio(args.input_csv) and not os.path.exists(args.input_csv):
+        print(f"入力ファイルが見つかりません: {args.input_csv}", file=sys.stderr)
         return 1
     
     # 設定ファイル存在チェック
     if not os.path.exists(args.config):
-        print(f"設定ファイルが見つかりません: {args.config}")
+        print(f"設定ファイルが見つかりません: {args.config}", file=sys.stderr)
         return 1
     
     try:
@@ -242,7 +330,7 @@ def main():
         return 0 if success else 1
         
     except Exception as e:
-        print(f"エラーが発生しました: {e}")
+        print(f"エラーが発生しました: {e}", file=sys.stderr)
         return 1
 
 if __name__ == "__main__":